@@ -7,20 +7,37 @@ Xử lý giấy tờ và tích hợp với frontend Next.js
 
 import os
 import json
+import uuid
+import asyncio
 import shutil
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+import zipfile
+from datetime import date, datetime
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
-from document_processor import DocumentProcessor
+from ocr_engine import OCREngine, OCRQueueFullError, OCRTimeoutError
+from document_index import create_document_index
+from stats_store import create_stats_store
+from search_index import create_search_index, rebuild_search_index
+from field_index import backfill_field_index, create_field_index
+from employee_store import create_employee_store, rebuild_employee_store
+from job_queue import JobQueue, JobRunner, JobRetryLater, JOB_DONE, JOB_FAILED
+from upload_storage import (
+    AsyncFileReader, MultipartFileReader, UploadError, UploadHashes, UploadTooLargeError, read_upload_bytes,
+    safe_filename, store_upload, write_bytes_atomic
+)
+from config import BATCH_CONFIG, FIELD_QUERY_CONFIG, MAX_FILE_SIZE, SEARCH_CONFIG
 from models import Base, Document
-from db import ENGINE, db_session
+import db
+from db import db_session, init_db, pool_metrics, run_db, shutdown_db
 from sqlalchemy import text
 
 # Khởi tạo FastAPI app
@@ -39,8 +56,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Khởi tạo processor
-processor = DocumentProcessor()
+# Engine OCR (process pool, mỗi worker giữ một DocumentProcessor), hàng đợi job
+# bền vững (SQLite) và các consumer của nó: tạo trong startup hook, không lúc import
+ocr_engine: Optional[OCREngine] = None
+job_queue: Optional[JobQueue] = None
+job_runner: Optional[JobRunner] = None
+
+# SHA-256 của các file vừa upload, dùng làm key cache OCR khi xử lý
+upload_hashes = UploadHashes()
+
+# Phần dư cho header multipart khi so Content-Length với giới hạn dung lượng
+MULTIPART_OVERHEAD = 64 * 1024
+
+# /upload và /scan đọc body trực tiếp (MultipartFileReader) nên khai báo lại
+# trường file cho tài liệu OpenAPI
+FILE_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
 
 # Thư mục lưu trữ file
 UPLOAD_DIR = Path("uploads")
@@ -52,6 +95,17 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 PROCESSED_DIR.mkdir(exist_ok=True)
 RESULTS_DIR.mkdir(exist_ok=True)
 
+# Chỉ mục giấy tờ (bảng documents nếu bật DB, ngược lại file chỉ mục trong results/)
+# và bộ đếm thống kê cho /stats: tạo trong startup hook, sau khi kết nối DB
+document_index = None
+stats_store = None
+# Chỉ mục toàn văn cho /search (FTS5 hoặc SQL Server full-text)
+search_index = None
+# Chỉ mục trường đã trích xuất cho /fields (bảng document_fields)
+field_index = None
+# Hồ sơ nhân viên cho /employees (dòng thời gian cập nhật tăng dần)
+employee_store = None
+
 # Models Pydantic
 class DocumentResponse(BaseModel):
     """Response model cho kết quả xử lý giấy tờ"""
@@ -62,6 +116,11 @@ class DocumentResponse(BaseModel):
     confidence: Optional[str] = None
     error: Optional[str] = None
     file_path: Optional[str] = None
+    filename: Optional[str] = None
+    content_hash: Optional[str] = None
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    message: Optional[str] = None
     processing_time: Optional[float] = None
 
 class DocumentListResponse(BaseModel):
@@ -69,6 +128,29 @@ class DocumentListResponse(BaseModel):
     success: bool
     documents: List[Dict[str, Any]]
     total: int
+    next_cursor: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    """Response model cho tìm kiếm toàn văn"""
+    success: bool
+    query: str
+    results: List[Dict[str, Any]]
+    took_ms: float
+
+class FieldQueryResponse(BaseModel):
+    """Response model cho truy vấn theo trường đã trích xuất"""
+    success: bool
+    field: str
+    results: List[Dict[str, Any]]
+    took_ms: float
+
+class EmployeeDossierResponse(BaseModel):
+    """Response model cho hồ sơ nhân viên"""
+    success: bool
+    ma_nhan_vien: str
+    ho_ten: Optional[str] = None
+    current: Dict[str, Any]
+    timeline: List[Dict[str, Any]]
 
 class DocumentStatsResponse(BaseModel):
     """Response model cho thống kê"""
@@ -76,6 +158,35 @@ class DocumentStatsResponse(BaseModel):
     total_documents: int
     by_type: Dict[str, int]
     by_date: Dict[str, int]
+    by_confidence: Dict[str, int] = {}
+
+class BatchResponse(BaseModel):
+    """Response model cho một batch xử lý"""
+    success: bool
+    batch_id: str
+    total: int
+    completed: int = 0
+    failed: int = 0
+    jobs: List[Dict[str, Any]]
+    skipped: List[str] = []
+
+class JobCreateRequest(BaseModel):
+    """Request tạo job xử lý giấy tờ đã upload"""
+    filename: str
+
+class JobResponse(BaseModel):
+    """Response model cho trạng thái job"""
+    success: bool
+    job_id: str
+    filename: str
+    status: str
+    progress: int
+    stage: Optional[str] = None
+    attempts: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
 
 # API Endpoints
 @app.get("/")
@@ -87,8 +198,16 @@ async def root():
         "status": "running",
         "endpoints": {
             "upload": "/upload",
+            "scan": "/scan",
             "process": "/process/{filename}",
+            "jobs": "/jobs",
+            "job_status": "/jobs/{job_id}",
+            "batch": "/batch",
+            "batch_status": "/batch/{batch_id}",
             "documents": "/documents",
+            "search": "/search",
+            "fields": "/fields/{field}",
+            "employee": "/employees/{ma_nhan_vien}",
             "stats": "/stats",
             "download": "/download/{filename}"
         }
@@ -97,47 +216,129 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "ocr_engine": ocr_engine.stats() if ocr_engine is not None else None,
+        "jobs": job_queue.counts() if job_queue is not None else None
+    }
+
 
+def _ping_db() -> None:
+    """SELECT 1 qua một connection của pool"""
+    with db_session() as session:
+        session.execute(text("SELECT 1"))
 
 @app.get("/db/health")
 async def db_health_check():
     """Kiểm tra kết nối database"""
-    if ENGINE is None:
-        return {"enabled": False, "status": "db_disabled"}
+    if db.ENGINE is None:
+        return {"enabled": False, "status": "db_disabled", "metrics": pool_metrics()}
     try:
-        with db_session() as session:
-            session.execute(text("SELECT 1"))
-        return {"enabled": True, "status": "ok"}
+        await run_db(_ping_db)
+        return {"enabled": True, "status": "ok", "metrics": pool_metrics()}
     except Exception as e:
-        return {"enabled": True, "status": "error", "detail": str(e)}
+        return {"enabled": True, "status": "error", "detail": str(e), "metrics": pool_metrics()}
 
-@app.post("/upload", response_model=DocumentResponse)
-async def upload_document(file: UploadFile = File(...)):
-    """Upload file giấy tờ"""
+# Giới hạn body theo route: (số byte tối đa, thông báo)
+UPLOAD_BODY_LIMITS = {
+    "/upload": (MAX_FILE_SIZE, f"File vượt quá {MAX_FILE_SIZE // (1024 * 1024)}MB"),
+    "/scan": (MAX_FILE_SIZE, f"File vượt quá {MAX_FILE_SIZE // (1024 * 1024)}MB"),
+    "/batch": (BATCH_CONFIG["max_total_size"], f"Batch vượt quá {BATCH_CONFIG['max_total_size'] // (1024 * 1024)}MB"),
+}
+
+@app.middleware("http")
+async def reject_oversized_upload(request: Request, call_next):
+    """Từ chối upload quá lớn theo Content-Length trước khi đọc body"""
+    limit = UPLOAD_BODY_LIMITS.get(request.url.path) if request.method == "POST" else None
+    if limit is not None:
+        max_size, detail = limit
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+            return JSONResponse(status_code=413, content={"detail": detail})
+    return await call_next(request)
+
+def _new_upload_filename(original: Optional[str]) -> str:
+    """Tên file phía server: timestamp + id ngắn + tên gốc (không trùng nhau)"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{uuid.uuid4().hex[:8]}_{safe_filename(original)}"
+
+@app.post("/upload", response_model=DocumentResponse, openapi_extra=FILE_UPLOAD_BODY)
+async def upload_document(request: Request):
+    """Upload file giấy tờ (trường multipart "file")"""
     try:
-        # Kiểm tra file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="Chỉ chấp nhận file hình ảnh")
+        file = await MultipartFileReader(request).open()
+        filename = _new_upload_filename(file.filename)
         
-        # Tạo tên file unique
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{file.filename}"
-        file_path = UPLOAD_DIR / filename
-        
-        # Lưu file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Một lượt đọc từ mạng: giới hạn kích thước, hash, kiểm tra magic bytes, ghi nguyên tử
+        stored = await store_upload(file, UPLOAD_DIR / filename)
+        upload_hashes.remember(stored.filename, stored.content_hash)
         
         return DocumentResponse(
             success=True,
-            file_path=str(file_path),
-            message=f"Đã upload file: {filename}"
+            file_path=str(stored.path),
+            filename=stored.filename,
+            content_hash=stored.content_hash,
+            content_type=stored.content_type,
+            size=stored.size,
+            message=f"Đã upload file: {stored.filename}"
         )
         
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi upload: {str(e)}")
 
+def _record_result(filename: str, result: Dict[str, Any]) -> None:
+    """Lưu kết quả vào file JSON và chỉ mục/thống kê"""
+    # Lưu kết quả vào file JSON
+    result_filename = f"{Path(filename).stem}_result.json"
+    result_path = RESULTS_DIR / result_filename
+    
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    # Ghi vào chỉ mục (Database nếu cấu hình bật, ngược lại file chỉ mục);
+    # chỉ mục tự cộng thống kê khi giấy tờ thật sự được lưu
+    try:
+        document_index.add(filename, result)
+    except Exception as db_err:
+        print(f"Lỗi lưu DB: {db_err}")
+    try:
+        search_index.add(filename, result)
+    except Exception as search_err:
+        print(f"Lỗi cập nhật chỉ mục tìm kiếm: {search_err}")
+    try:
+        field_index.add(filename, result)
+    except Exception as field_err:
+        print(f"Lỗi cập nhật chỉ mục trường: {field_err}")
+    try:
+        employee_store.add(filename, result)
+    except Exception as employee_err:
+        print(f"Lỗi cập nhật hồ sơ nhân viên: {employee_err}")
+
+def _save_processing_result(filename: str, file_path: Path, result: Dict[str, Any]) -> Path:
+    """Lưu kết quả (JSON + DB) và chuyển file sang thư mục processed"""
+    _record_result(filename, result)
+    
+    # Di chuyển file đã xử lý
+    processed_path = PROCESSED_DIR / filename
+    shutil.move(str(file_path), str(processed_path))
+    upload_hashes.forget(filename)
+    return processed_path
+
+def _build_document_response(result: Dict[str, Any], processed_path: Path, processing_time: float) -> DocumentResponse:
+    """Tạo DocumentResponse từ kết quả xử lý thành công"""
+    return DocumentResponse(
+        success=True,
+        document_type=result.get("document_type"),
+        extracted_text=result.get("extracted_text", "")[:1000],  # Giới hạn độ dài
+        processed_data=result.get("processed_data"),
+        confidence=result.get("confidence"),
+        file_path=str(processed_path),
+        processing_time=processing_time
+    )
+
 @app.post("/process/{filename}", response_model=DocumentResponse)
 async def process_document(filename: str, background_tasks: BackgroundTasks):
     """Xử lý giấy tờ đã upload"""
@@ -146,9 +347,9 @@ async def process_document(filename: str, background_tasks: BackgroundTasks):
         if not file_path.exists():
             raise HTTPException(status_code=404, detail="Không tìm thấy file")
         
-        # Xử lý giấy tờ
+        # Xử lý giấy tờ trong process pool, không chặn event loop
         start_time = datetime.now()
-        result = processor.process_document(str(file_path))
+        result = await ocr_engine.process_document(str(file_path), upload_hashes.get(filename))
         processing_time = (datetime.now() - start_time).total_seconds()
         
         if "error" in result:
@@ -158,132 +359,425 @@ async def process_document(filename: str, background_tasks: BackgroundTasks):
                 file_path=str(file_path)
             )
         
-        # Lưu kết quả vào file JSON
-        result_filename = f"{Path(filename).stem}_result.json"
-        result_path = RESULTS_DIR / result_filename
+        processed_path = await run_db(_save_processing_result, filename, file_path, result)
+        
+        return _build_document_response(result, processed_path, processing_time)
         
-        with open(result_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+    except HTTPException:
+        raise
+    except OCRQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except OCRTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi xử lý: {str(e)}")
 
-        # Lưu vào Database (nếu cấu hình bật)
-        if ENGINE is not None:
-            try:
-                with db_session() as session:
-                    doc = Document(
-                        filename=filename,
-                        document_type=result.get("document_type"),
-                        extracted_text=result.get("extracted_text", "")[:4000],
-                        processed_data=json.dumps(result.get("processed_data", {}), ensure_ascii=False),
-                        confidence=str(result.get("confidence")) if result.get("confidence") is not None else None,
-                    )
-                    session.add(doc)
-            except Exception as db_err:
-                print(f"Lỗi lưu DB: {db_err}")
+def _persist_scan(filename: str, data: bytes, content_hash: str, result: Dict[str, Any]) -> None:
+    """Chạy nền sau khi /scan đã trả kết quả: lưu file gốc và kết quả"""
+    try:
+        if "error" in result:
+            # Giữ file trong uploads/ để có thể xử lý lại qua /process
+            write_bytes_atomic(data, UPLOAD_DIR / filename)
+            upload_hashes.remember(filename, content_hash)
+        else:
+            write_bytes_atomic(data, PROCESSED_DIR / filename)
+            _record_result(filename, result)
+    except Exception as e:
+        print(f"Lỗi lưu file scan: {e}")
+
+@app.post("/scan", response_model=DocumentResponse, openapi_extra=FILE_UPLOAD_BODY)
+async def scan_document(request: Request, background_tasks: BackgroundTasks):
+    """Upload và xử lý trong một request (trường multipart "file").
+
+    Body được đọc thẳng vào bộ nhớ và ảnh được giải mã từ đó (cv2.imdecode);
+    file gốc và kết quả được lưu ở background sau khi response đã gửi đi.
+    """
+    try:
+        file = await MultipartFileReader(request).open()
+        data, content_hash, content_type = await read_upload_bytes(file)
+        filename = _new_upload_filename(file.filename)
         
-        # Di chuyển file đã xử lý
-        processed_path = PROCESSED_DIR / filename
-        shutil.move(str(file_path), str(processed_path))
+        start_time = datetime.now()
+        result = await ocr_engine.process_bytes(data, content_hash)
+        processing_time = (datetime.now() - start_time).total_seconds()
+        background_tasks.add_task(run_db, _persist_scan, filename, data, content_hash, result)
         
-        return DocumentResponse(
-            success=True,
-            document_type=result.get("document_type"),
-            extracted_text=result.get("extracted_text", "")[:1000],  # Giới hạn độ dài
-            processed_data=result.get("processed_data"),
-            confidence=result.get("confidence"),
-            file_path=str(processed_path),
-            processing_time=processing_time
-        )
+        if "error" in result:
+            return DocumentResponse(
+                success=False,
+                error=result["error"],
+                file_path=str(UPLOAD_DIR / filename),
+                filename=filename,
+                content_hash=content_hash
+            )
+        
+        response = _build_document_response(result, PROCESSED_DIR / filename, processing_time)
+        response.filename = filename
+        response.content_hash = content_hash
+        response.content_type = content_type
+        response.size = len(data)
+        return response
         
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except OCRQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except OCRTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi xử lý: {str(e)}")
 
+async def _run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Thân xử lý một job: OCR trong process pool rồi lưu kết quả"""
+    filename = job["filename"]
+    file_path = UPLOAD_DIR / filename
+    if not file_path.exists():
+        return {"success": False, "error": "Không tìm thấy file"}
+
+    await asyncio.to_thread(job_queue.update_progress, job["id"], 10, "ocr")
+    start_time = datetime.now()
+    try:
+        result = await ocr_engine.process_document(str(file_path), upload_hashes.get(filename))
+    except OCRQueueFullError:
+        # Engine đang bận với các request đồng bộ: để job chờ lượt sau
+        raise JobRetryLater()
+    processing_time = (datetime.now() - start_time).total_seconds()
+
+    if "error" in result:
+        return {"success": False, "error": result["error"], "file_path": str(file_path)}
+
+    await asyncio.to_thread(job_queue.update_progress, job["id"], 90, "saving")
+    processed_path = await run_db(_save_processing_result, filename, file_path, result)
+    return jsonable_encoder(_build_document_response(result, processed_path, processing_time))
+
+def _job_response(job: Dict[str, Any]) -> JobResponse:
+    return JobResponse(
+        success=True,
+        job_id=job["id"],
+        filename=job["filename"],
+        status=job["status"],
+        progress=job["progress"],
+        stage=job.get("stage"),
+        attempts=job.get("attempts", 0),
+        result=job.get("result"),
+        error=job.get("error"),
+        created_at=job.get("created_at"),
+        updated_at=job.get("updated_at")
+    )
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: JobCreateRequest):
+    """Tạo job xử lý giấy tờ đã upload, trả về job id ngay lập tức"""
+    file_path = UPLOAD_DIR / request.filename
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="Không tìm thấy file")
+
+    job_id = await asyncio.to_thread(job_queue.submit, request.filename)
+    job_runner.notify()
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    return _job_response(job)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Lấy trạng thái, tiến độ và kết quả của job"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job")
+    return _job_response(job)
+
+def _is_batch_image(name: str) -> bool:
+    return Path(name).suffix.lower() in BATCH_CONFIG["allowed_extensions"]
+
+def _batch_zip_members(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Các member là file ảnh trong ZIP (chỉ đọc danh mục, chưa giải nén)"""
+    return [
+        member for member in archive.infolist()
+        if not member.is_dir() and _is_batch_image(Path(member.filename).name)
+    ]
+
+async def _save_batch_uploads(files: List[UploadFile]) -> Tuple[List[str], List[str]]:
+    """Lưu các file của batch (giải nén ZIP nếu có), trả về (đã lưu, bỏ qua).
+
+    Mọi file, kể cả member trong ZIP, đi qua store_upload (giới hạn kích thước,
+    magic bytes, SHA-256, ghi nguyên tử). Số file và tổng dung lượng của batch
+    được kiểm tra trước/trong khi đọc nên ZIP bomb không ghi đầy đĩa.
+    """
+    prefix = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    max_files = BATCH_CONFIG["max_files"]
+    max_total_size = BATCH_CONFIG["max_total_size"]
+    saved: List[str] = []
+    skipped: List[str] = []
+    total_size = 0
+
+    def too_large(detail: str) -> HTTPException:
+        for filename in saved:
+            (UPLOAD_DIR / filename).unlink(missing_ok=True)
+        return HTTPException(status_code=413, detail=detail)
+
+    async def store(source, name: str) -> None:
+        nonlocal total_size
+        if len(saved) >= max_files:
+            raise too_large(f"Batch vượt quá {max_files} file")
+        remaining = max_total_size - total_size
+        filename = f"{prefix}_{len(saved):04d}_{name}"
+        try:
+            stored = await store_upload(
+                source, UPLOAD_DIR / filename,
+                max_size=min(MAX_FILE_SIZE, remaining), chunk_size=BATCH_CONFIG["chunk_size"]
+            )
+        except UploadTooLargeError:
+            if remaining < MAX_FILE_SIZE:
+                raise too_large(f"Batch vượt quá {max_total_size // (1024 * 1024)}MB")
+            skipped.append(name)
+            return
+        except UploadError:
+            skipped.append(name)
+            return
+        total_size += stored.size
+        upload_hashes.remember(filename, stored.content_hash)
+        saved.append(filename)
+
+    for upload in files:
+        name = Path(upload.filename or "").name
+        if name.lower().endswith(".zip"):
+            try:
+                archive = await run_in_threadpool(zipfile.ZipFile, upload.file)
+            except zipfile.BadZipFile:
+                skipped.append(name)
+                continue
+            with archive:
+                members = _batch_zip_members(archive)
+                if len(saved) + len(members) > max_files:
+                    raise too_large(f"Batch vượt quá {max_files} file")
+                for member in members:
+                    # Chỉ lấy tên file (chặn đường dẫn kiểu ../ trong ZIP)
+                    member_name = Path(member.filename).name
+                    if member.file_size > MAX_FILE_SIZE:
+                        skipped.append(member_name)
+                        continue
+                    try:
+                        source = await run_in_threadpool(archive.open, member)
+                        try:
+                            await store(AsyncFileReader(source), member_name)
+                        finally:
+                            source.close()
+                    except (zipfile.BadZipFile, NotImplementedError, RuntimeError):
+                        # CRC sai, kiểu nén không hỗ trợ hoặc member có mật khẩu
+                        skipped.append(member_name)
+        elif name and _is_batch_image(name):
+            await store(upload, name)
+        else:
+            skipped.append(name)
+    return saved, skipped
+
+async def _process_batch_item(filename: str, slots: asyncio.Semaphore) -> Dict[str, Any]:
+    """Xử lý một file của batch ở chế độ stream, trả về kết quả dạng dict"""
+    file_path = UPLOAD_DIR / filename
+    async with slots:
+        start_time = datetime.now()
+        while True:
+            try:
+                result = await ocr_engine.process_document(str(file_path), upload_hashes.get(filename))
+                break
+            except OCRQueueFullError:
+                # Engine đang phục vụ request khác: chờ một chút rồi thử lại
+                await asyncio.sleep(0.5)
+            except Exception as e:
+                return {"filename": filename, "success": False, "error": str(e)}
+    processing_time = (datetime.now() - start_time).total_seconds()
+
+    if "error" in result:
+        return {"filename": filename, "success": False, "error": result["error"]}
+
+    processed_path = await run_db(_save_processing_result, filename, file_path, result)
+    response = jsonable_encoder(_build_document_response(result, processed_path, processing_time))
+    response["filename"] = filename
+    return response
+
+def _batch_response(batch_id: str, jobs: List[Dict[str, Any]], skipped: List[str] = None) -> BatchResponse:
+    return BatchResponse(
+        success=True,
+        batch_id=batch_id,
+        total=len(jobs),
+        completed=sum(1 for job in jobs if job["status"] == JOB_DONE),
+        failed=sum(1 for job in jobs if job["status"] == JOB_FAILED),
+        jobs=[
+            {
+                "job_id": job["id"],
+                "filename": job["filename"],
+                "status": job["status"],
+                "progress": job["progress"],
+                "error": job.get("error")
+            }
+            for job in jobs
+        ],
+        skipped=skipped or []
+    )
+
+@app.post("/batch")
+async def create_batch(
+    files: List[UploadFile] = File(...),
+    mode: str = Query("jobs", pattern="^(jobs|stream)$")
+):
+    """Upload nhiều file (hoặc ZIP) và xử lý song song.
+
+    mode=jobs: tạo một job cho mỗi file, trả về batch_id để poll /batch/{batch_id}.
+    mode=stream: trả về NDJSON, mỗi dòng là kết quả của một file ngay khi xong.
+    """
+    saved, skipped = await _save_batch_uploads(files)
+    if not saved:
+        raise HTTPException(status_code=400, detail="Batch không có file hình ảnh hợp lệ")
+
+    if mode == "stream":
+        slots = asyncio.Semaphore(ocr_engine.max_workers)
+
+        async def result_lines():
+            tasks = [asyncio.create_task(_process_batch_item(filename, slots)) for filename in saved]
+            try:
+                for skipped_name in skipped:
+                    yield json.dumps({"filename": skipped_name, "success": False, "error": "Bỏ qua: không phải hình ảnh hợp lệ hoặc vượt quá kích thước"}, ensure_ascii=False) + "\n"
+                for finished in asyncio.as_completed(tasks):
+                    yield json.dumps(await finished, ensure_ascii=False) + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+    batch_id = uuid.uuid4().hex
+    await asyncio.to_thread(job_queue.submit_many, saved, batch_id)
+    job_runner.notify()
+    jobs = await asyncio.to_thread(job_queue.list_batch, batch_id)
+    return JSONResponse(status_code=202, content=jsonable_encoder(_batch_response(batch_id, jobs, skipped)))
+
+@app.get("/batch/{batch_id}", response_model=BatchResponse)
+async def get_batch(batch_id: str):
+    """Lấy tiến độ của batch: trạng thái từng job và tổng hợp"""
+    jobs = await asyncio.to_thread(job_queue.list_batch, batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Không tìm thấy batch")
+    return _batch_response(batch_id, jobs)
+
 @app.get("/documents", response_model=DocumentListResponse)
 async def list_documents(
-    page: int = 1,
-    limit: int = 10,
-    doc_type: Optional[str] = None
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    doc_type: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    """Lấy danh sách giấy tờ đã xử lý"""
+    """Lấy danh sách giấy tờ đã xử lý (mới nhất trước).
+
+    Dùng cursor (next_cursor của trang trước) để phân trang keyset;
+    page chỉ còn để tương thích và phải bỏ qua (OFFSET) các dòng trước đó.
+    """
     try:
-        documents = []
-        
-        # Đọc từ thư mục results
-        for result_file in RESULTS_DIR.glob("*.json"):
-            try:
-                with open(result_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Lọc theo loại nếu có
-                if doc_type and data.get("document_type") != doc_type:
-                    continue
-                
-                documents.append({
-                    "filename": result_file.stem,
-                    "document_type": data.get("document_type"),
-                    "processed_data": data.get("processed_data"),
-                    "confidence": data.get("confidence"),
-                    "created_at": result_file.stat().st_mtime
-                })
-                
-            except Exception as e:
-                print(f"Lỗi đọc file {result_file}: {e}")
-                continue
-        
-        # Sắp xếp theo thời gian tạo
-        documents.sort(key=lambda x: x["created_at"], reverse=True)
-        
-        # Phân trang
-        start = (page - 1) * limit
-        end = start + limit
-        paginated_docs = documents[start:end]
+        # Tổng số lấy từ bộ đếm materialized thay vì COUNT(*); hai truy vấn chạy song song
+        # sau khi các dòng đang chờ được ghi (bộ đếm chỉ tính dòng đã ghi)
+        await run_db(document_index.flush)
+        (documents, next_cursor), total = await asyncio.gather(
+            run_db(document_index.list, limit, doc_type, cursor, page),
+            run_db(stats_store.count, doc_type),
+        )
         
         return DocumentListResponse(
             success=True,
-            documents=paginated_docs,
-            total=len(documents)
+            documents=documents,
+            total=total,
+            next_cursor=next_cursor
         )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi lấy danh sách: {str(e)}")
 
 @app.get("/stats", response_model=DocumentStatsResponse)
 async def get_statistics():
-    """Lấy thống kê xử lý giấy tờ"""
+    """Lấy thống kê xử lý giấy tờ (đọc bộ đếm materialized)"""
     try:
-        total_documents = 0
-        by_type = {}
-        by_date = {}
-        
-        # Đếm từ thư mục results
-        for result_file in RESULTS_DIR.glob("*.json"):
-            try:
-                with open(result_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                total_documents += 1
-                
-                # Thống kê theo loại
-                doc_type = data.get("document_type", "unknown")
-                by_type[doc_type] = by_type.get(doc_type, 0) + 1
-                
-                # Thống kê theo ngày
-                created_date = datetime.fromtimestamp(result_file.stat().st_mtime).strftime("%Y-%m-%d")
-                by_date[created_date] = by_date.get(created_date, 0) + 1
-                
-            except Exception as e:
-                print(f"Lỗi đọc file {result_file}: {e}")
-                continue
+        await run_db(document_index.flush)
+        snapshot = await run_db(stats_store.snapshot)
         
         return DocumentStatsResponse(
             success=True,
-            total_documents=total_documents,
-            by_type=by_type,
-            by_date=by_date
+            total_documents=snapshot["total"].get("all", 0),
+            by_type=snapshot["type"],
+            by_date=snapshot["day"],
+            by_confidence=snapshot["confidence"]
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi lấy thống kê: {str(e)}")
 
+@app.get("/search", response_model=SearchResponse)
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=200),
+    doc_type: Optional[str] = None,
+    limit: int = Query(SEARCH_CONFIG["default_limit"], ge=1, le=SEARCH_CONFIG["max_limit"])
+):
+    """Tìm kiếm toàn văn trong văn bản OCR (không phân biệt dấu).
+
+    Nhiều từ: giấy tờ chứa đủ các từ, khớp nguyên cụm xếp trước;
+    đặt trong ngoặc kép để chỉ tìm nguyên cụm. snippet bọc từ khớp trong <mark>.
+    """
+    try:
+        started = datetime.now()
+        results = await run_db(search_index.search, q, doc_type, limit)
+        return SearchResponse(
+            success=True,
+            query=q,
+            results=results,
+            took_ms=round((datetime.now() - started).total_seconds() * 1000, 2)
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi tìm kiếm: {str(e)}")
+
+@app.get("/fields/{field}", response_model=FieldQueryResponse)
+async def query_field(
+    field: str,
+    value: Optional[str] = Query(None, min_length=1, max_length=255),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    doc_type: Optional[str] = None,
+    limit: int = Query(FIELD_QUERY_CONFIG["default_limit"], ge=1, le=FIELD_QUERY_CONFIG["max_limit"])
+):
+    """Tìm giấy tờ theo trường đã trích xuất (ho_ten, ma_nhan_vien, so_quyet_dinh, ngay_hieu_luc...).
+
+    value so khớp cả giá trị (không phân biệt dấu/hoa thường);
+    date_from/date_to (YYYY-MM-DD) lọc theo ngày trong giá trị của trường.
+    """
+    if field not in FIELD_QUERY_CONFIG["fields"]:
+        raise HTTPException(status_code=400, detail=f"Trường không hỗ trợ: {field}")
+    if value is None and date_from is None and date_to is None:
+        raise HTTPException(status_code=400, detail="Cần value hoặc date_from/date_to")
+    try:
+        started = datetime.now()
+        results = await run_db(field_index.find, field, value, date_from, date_to, doc_type, limit)
+        return FieldQueryResponse(
+            success=True,
+            field=field,
+            results=results,
+            took_ms=round((datetime.now() - started).total_seconds() * 1000, 2)
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi truy vấn trường: {str(e)}")
+
+@app.get("/employees/{ma_nhan_vien}", response_model=EmployeeDossierResponse)
+async def get_employee_dossier(ma_nhan_vien: str):
+    """Hồ sơ nhân viên: hợp đồng, bổ nhiệm, điều chuyển, khen thưởng/kỷ luật theo thứ tự thời gian.
+
+    Quyết định chỉ có họ tên được gắn theo họ tên trên hợp đồng (nếu họ tên không trùng).
+    """
+    try:
+        dossier = await run_db(employee_store.dossier, ma_nhan_vien)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi lấy hồ sơ: {str(e)}")
+    if dossier is None:
+        raise HTTPException(status_code=404, detail=f"Không có hồ sơ nhân viên: {ma_nhan_vien}")
+    return EmployeeDossierResponse(success=True, **dossier)
+
 @app.get("/download/{filename}")
 async def download_result(filename: str):
     """Download kết quả xử lý"""
@@ -305,13 +799,22 @@ async def download_result(filename: str):
 async def delete_document(filename: str):
     """Xóa giấy tờ đã xử lý"""
     try:
+        # Tìm file upload gốc và xóa khỏi chỉ mục
+        source_filename = await run_db(document_index.find_source, filename)
+        removed = await run_db(document_index.remove, filename)
+        for buckets in removed:
+            await run_db(stats_store.apply, buckets, -1)
+        await run_db(search_index.remove, filename)
+        await run_db(field_index.remove, filename)
+        await run_db(employee_store.remove, filename)
+        
         # Xóa file kết quả
         result_file = RESULTS_DIR / f"{filename}.json"
         if result_file.exists():
             result_file.unlink()
         
         # Xóa file đã xử lý
-        processed_file = PROCESSED_DIR / f"{filename}"
+        processed_file = PROCESSED_DIR / (source_filename or filename)
         if processed_file.exists():
             processed_file.unlink()
         
@@ -350,22 +853,87 @@ def cleanup_old_files():
     except Exception as e:
         print(f"Lỗi dọn dẹp file: {e}")
 
+def _prepare_index() -> None:
+    """Tạo index còn thiếu; lần đầu bật thống kê materialized/tìm kiếm thì dựng lại"""
+    document_index.ensure_schema()
+    if stats_store.is_empty() and document_index.count() > 0:
+        stats_store.rebuild(document_index.bucket_counts())
+        print("Đã dựng lại thống kê từ chỉ mục")
+    search_index.ensure_schema()
+    if search_index.is_empty():
+        indexed = rebuild_search_index(search_index, RESULTS_DIR)
+        if indexed:
+            print(f"Đã đánh chỉ mục tìm kiếm {indexed} giấy tờ")
+    field_index.ensure_schema()
+    if field_index.is_empty():
+        rows = backfill_field_index(field_index, RESULTS_DIR)
+        if rows:
+            print(f"Đã điền {rows} dòng chỉ mục trường")
+    if employee_store.is_empty():
+        events = rebuild_employee_store(employee_store, RESULTS_DIR)
+        if events:
+            print(f"Đã dựng hồ sơ nhân viên từ {events} giấy tờ")
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     """Khởi tạo khi server start"""
+    global document_index, stats_store, search_index, field_index, employee_store
+    global ocr_engine, job_queue, job_runner
     print("CDS Scanner API dang khoi dong...")
     print(f"Upload directory: {UPLOAD_DIR.absolute()}")
     print(f"Processed directory: {PROCESSED_DIR.absolute()}")
     print(f"Results directory: {RESULTS_DIR.absolute()}")
-    print("API server da san sang!")
-    # Tạo bảng nếu DB được bật
+    # Kết nối DB và tạo bảng nếu DB được bật (chạy ngoài event loop)
     try:
-        if ENGINE is not None:
-            Base.metadata.create_all(bind=ENGINE)
+        engine = await run_db(init_db)
+        if engine is not None:
+            await run_db(Base.metadata.create_all, bind=engine)
             print("Database connected, tables ensured.")
+    except Exception as e:
+        print(f"Lỗi kết nối DB: {e}")
+    stats_store = create_stats_store(db.ENGINE, db_session, RESULTS_DIR)
+    document_index = create_document_index(db.ENGINE, db_session, RESULTS_DIR, stats_store)
+    search_index = create_search_index(db.ENGINE, RESULTS_DIR)
+    field_index = create_field_index(db.ENGINE, db_session, RESULTS_DIR)
+    employee_store = create_employee_store(db.ENGINE, db_session, RESULTS_DIR)
+    try:
+        await run_db(_prepare_index)
     except Exception as e:
         print(f"Lỗi khởi tạo DB: {e}")
+    # Khởi động process pool OCR
+    ocr_engine = OCREngine()
+    ocr_engine.start()
+    print(f"OCR engine: {ocr_engine.max_workers} workers")
+    # Mở hàng đợi job, đưa các job chạy dở (trước khi restart) về hàng đợi và bắt đầu xử lý
+    job_queue = await asyncio.to_thread(JobQueue)
+    job_runner = JobRunner(job_queue, _run_job, concurrency=ocr_engine.max_workers)
+    recovered = await asyncio.to_thread(job_queue.recover)
+    if recovered:
+        print(f"Đã khôi phục {recovered} job chưa hoàn thành")
+    job_runner.start()
+    print("API server da san sang!")
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Dọn dẹp khi server dừng"""
+    if job_runner is not None:
+        await job_runner.stop()
+    if ocr_engine is not None:
+        ocr_engine.shutdown()
+    # Ghi nốt các dòng documents còn trong bộ đệm
+    if document_index is not None:
+        await run_db(document_index.close)
+    if search_index is not None:
+        await run_db(search_index.close)
+    if field_index is not None:
+        await run_db(field_index.close)
+    if employee_store is not None:
+        await run_db(employee_store.close)
+    shutdown_db()
+    if job_queue is not None:
+        job_queue.close()
 
 if __name__ == "__main__":
     # Chạy server
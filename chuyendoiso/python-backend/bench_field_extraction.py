@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark trích xuất trường thông tin
+So sánh engine một lượt quét (field_extraction) với bản sao nguyên văn các hàm
+_extract_* cũ: chạy re.search lần lượt từng pattern cho từng trường
+"""
+
+import re
+import sys
+import timeit
+from dataclasses import asdict
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from document_processor import (
+    AppointmentDecision, DocumentProcessor, LaborContract, RewardDiscipline, TransferDecision
+)
+
+# Văn bản mẫu cho từng loại giấy tờ (giống kết quả OCR thực tế)
+SAMPLE_TEXTS = {
+    "hop_dong_lao_dong": """CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM
+Độc lập - Tự do - Hạnh phúc
+HỢP ĐỒNG LAO ĐỘNG
+Số: 125/2024/HĐLĐ
+BÊN A: CÔNG TY CỔ PHẦN CDS
+Họ và tên: NGUYỄN VĂN AN
+Mã nhân viên: NV001
+Chức danh: KỸ SƯ PHẦN MỀM
+Loại hợp đồng: XÁC ĐỊNH THỜI HẠN
+Từ ngày: 01/03/2024
+Đến ngày: 28/02/2026
+""",
+    "quyet_dinh_bo_nhiem": """QUYẾT ĐỊNH BỔ NHIỆM
+Số: 45/QĐ-CDS
+Căn cứ Điều lệ công ty
+Điều 1. Bổ nhiệm Ông: TRẦN MINH ĐỨC
+Chức vụ: TRƯỞNG PHÒNG KỸ THUẬT
+Có hiệu lực từ: 15/04/2024
+Người ký: LÊ THỊ HOA
+""",
+    "quyet_dinh_dieu_chuyen": """QUYẾT ĐỊNH ĐIỀU CHUYỂN
+Số: 12/QĐ-NS
+Điều 1. Điều chuyển Bà: PHẠM THU TRANG
+Từ: PHÒNG KẾ TOÁN
+Sang: PHÒNG TÀI CHÍNH
+Ngày điều chuyển: 01/06/2024
+""",
+    "khen_thuong_ky_luat": """QUYẾT ĐỊNH KHEN THƯỞNG
+Số: 08/QĐ-KT
+Khen thưởng Ông: HOÀNG VĂN NAM
+Nội dung: HOÀN THÀNH XUẤT SẮC NHIỆM VỤ
+Ngày ban hành: 20/12/2024
+""",
+}
+
+# Văn bản OCR thực tế dài hơn nhiều (điều khoản, nhiễu); nhân mẫu lên để đo
+PADDING = "Điều khoản chung áp dụng cho các bên theo quy định của pháp luật hiện hành.\n" * 40
+
+
+class LegacyExtractor:
+    """Bản sao nguyên văn các hàm _extract_* trước khi chuyển sang field_extraction
+    (re.search lần lượt từng pattern cho từng trường), dùng làm mốc đối chiếu"""
+
+    def _extract_labor_contract(self, text: str) -> LaborContract:
+        """Trích xuất thông tin hợp đồng lao động"""
+        contract = LaborContract()
+        
+        # Tìm họ tên nhân viên
+        name_patterns = [
+            r"Họ và tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Người lao động[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"BÊN B[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in name_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                contract.ho_ten = match.group(1).strip()
+                break
+        
+        # Tìm mã nhân viên
+        ma_patterns = [
+            r"Mã nhân viên[:\s]+([A-Z0-9]+)",
+            r"MSNV[:\s]+([A-Z0-9]+)",
+            r"Mã số[:\s]+([A-Z0-9]+)"
+        ]
+        
+        for pattern in ma_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                contract.ma_nhan_vien = match.group(1).strip()
+                break
+        
+        # Tìm chức danh
+        chuc_patterns = [
+            r"Chức danh[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Vị trí công việc[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in chuc_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                contract.chuc_danh = match.group(1).strip()
+                break
+        
+        # Tìm loại hợp đồng
+        loai_patterns = [
+            r"Loại hợp đồng[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Thời hạn[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in loai_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                contract.loai_hop_dong = match.group(1).strip()
+                break
+        
+        # Tìm thời hạn hợp đồng
+        thoi_han_patterns = [
+            r"Từ ngày[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
+            r"Đến ngày[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
+            r"Thời hạn[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})"
+        ]
+        
+        for pattern in thoi_han_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                contract.thoi_han_hop_dong = match.group(1).strip()
+                break
+        
+        return contract
+    
+    def _extract_appointment_decision(self, text: str) -> AppointmentDecision:
+        """Trích xuất thông tin quyết định bổ nhiệm"""
+        decision = AppointmentDecision()
+        
+        # Tìm họ tên
+        name_patterns = [
+            r"Ông[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Bà[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Họ và tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in name_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.ho_ten = match.group(1).strip()
+                break
+        
+        # Tìm chức vụ mới
+        chuc_moi_patterns = [
+            r"Bổ nhiệm[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Chức vụ[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in chuc_moi_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.chuc_vu_moi = match.group(1).strip()
+                break
+        
+        # Tìm ngày hiệu lực
+        ngay_patterns = [
+            r"Ngày hiệu lực[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
+            r"Có hiệu lực từ[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})"
+        ]
+        
+        for pattern in ngay_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.ngay_hieu_luc = match.group(1).strip()
+                break
+        
+        # Tìm người ký
+        nguoi_ky_patterns = [
+            r"Người ký[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Ký tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in nguoi_ky_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.nguoi_ky = match.group(1).strip()
+                break
+        
+        return decision
+    
+    def _extract_transfer_decision(self, text: str) -> TransferDecision:
+        """Trích xuất thông tin quyết định điều chuyển"""
+        decision = TransferDecision()
+        
+        # Tìm họ tên
+        name_patterns = [
+            r"Ông[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Bà[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Họ và tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in name_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.ho_ten = match.group(1).strip()
+                break
+        
+        # Tìm bộ phận cũ
+        bo_phan_cu_patterns = [
+            r"Từ[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Bộ phận[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in bo_phan_cu_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.bo_phan_cu = match.group(1).strip()
+                break
+        
+        # Tìm bộ phận mới
+        bo_phan_moi_patterns = [
+            r"Sang[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Đến[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in bo_phan_moi_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.bo_phan_moi = match.group(1).strip()
+                break
+        
+        # Tìm ngày điều chuyển
+        ngay_patterns = [
+            r"Ngày điều chuyển[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
+            r"Từ ngày[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})"
+        ]
+        
+        for pattern in ngay_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.ngay_dieu_chuyen = match.group(1).strip()
+                break
+        
+        return decision
+    
+    def _extract_reward_discipline(self, text: str) -> RewardDiscipline:
+        """Trích xuất thông tin khen thưởng/kỷ luật"""
+        decision = RewardDiscipline()
+        
+        # Tìm họ tên
+        name_patterns = [
+            r"Ông[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Bà[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Họ và tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in name_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.ho_ten = match.group(1).strip()
+                break
+        
+        # Xác định loại (khen thưởng hay kỷ luật)
+        if any(keyword in text.upper() for keyword in ["KHEN THƯỞNG", "THƯỞNG"]):
+            decision.hinh_thuc = "khen_thuong"
+        elif any(keyword in text.upper() for keyword in ["KỶ LUẬT", "PHẠT", "KỶ LUẬT"]):
+            decision.hinh_thuc = "ky_luat"
+        
+        # Tìm nội dung quyết định
+        noi_dung_patterns = [
+            r"Nội dung[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
+            r"Lý do[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
+        ]
+        
+        for pattern in noi_dung_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.noi_dung_quyet_dinh = match.group(1).strip()
+                break
+        
+        # Tìm ngày ban hành
+        ngay_patterns = [
+            r"Ngày ban hành[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
+            r"Ngày[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})"
+        ]
+        
+        for pattern in ngay_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                decision.ngay_ban_hanh = match.group(1).strip()
+                break
+        
+        return decision
+
+
+LEGACY = LegacyExtractor()
+LEGACY_METHODS = {
+    "hop_dong_lao_dong": LEGACY._extract_labor_contract,
+    "quyet_dinh_bo_nhiem": LEGACY._extract_appointment_decision,
+    "quyet_dinh_dieu_chuyen": LEGACY._extract_transfer_decision,
+    "khen_thuong_ky_luat": LEGACY._extract_reward_discipline,
+}
+
+
+def run_benchmark(number: int = 2000) -> bool:
+    """Chạy benchmark, trả về False nếu kết quả hai cách khác nhau"""
+    print("⚡ Field extraction benchmark")
+    print("=" * 70)
+    print(f"{'Loại giấy tờ':<26}{'Cách cũ (µs)':>14}{'Engine (µs)':>14}{'Tăng tốc':>12}")
+
+    processor = DocumentProcessor()
+    identical = True
+    for doc_type, sample in SAMPLE_TEXTS.items():
+        text = PADDING + sample + PADDING
+        legacy = LEGACY_METHODS[doc_type]
+        current = processor.document_types[doc_type]
+
+        if asdict(legacy(text)) != asdict(current(text)):
+            print(f"❌ Kết quả khác nhau cho {doc_type}")
+            identical = False
+
+        legacy_time = timeit.timeit(lambda: legacy(text), number=number)
+        engine_time = timeit.timeit(lambda: current(text), number=number)
+        print(
+            f"{doc_type:<26}{legacy_time / number * 1e6:>14.1f}"
+            f"{engine_time / number * 1e6:>14.1f}{legacy_time / engine_time:>11.1f}x"
+        )
+
+    print("=" * 70)
+    print("✅ Kết quả giống hệt cách cũ" if identical else "❌ Có khác biệt")
+    return identical
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
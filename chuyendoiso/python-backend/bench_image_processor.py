@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark tiền xử lý ảnh cho mô hình vision (image_processor)
+So sánh cách cũ (crop từng khối bằng PIL rồi chạy T.Compose cho từng khối,
+torch.stack) với batched_preprocess (cắt khối bằng view, chuẩn hóa cả batch)
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent))
+
+from image_processor import batched_preprocess, build_transform, dynamic_preprocess
+
+# Kích thước ảnh scan thường gặp (rộng, cao)
+SAMPLE_SIZES = [(2480, 3508), (1240, 1754), (1000, 1000), (3000, 800)]
+
+
+def legacy_load(image, input_size=448, max_num=12):
+    """Cách cũ của load_image: transform từng khối rồi torch.stack"""
+    transform = build_transform(input_size=input_size)
+    images = dynamic_preprocess(image, image_size=input_size, use_thumbnail=True, max_num=max_num)
+    return torch.stack([transform(tile) for tile in images])
+
+
+def run_benchmark(number: int = 10) -> bool:
+    """Chạy benchmark, trả về False nếu kết quả hai cách khác nhau"""
+    print("⚡ Vision preprocessing benchmark")
+    print("=" * 70)
+    print(f"{'Kích thước':<14}{'Khối':>6}{'Cách cũ (ms)':>16}{'Batched (ms)':>16}{'Tăng tốc':>12}")
+
+    rng = np.random.default_rng(0)
+    identical = True
+    for width, height in SAMPLE_SIZES:
+        image = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+        expected = legacy_load(image)
+        actual = batched_preprocess(image, image_size=448, use_thumbnail=True, max_num=12)
+        if not torch.equal(expected, actual):
+            print(f"❌ Kết quả khác nhau cho ảnh {width}x{height}")
+            identical = False
+
+        legacy_time = timeit.timeit(lambda: legacy_load(image), number=number)
+        batched_time = timeit.timeit(
+            lambda: batched_preprocess(image, image_size=448, use_thumbnail=True, max_num=12),
+            number=number
+        )
+        print(
+            f"{f'{width}x{height}':<14}{expected.shape[0]:>6}{legacy_time / number * 1e3:>16.1f}"
+            f"{batched_time / number * 1e3:>16.1f}{legacy_time / batched_time:>11.1f}x"
+        )
+
+    print("=" * 70)
+    print("✅ Kết quả giống hệt cách cũ" if identical else "❌ Có khác biệt")
+    return identical
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
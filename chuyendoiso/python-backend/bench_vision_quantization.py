@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark mô hình vision trên CPU: fp32 so với int8 (lượng tử hóa động)
+Đo độ trễ mỗi ảnh, thông lượng khi gửi đồng thời (micro-batch) và độ chính xác
+ký tự so với văn bản chuẩn (file .txt cùng tên ảnh) hoặc so với kết quả fp32.
+
+    python bench_vision_quantization.py --images samples/ --model OpenGVLab/InternVL2-1B
+"""
+
+import argparse
+import difflib
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.append(str(Path(__file__).parent))
+
+from config import VISION_CONFIG
+from vision_inference import VisionInferenceService, configure_threads, quantize_model
+
+# Ảnh mẫu tự sinh khi không có thư mục ảnh (chữ không dấu vì cv2.putText chỉ hỗ trợ ASCII)
+SYNTHETIC_LINES = [
+    ["HOP DONG LAO DONG", "So: 123/2024/HDLD", "Ho va ten: NGUYEN VAN AN"],
+    ["QUYET DINH BO NHIEM", "Chuc vu moi: Truong phong", "Ngay hieu luc: 01/03/2024"],
+    ["QUYET DINH DIEU CHUYEN", "Bo phan moi: Ke toan", "Nguoi ky: TRAN VAN BINH"],
+]
+
+
+def synthetic_samples() -> List[Tuple[str, np.ndarray, str]]:
+    samples = []
+    for index, lines in enumerate(SYNTHETIC_LINES):
+        image = np.full((120 + 60 * len(lines), 1200, 3), 255, dtype=np.uint8)
+        for row, line in enumerate(lines):
+            cv2.putText(image, line, (40, 100 + 60 * row), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+        samples.append((f"synthetic_{index}", image, "\n".join(lines)))
+    return samples
+
+
+def load_samples(folder: Path) -> List[Tuple[str, np.ndarray, Optional[str]]]:
+    samples = []
+    for path in sorted(folder.iterdir()):
+        if path.suffix.lower() not in (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"):
+            continue
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        reference = path.with_suffix(".txt")
+        samples.append((path.name, image, reference.read_text(encoding="utf-8") if reference.exists() else None))
+    return samples
+
+
+def similarity(text: str, reference: str) -> float:
+    """Độ giống ký tự (0-1), bỏ qua khác biệt khoảng trắng"""
+    return difflib.SequenceMatcher(None, " ".join(text.split()), " ".join(reference.split())).ratio()
+
+
+def model_size_mb(model) -> float:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024 / 1024
+
+
+def run_variant(name: str, service: VisionInferenceService, samples) -> Dict[str, object]:
+    """Chạy tuần tự (độ trễ) rồi đồng thời (thông lượng với micro-batch)"""
+    service.image_to_string(samples[0][1])  # khởi động
+
+    texts, latencies = [], []
+    for _, image, _ in samples:
+        start = time.perf_counter()
+        texts.append(service.image_to_string(image))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(samples)) as pool:
+        list(pool.map(service.image_to_string, [image for _, image, _ in samples]))
+    concurrent_time = time.perf_counter() - start
+
+    service.close()
+    return {
+        "name": name,
+        "texts": texts,
+        "latency_ms": sum(latencies) / len(latencies) * 1e3,
+        "throughput": len(samples) / concurrent_time,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark fp32 vs int8 cho mô hình vision trên CPU")
+    parser.add_argument("--model", default=VISION_CONFIG["model_path"])
+    parser.add_argument("--images", type=Path, help="thư mục ảnh (+ file .txt văn bản chuẩn, tùy chọn)")
+    args = parser.parse_args()
+
+    from transformers import AutoModel, AutoTokenizer
+
+    samples = load_samples(args.images) if args.images else synthetic_samples()
+    if not samples:
+        print("❌ Không có ảnh mẫu")
+        return 1
+
+    intra, inter = configure_threads()
+    print(f"⚡ Vision CPU benchmark: {args.model} ({len(samples)} ảnh, threads {intra}/{inter})")
+    model = AutoModel.from_pretrained(
+        args.model, torch_dtype=torch.float32, low_cpu_mem_usage=True, trust_remote_code=True
+    ).eval()
+    tokenizer = AutoTokenizer.from_pretrained(args.model, trust_remote_code=True, use_fast=False)
+    quantized = quantize_model(model)
+
+    results = []
+    for name, variant in (("fp32", model), ("int8", quantized)):
+        service = VisionInferenceService(args.model, model=variant, tokenizer=tokenizer)
+        result = run_variant(name, service, samples)
+        result["size_mb"] = model_size_mb(variant)
+        results.append(result)
+
+    baseline = results[0]["texts"]
+    print("=" * 78)
+    print(f"{'Biến thể':<10}{'Kích thước (MB)':>17}{'Trễ/ảnh (ms)':>15}{'Ảnh/giây':>11}"
+          f"{'Chính xác':>12}{'Giống fp32':>13}")
+    for result in results:
+        references = [(text, ref) for text, (_, _, ref) in zip(result["texts"], samples) if ref]
+        accuracy = (sum(similarity(t, r) for t, r in references) / len(references)) if references else float("nan")
+        agreement = sum(similarity(t, b) for t, b in zip(result["texts"], baseline)) / len(baseline)
+        print(f"{result['name']:<10}{result['size_mb']:>17.0f}{result['latency_ms']:>15.0f}"
+              f"{result['throughput']:>11.2f}{accuracy:>12.3f}{agreement:>13.3f}")
+    print("=" * 78)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -45,14 +45,26 @@ ALLOWED_IMAGE_TYPES = [
     "image/png",
     "image/bmp",
     "image/tiff",
-    "image/tif"
+    "image/tif",
+    "application/pdf"  # PDF nhiều trang (rasterize bằng pypdfium2)
 ]
 
+# Cấu hình ghi file upload theo luồng
+UPLOAD_CONFIG = {
+    "chunk_size": 1024 * 1024,  # 1MB mỗi lần đọc/ghi
+    "hash_registry_size": 1000  # số file upload gần nhất được nhớ SHA-256
+}
+
 # Cấu hình OCR
 TESSERACT_CONFIG = {
     "lang": "vie+eng",
     "config": "--psm 6 --oem 3",
-    "timeout": 30
+    "timeout": 30,
+    # auto: dùng tesserocr (engine nằm trong process) nếu cài được, ngược lại pytesseract
+    # vision: đọc văn bản bằng mô hình vision (VISION_CONFIG) thay cho Tesseract
+    "backend": "auto",
+    "tessdata_path": None,  # None: thư mục tessdata mặc định của Tesseract
+    "tesseract_cmd": r"C:\Program Files\Tesseract-OCR\tesseract.exe"  # cho pytesseract
 }
 
 # Cấu hình xử lý hình ảnh
@@ -63,6 +75,60 @@ IMAGE_PROCESSING = {
     "interpolation": "bicubic"
 }
 
+# Cấu hình dịch vụ suy luận mô hình vision (backend OCR "vision")
+VISION_CONFIG = {
+    "model_path": "OpenGVLab/InternVL2-1B",
+    "torch_dtype": "float32",  # CPU
+    "quantization": None,  # "int8": lượng tử hóa động các lớp Linear (nhanh hơn trên CPU)
+    # None: chia đều số nhân CPU cho PERFORMANCE_CONFIG["max_workers"] worker OCR
+    "num_threads": None,
+    "interop_threads": 1,
+    "max_num": 6,  # số khối 448px tối đa cho mỗi ảnh/vùng
+    "max_batch_tiles": 32,  # số khối tối đa trong một micro-batch
+    "max_wait_ms": 20,  # thời gian chờ gom thêm yêu cầu vào batch
+    "max_concurrency": 8,  # số vùng/trang gửi đồng thời từ một worker
+    "timeout": 120,  # giây chờ kết quả của một yêu cầu
+    "question": "<image>\nĐọc toàn bộ văn bản trong ảnh, giữ nguyên thứ tự dòng.",
+    "generation_config": {"max_new_tokens": 1024, "do_sample": False}
+}
+
+# Cấu hình tiền xử lý ảnh thích ứng trước OCR
+PREPROCESSING_CONFIG = {
+    "target_dpi": 300,  # DPI tối ưu cho Tesseract
+    "max_long_side": 3508,  # cạnh dài A4 ở 300 DPI, dùng khi ảnh không có DPI
+    "sample_size": 512,  # vùng giữa ảnh dùng để ước lượng nhiễu
+    "fast_max_noise": 3.0,  # nhiễu dưới ngưỡng này (và đủ tương phản): đường fast
+    "heavy_min_noise": 8.0,  # nhiễu từ ngưỡng này: đường heavy (fastNlMeansDenoising)
+    "min_contrast": 100  # khoảng mức xám p2-p98 tối thiểu cho đường fast
+}
+
+# Cấu hình phân tích bố cục: chỉ OCR các khối chữ
+LAYOUT_CONFIG = {
+    "enabled": True,
+    "merge_x": 0.03,  # kernel nối ký tự theo chiều ngang (tỉ lệ chiều rộng trang)
+    "merge_y": 0.012,  # kernel nối các dòng thành khối (tỉ lệ chiều cao trang)
+    "min_height": 8,  # px, khối thấp hơn coi là nhiễu
+    "min_area": 200,  # px²
+    "max_ink_density": 0.6,  # khối đặc hơn ngưỡng này là logo/ảnh
+    "max_coverage": 0.85,  # khối chiếm gần hết trang: OCR cả trang như cũ
+    "padding": 10,  # px lề trắng quanh mỗi vùng
+    "max_workers": 2  # số vùng OCR song song trong một worker
+}
+
+# Cấu hình giấy tờ nhiều trang (TIFF nhiều frame, PDF)
+PAGE_CONFIG = {
+    "max_workers": 2,  # số trang OCR song song (cũng là số trang tối đa giữ trong bộ nhớ)
+    "max_pages": 50,  # bỏ qua các trang sau trang này
+    "pdf_dpi": 300  # độ phân giải khi rasterize PDF
+}
+
+# Phân loại từ dải đầu trang trước khi OCR phần còn lại
+HEADER_CLASSIFICATION_CONFIG = {
+    "enabled": True,
+    "band_ratio": 0.25,  # phần đầu trang chứa tiêu đề giấy tờ
+    "reject_unknown": True  # tiêu đề không thuộc loại nào: trả lỗi ngay, không OCR cả trang
+}
+
 # Cấu hình loại giấy tờ
 DOCUMENT_TYPES = {
     "hop_dong_lao_dong": {
@@ -75,7 +141,8 @@ DOCUMENT_TYPES = {
         "keywords": [
             "HỢP ĐỒNG LAO ĐỘNG", "Hợp đồng lao động", "HĐLĐ",
             "BÊN A", "BÊN B", "Người lao động", "Người sử dụng lao động"
-        ]
+        ],
+        "ocr": {"psm": 6}  # cấu hình OCR riêng cho giai đoạn 2 (header-first)
     },
     "quyet_dinh_bo_nhiem": {
         "name": "Quyết định bổ nhiệm",
@@ -87,7 +154,8 @@ DOCUMENT_TYPES = {
         "keywords": [
             "QUYẾT ĐỊNH BỔ NHIỆM", "Quyết định bổ nhiệm", "Bổ nhiệm",
             "Chức vụ", "Bổ nhiệm chức vụ"
-        ]
+        ],
+        "ocr": {"psm": 6}  # cấu hình OCR riêng cho giai đoạn 2 (header-first)
     },
     "quyet_dinh_dieu_chuyen": {
         "name": "Quyết định điều chuyển",
@@ -99,7 +167,8 @@ DOCUMENT_TYPES = {
         "keywords": [
             "QUYẾT ĐỊNH ĐIỀU CHUYỂN", "Quyết định điều chuyển", "Điều chuyển",
             "Bộ phận", "Chuyển công tác"
-        ]
+        ],
+        "ocr": {"psm": 6}  # cấu hình OCR riêng cho giai đoạn 2 (header-first)
     },
     "khen_thuong_ky_luat": {
         "name": "Khen thưởng/Kỷ luật",
@@ -111,7 +180,8 @@ DOCUMENT_TYPES = {
         "keywords": [
             "QUYẾT ĐỊNH KHEN THƯỞNG", "QUYẾT ĐỊNH KỶ LUẬT",
             "Khen thưởng", "Kỷ luật", "Thưởng", "Phạt"
-        ]
+        ],
+        "ocr": {"psm": 6}  # cấu hình OCR riêng cho giai đoạn 2 (header-first)
     }
 }
 
@@ -167,7 +237,38 @@ DATABASE_CONFIG = {
     "trusted_connection": True,
     "trust_server_certificate": True,
     "echo": False,
-    "sqlite_path": PYTHON_BACKEND_DIR / "data" / "cds_scanner.db"
+    "sqlite_path": PYTHON_BACKEND_DIR / "data" / "cds_scanner.db",
+    # Connection pool
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,  # giây chờ lấy connection khi pool đã hết
+    "pool_recycle": 1800,  # giây; đóng connection cũ trước khi server/firewall cắt
+    "pool_pre_ping": False,  # True: thêm một lần ping mỗi lần lấy connection
+    # Thread pool riêng cho truy vấn DB từ các handler async (None: pool_size + max_overflow)
+    "db_threads": None,
+    # Ghi bảng documents theo lô (write-behind): flush khi đủ số dòng hoặc quá thời gian
+    "write_batch_size": 100,
+    "write_flush_interval": 1.0  # giây
+}
+
+# Cấu hình tìm kiếm toàn văn (GET /search)
+SEARCH_CONFIG = {
+    "default_limit": 20,
+    "max_limit": 100,
+    "snippet_chars": 200,  # độ dài đoạn trích quanh từ khớp
+    "sidecar_filename": "search.db",  # FTS5 trong results/ khi tắt DB
+    "mssql_catalog": "cds_catalog"  # full-text catalog trên SQL Server
+}
+
+# Cấu hình truy vấn theo trường đã trích xuất (/fields, bảng document_fields)
+FIELD_QUERY_CONFIG = {
+    "default_limit": 50,
+    "max_limit": 500,
+    "fields": (
+        "ho_ten", "ma_nhan_vien", "so_quyet_dinh", "chuc_danh", "chuc_vu", "chuc_vu_cu",
+        "chuc_vu_moi", "bo_phan", "bo_phan_cu", "bo_phan_moi", "loai_hop_dong", "hinh_thuc",
+        "nguoi_ky", "ngay_ky", "ngay_hieu_luc", "ngay_dieu_chuyen", "ngay_ban_hanh"
+    )
 }
 
 # Cấu hình cache
@@ -175,7 +276,12 @@ CACHE_CONFIG = {
     "enabled": True,
     "type": "memory",  # memory, redis
     "ttl": 3600,  # 1 hour
-    "max_size": 1000
+    "max_size": 1000,
+    "disk_enabled": True,  # tầng cache trên đĩa, giữ kết quả qua các lần restart
+    "disk_dir": TEMP_DIR / "ocr_cache",
+    "disk_max_entries": 10000,  # vượt quá thì xóa kết quả cũ nhất
+    "disk_max_bytes": 512 * 1024 * 1024,
+    "disk_sweep_interval": 600  # giây giữa hai lần dọn file hết hạn
 }
 
 # Cấu hình security
@@ -197,6 +303,21 @@ PERFORMANCE_CONFIG = {
     "ocr_timeout": 45
 }
 
+# Cấu hình hàng đợi job xử lý bất đồng bộ
+JOB_QUEUE_CONFIG = {
+    "db_path": PYTHON_BACKEND_DIR / "data" / "jobs.db",
+    "poll_interval": 1.0,  # giây
+    "max_attempts": 3
+}
+
+# Cấu hình xử lý theo lô (nhiều file hoặc file ZIP)
+BATCH_CONFIG = {
+    "max_files": 500,
+    "max_total_size": 500 * 1024 * 1024,  # tổng dung lượng một batch (kể cả sau giải nén ZIP)
+    "chunk_size": 1024 * 1024,  # 1MB mỗi lần ghi ra đĩa
+    "allowed_extensions": [".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".pdf"]
+}
+
 # Cấu hình monitoring
 MONITORING_CONFIG = {
     "enabled": True,
@@ -7,8 +7,13 @@ Supports SQL Server via pyodbc with Windows Authentication by default
 
 from __future__ import annotations
 
+import asyncio
 import contextlib
-from typing import Optional
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
 from urllib.parse import quote_plus
 
 from sqlalchemy import create_engine, text
@@ -62,8 +67,18 @@ def create_db_engine(echo: bool = False) -> Engine:
     url = build_connection_url()
     if not url:
         raise RuntimeError("DATABASE_CONFIG is not properly configured")
-    # For MSSQL + pyodbc, use fast_executemany when available
-    engine = create_engine(url, echo=echo, pool_pre_ping=True, future=True)
+    kwargs = {
+        "pool_size": DATABASE_CONFIG.get("pool_size", 5),
+        "max_overflow": DATABASE_CONFIG.get("max_overflow", 10),
+        "pool_timeout": DATABASE_CONFIG.get("pool_timeout", 30),
+        "pool_recycle": DATABASE_CONFIG.get("pool_recycle", 1800),
+    }
+    # For MSSQL + pyodbc, send executemany batches in one round trip
+    if url.startswith("mssql+pyodbc"):
+        kwargs["fast_executemany"] = True
+    engine = create_engine(
+        url, echo=echo, pool_pre_ping=DATABASE_CONFIG.get("pool_pre_ping", False), future=True, **kwargs
+    )
     return engine
 
 
@@ -116,14 +131,118 @@ def ensure_database_exists(engine: Engine) -> None:
         pass
 
 
-# Create a shared engine and session factory if DB is enabled
+# Shared engine and session factory, created by init_db() (not at import time)
 ENGINE: Optional[Engine] = None
 SessionLocal = None
 
-if DATABASE_CONFIG.get("enabled"):
-    ENGINE = create_db_engine(echo=DATABASE_CONFIG.get("echo", False))
-    ensure_database_exists(ENGINE)
-    SessionLocal = sessionmaker(bind=ENGINE, autocommit=False, autoflush=False, future=True)
+
+def init_db() -> Optional[Engine]:
+    """Create the shared engine and session factory if DB is enabled (idempotent).
+
+    Called from the server startup hook so importing this module does not load
+    the DB driver or open a connection.
+    """
+    global ENGINE, SessionLocal
+    if ENGINE is None and DATABASE_CONFIG.get("enabled"):
+        engine = create_db_engine(echo=DATABASE_CONFIG.get("echo", False))
+        ensure_database_exists(engine)
+        SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+        ENGINE = engine
+    return ENGINE
+
+
+# Dedicated thread pool for DB work from async handlers, so queries neither block
+# the event loop nor compete with file I/O in Starlette's shared threadpool
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_metrics = {"calls": 0, "queued": 0, "active": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+
+def db_threads() -> int:
+    return DATABASE_CONFIG.get("db_threads") or (
+        DATABASE_CONFIG.get("pool_size", 5) + DATABASE_CONFIG.get("max_overflow", 10)
+    )
+
+
+def _db_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=db_threads(), thread_name_prefix="db")
+        return _executor
+
+
+def _timed_call(submitted: float, func: Callable[..., Any]) -> Any:
+    wait = time.perf_counter() - submitted
+    with _metrics_lock:
+        _metrics["calls"] += 1
+        _metrics["queued"] -= 1
+        _metrics["active"] += 1
+        _metrics["wait_total"] += wait
+        _metrics["wait_max"] = max(_metrics["wait_max"], wait)
+    try:
+        return func()
+    finally:
+        with _metrics_lock:
+            _metrics["active"] -= 1
+
+
+def _dequeue_cancelled(future: Future) -> None:
+    # A call cancelled before a thread picked it up never reaches _timed_call
+    if future.cancelled():
+        with _metrics_lock:
+            _metrics["queued"] -= 1
+
+
+async def run_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking DB call on the DB thread pool and await its result."""
+    with _metrics_lock:
+        _metrics["queued"] += 1
+    try:
+        future = _db_executor().submit(
+            _timed_call, time.perf_counter(), partial(func, *args, **kwargs)
+        )
+    except BaseException:
+        with _metrics_lock:
+            _metrics["queued"] -= 1
+        raise
+    future.add_done_callback(_dequeue_cancelled)
+    return await asyncio.wrap_future(future)
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """Connection pool and DB thread pool counters (for /db/health)."""
+    with _metrics_lock:
+        calls = _metrics["calls"]
+        executor = {
+            "threads": db_threads(),
+            "queued": _metrics["queued"],
+            "active": _metrics["active"],
+            "calls": calls,
+            "avg_wait_ms": round(_metrics["wait_total"] / calls * 1000, 2) if calls else 0.0,
+            "max_wait_ms": round(_metrics["wait_max"] * 1000, 2),
+        }
+    metrics: Dict[str, Any] = {"executor": executor}
+    if ENGINE is not None:
+        pool = ENGINE.pool
+        metrics["pool"] = {"class": type(pool).__name__, "status": pool.status()}
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            counter = getattr(pool, name, None)
+            if callable(counter):
+                metrics["pool"][name] = counter()
+    return metrics
+
+
+def shutdown_db() -> None:
+    """Stop the DB thread pool and close pooled connections."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+    if ENGINE is not None:
+        ENGINE.dispose()
 
 
 @contextlib.contextmanager
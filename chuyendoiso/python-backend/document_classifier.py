@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Phân loại giấy tờ bằng automaton Aho–Corasick cho CDS Scanner
+Quét văn bản một lần cho tất cả từ khóa, cộng điểm có trọng số cho từng loại
+và tính độ tin cậy thay vì lấy từ khóa khớp đầu tiên
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import DOCUMENT_TYPES
+
+# Một từ khóa xuất hiện nhiều lần chỉ được tính tối đa chừng này lần
+MAX_HITS_PER_KEYWORD = 3
+
+# Tổng điểm coi là bằng chứng mạnh (ví dụ một tiêu đề 4 từ như "HỢP ĐỒNG LAO ĐỘNG")
+STRONG_SCORE = 4.0
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hóa để so khớp: Unicode NFC, chữ hoa, gộp khoảng trắng"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text).upper()).strip()
+
+
+class AhoCorasick:
+    """Automaton Aho–Corasick: tìm tất cả từ khóa trong một lượt quét O(n + số kết quả)"""
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        # Dựng liên kết fail theo BFS
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._output[next_state].extend(self._output[self._fail[next_state]])
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Sinh (vị trí bắt đầu, chỉ số từ khóa) cho mọi lần khớp"""
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position - len(patterns[index]) + 1, index
+
+
+@dataclass
+class ClassificationResult:
+    """Kết quả phân loại giấy tờ"""
+    document_type: str
+    confidence: str  # high, medium, low (hoặc none khi unknown)
+    score: float  # độ tin cậy 0..1
+    scores: Dict[str, float] = field(default_factory=dict)
+    matched_keywords: List[str] = field(default_factory=list)
+
+
+class DocumentClassifier:
+    """Phân loại giấy tờ theo tổng điểm từ khóa có trọng số"""
+
+    def __init__(self, type_keywords: Optional[Dict[str, List[str]]] = None):
+        if type_keywords is None:
+            type_keywords = {doc_type: cfg["keywords"] for doc_type, cfg in DOCUMENT_TYPES.items()}
+
+        # Gộp các biến thể hoa/thường của cùng một từ khóa sau khi chuẩn hóa
+        entries: Dict[Tuple[str, str], float] = {}
+        for doc_type, keywords in type_keywords.items():
+            for keyword in keywords:
+                normalized = normalize_text(keyword)
+                if normalized:
+                    # Cụm từ dài (tiêu đề) đáng tin hơn từ đơn lẻ như "Thưởng"
+                    entries[(doc_type, normalized)] = float(len(normalized.split(" ")))
+
+        self.document_types = list(type_keywords)
+        self._keywords = list(entries)
+        self._weights = list(entries.values())
+        self._automaton = AhoCorasick([keyword for _, keyword in self._keywords])
+
+    @staticmethod
+    def _is_word_boundary(text: str, start: int, end: int) -> bool:
+        before = text[start - 1] if start > 0 else " "
+        after = text[end] if end < len(text) else " "
+        return not before.isalnum() and not after.isalnum()
+
+    def classify(self, text: str) -> ClassificationResult:
+        """Tính điểm cho mọi loại giấy tờ và chọn loại có điểm cao nhất"""
+        normalized = normalize_text(text)
+        hits: Dict[int, int] = {}
+        for start, index in self._automaton.iter_matches(normalized):
+            keyword = self._keywords[index][1]
+            if self._is_word_boundary(normalized, start, start + len(keyword)):
+                hits[index] = hits.get(index, 0) + 1
+
+        scores = {doc_type: 0.0 for doc_type in self.document_types}
+        for index, count in hits.items():
+            doc_type = self._keywords[index][0]
+            scores[doc_type] += self._weights[index] * min(count, MAX_HITS_PER_KEYWORD)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_type, best_score = ranked[0] if ranked else ("unknown", 0.0)
+        if best_score <= 0:
+            return ClassificationResult("unknown", "none", 0.0, scores)
+
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        # Độ tách biệt so với loại đứng thứ hai × độ mạnh của bằng chứng
+        score = (best_score / (best_score + runner_up)) * min(1.0, best_score / STRONG_SCORE)
+        if score >= 0.75:
+            confidence = "high"
+        elif score >= 0.45:
+            confidence = "medium"
+        else:
+            confidence = "low"
+
+        matched = sorted(
+            self._keywords[index][1] for index in hits if self._keywords[index][0] == best_type
+        )
+        return ClassificationResult(best_type, confidence, round(score, 3), scores, matched)
@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chỉ mục giấy tờ đã xử lý cho CDS Scanner
+Phục vụ /documents và /stats bằng truy vấn có index thay vì quét results/*.json
+"""
+
+from __future__ import annotations
+
+import atexit
+import base64
+import bisect
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, and_, bindparam, cast, delete, func, insert, inspect, or_, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from config import DATABASE_CONFIG
+from models import Document
+
+# Tên file chỉ mục phụ (dùng khi database bị tắt)
+SIDECAR_FILENAME = "index.jsonl"
+
+
+def result_name(filename: str) -> str:
+    """Tên kết quả (stem của file JSON trong results/) ứng với file upload"""
+    return f"{Path(filename).stem}_result"
+
+
+def encode_cursor(created_at: str, key: Any) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{key}".encode("utf-8")).decode("ascii")
+
+
+def bucket_info(document_type: Optional[str], confidence: Any, day: str) -> Dict[str, str]:
+    """Thông tin phân nhóm của một giấy tờ, dùng cho thống kê tăng dần"""
+    return {
+        "document_type": document_type or "unknown",
+        "confidence": str(confidence) if confidence is not None else "unknown",
+        "day": day,
+    }
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, key = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+    except Exception:
+        raise ValueError("Cursor không hợp lệ")
+    return created_at, key
+
+
+class DocumentWriteBuffer:
+    """Bộ đệm ghi sau (write-behind) cho bảng documents (hoặc bảng table).
+
+    Các dòng được gom lại và INSERT bằng một executemany trong một transaction
+    khi đủ batch_size dòng hoặc sau flush_interval giây (luồng nền). Lô lỗi thì
+    ghi lại từng dòng: dòng không bao giờ ghi được (quá dài, trùng khóa...) bị
+    bỏ và ghi log; chỉ khi mất kết nối DB mới giữ lại để thử ở lần flush sau.
+    flush không raise, nên lỗi ghi không làm hỏng các đường đọc.
+
+    on_written(rows) được gọi sau mỗi lần ghi thành công với đúng các dòng đã
+    vào bảng (dùng để cập nhật bộ đếm thống kê).
+    """
+
+    def __init__(self, engine: Engine, batch_size: int = DATABASE_CONFIG.get("write_batch_size", 100),
+                 flush_interval: float = DATABASE_CONFIG.get("write_flush_interval", 1.0),
+                 table=None, on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.engine = engine
+        self.table = table if table is not None else Document.__table__
+        self.on_written = on_written
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._rows: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def add(self, row: Dict[str, Any]) -> None:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Bộ đệm ghi đã đóng")
+            self._rows.append(row)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.table.name}-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)  # phòng khi process dừng mà không qua shutdown hook
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._rows)
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(insert(self.table), rows)
+
+    def _notify_written(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows or self.on_written is None:
+            return
+        try:
+            self.on_written(rows)
+        except Exception as e:
+            print(f"Lỗi xử lý sau khi ghi {self.table.name}: {e}")
+
+    def _requeue(self, rows: List[Dict[str, Any]], error: Exception) -> None:
+        print(f"Lỗi kết nối khi ghi {self.table.name}, giữ {len(rows)} dòng để thử lại: {error}")
+        with self._cond:
+            self._rows[:0] = rows
+
+    def flush(self) -> int:
+        """Ghi ngay các dòng đang chờ, trả về số dòng đã ghi (không raise)"""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                self._insert(rows)
+                self.flushed += len(rows)
+                self.batches += 1
+                self._notify_written(rows)
+                return len(rows)
+            except OperationalError as e:
+                self._requeue(rows, e)
+                return 0
+            except Exception as e:
+                print(f"Lỗi ghi {self.table.name} theo lô, ghi lại từng dòng: {e}")
+
+            # Tách dòng lỗi ra khỏi lô để các dòng còn lại vẫn được ghi
+            written = []
+            for position, row in enumerate(rows):
+                try:
+                    self._insert([row])
+                    written.append(row)
+                except OperationalError as e:
+                    self._requeue(rows[position:], e)
+                    break
+                except Exception as e:
+                    self.dropped += 1
+                    print(f"Bỏ dòng {self.table.name} không ghi được: {e}")
+            self.flushed += len(written)
+            self.batches += 1
+            self._notify_written(written)
+            return len(written)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed and len(self._rows) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            written = self.flush()
+            if closed:
+                return
+            if not written and self.pending():
+                # Mất kết nối: chờ hết khoảng flush rồi mới thử lại
+                with self._cond:
+                    if not self._closed:
+                        self._cond.wait(self.flush_interval)
+
+    def close(self) -> None:
+        """Dừng luồng nền sau khi ghi hết các dòng đang chờ (gọi khi shutdown)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        # Luồng nền có thể đã mất kết nối ở lần flush cuối: thử lại một lần
+        self.flush()
+        if self.pending():
+            print(f"Lỗi ghi {self.table.name} khi dừng, mất {self.pending()} dòng")
+
+
+class SqlDocumentIndex:
+    """Chỉ mục dựa trên bảng documents (keyset pagination + GROUP BY).
+
+    Nếu có stats_store, bộ đếm chỉ được cộng khi dòng thật sự vào bảng, nên
+    dòng bị bộ đệm bỏ không làm thống kê lệch khỏi bảng documents.
+    """
+
+    def __init__(self, engine: Engine, session_factory, writer: Optional[DocumentWriteBuffer] = None,
+                 stats_store=None):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.stats_store = stats_store
+        # Ghi theo lô; các hàm đọc flush trước để thấy ngay giấy tờ vừa thêm
+        self.writer = writer or DocumentWriteBuffer(engine)
+        if stats_store is not None:
+            self.writer.on_written = self._count_written
+
+    def _count_written(self, rows: List[Dict[str, Any]]) -> None:
+        counts: Dict[Tuple[Optional[str], Optional[str], str], int] = {}
+        for row in rows:
+            key = (row["document_type"], row["confidence"], row["created_at"].strftime("%Y-%m-%d"))
+            counts[key] = counts.get(key, 0) + 1
+        self.stats_store.apply_counts(
+            (bucket_info(doc_type, confidence, day), count)
+            for (doc_type, confidence, day), count in counts.items()
+        )
+
+    def close(self) -> None:
+        self.writer.close()
+
+    def flush(self) -> None:
+        """Ghi các dòng đang chờ (và cộng thống kê của chúng) trước khi đọc bộ đếm"""
+        self.writer.flush()
+
+    def ensure_schema(self) -> None:
+        """Bổ sung cột result_name và các index còn thiếu trên bảng documents đã tồn tại"""
+        columns = {column["name"] for column in inspect(self.engine).get_columns(Document.__tablename__)}
+        if "result_name" not in columns:
+            column_type = Document.__table__.c.result_name.type.compile(dialect=self.engine.dialect)
+            with self.engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {Document.__tablename__} ADD result_name {column_type} NULL"))
+        self._backfill_result_names()
+        for index in Document.__table__.indexes:
+            index.create(bind=self.engine, checkfirst=True)
+
+    def _backfill_result_names(self, batch_size: int = 1000) -> int:
+        """Điền result_name cho các dòng ghi trước khi có cột này"""
+        statement = (
+            update(Document.__table__)
+            .where(Document.__table__.c.id == bindparam("row_id"))
+            .values(result_name=bindparam("row_result_name"))
+        )
+        filled = 0
+        while True:
+            with self.engine.begin() as connection:
+                rows = connection.execute(
+                    select(Document.id, Document.filename)
+                    .where(Document.result_name.is_(None))
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    return filled
+                connection.execute(statement, [
+                    {"row_id": row.id, "row_result_name": result_name(row.filename)} for row in rows
+                ])
+            filled += len(rows)
+
+    def add(self, filename: str, result: Dict[str, Any]) -> None:
+        """Thêm giấy tờ (thống kê được cộng khi dòng được ghi)"""
+        created_at = datetime.utcnow()
+        confidence = str(result.get("confidence")) if result.get("confidence") is not None else None
+        self.writer.add({
+            "filename": filename,
+            "result_name": result_name(filename),
+            "document_type": result.get("document_type"),
+            "extracted_text": result.get("extracted_text", "")[:4000],
+            "processed_data": json.dumps(result.get("processed_data", {}), ensure_ascii=False),
+            "confidence": confidence,
+            "created_at": created_at,
+        })
+
+    def _match_name(self, name: str):
+        """Điều kiện tìm đúng tên file upload hoặc đúng tên kết quả ('<stem>_result')"""
+        return or_(Document.filename == name, Document.result_name == name)
+
+    def find_source(self, name: str) -> Optional[str]:
+        """Tìm tên file upload gốc ứng với tên kết quả"""
+        self.writer.flush()
+        with self.session_factory() as session:
+            return session.execute(
+                select(Document.filename).where(self._match_name(name)).limit(1)
+            ).scalar_one_or_none()
+
+    def remove(self, name: str) -> List[Dict[str, str]]:
+        """Xóa giấy tờ, trả về thông tin phân nhóm của các dòng đã xóa"""
+        self.writer.flush()
+        with self.session_factory() as session:
+            rows = session.execute(
+                select(Document.id, Document.document_type, Document.confidence, Document.created_at)
+                .where(self._match_name(name))
+            ).all()
+            if rows:
+                session.execute(delete(Document).where(Document.id.in_([row.id for row in rows])))
+        return [
+            bucket_info(row.document_type, row.confidence, row.created_at.strftime("%Y-%m-%d"))
+            for row in rows
+        ]
+
+    @staticmethod
+    def _timestamp(value: datetime) -> float:
+        # created_at lưu theo UTC (datetime.utcnow)
+        return value.replace(tzinfo=timezone.utc).timestamp()
+
+    def list(
+        self,
+        limit: int,
+        doc_type: Optional[str] = None,
+        cursor: Optional[str] = None,
+        page: int = 1,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Trả về (documents, next_cursor), mới nhất trước"""
+        self.writer.flush()
+        conditions = []
+        if doc_type:
+            conditions.append(Document.document_type == doc_type)
+
+        query = select(
+            Document.id,
+            Document.filename,
+            Document.document_type,
+            Document.processed_data,
+            Document.confidence,
+            Document.created_at,
+        ).where(*conditions)
+
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            created_at = datetime.fromisoformat(created_at)
+            query = query.where(or_(
+                Document.created_at < created_at,
+                and_(Document.created_at == created_at, Document.id < int(last_id)),
+            ))
+        elif page > 1:
+            query = query.offset((page - 1) * limit)
+
+        query = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit + 1)
+
+        with self.session_factory() as session:
+            rows = session.execute(query).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.created_at.isoformat(), last.id)
+
+        documents = [
+            {
+                "filename": result_name(row.filename),
+                "source_filename": row.filename,
+                "document_type": row.document_type,
+                "processed_data": json.loads(row.processed_data) if row.processed_data else None,
+                "confidence": row.confidence,
+                "created_at": self._timestamp(row.created_at),
+            }
+            for row in rows
+        ]
+        return documents, next_cursor
+
+    def count(self, doc_type: Optional[str] = None) -> int:
+        """Đếm số giấy tờ (COUNT trên index)"""
+        self.writer.flush()
+        query = select(func.count()).select_from(Document)
+        if doc_type:
+            query = query.where(Document.document_type == doc_type)
+        with self.session_factory() as session:
+            return session.execute(query).scalar_one()
+
+    def bucket_counts(self) -> List[Tuple[Dict[str, str], int]]:
+        """Đếm theo (loại, độ tin cậy, ngày) bằng GROUP BY, dùng để dựng lại thống kê"""
+        self.writer.flush()
+        if self.engine.dialect.name == "sqlite":
+            day = func.date(Document.created_at)
+        else:
+            day = cast(Document.created_at, Date)
+
+        with self.session_factory() as session:
+            rows = session.execute(
+                select(Document.document_type, Document.confidence, day, func.count())
+                .group_by(Document.document_type, Document.confidence, day)
+            ).all()
+        return [
+            (bucket_info(doc_type, confidence, str(created_date)), count)
+            for doc_type, confidence, created_date, count in rows
+        ]
+
+
+class FileDocumentIndex:
+    """Chỉ mục phụ dạng JSON lines trong thư mục results (khi database bị tắt).
+
+    File chỉ ghi nối thêm (add/remove), được nạp vào bộ nhớ khi khởi động và
+    tự dựng lại từ results/*.json nếu chưa có.
+    """
+
+    def __init__(self, results_dir: Path, stats_store=None):
+        self.results_dir = Path(results_dir)
+        self.path = self.results_dir / SIDECAR_FILENAME
+        self.stats_store = stats_store
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Danh sách (created_at, name) đã sắp xếp tăng dần, tổng và theo từng loại
+        self._order: List[Tuple[float, str]] = []
+        self._order_by_type: Dict[str, List[Tuple[float, str]]] = {}
+        self._removed = 0
+        self._loaded = False
+
+    def ensure_schema(self) -> None:
+        self._ensure_loaded()
+
+    def close(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass  # ghi đồng bộ, thống kê đã được cộng trong add
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path.exists():
+                self._load()
+            else:
+                self._rebuild()
+            self._loaded = True
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("op") == "remove":
+                    self._remove_entry(record["filename"])
+                    self._removed += 1
+                else:
+                    self._add_entry(record["entry"])
+
+    def _rebuild(self) -> None:
+        """Dựng lại chỉ mục từ các file kết quả hiện có"""
+        for result_file in self.results_dir.glob("*.json"):
+            try:
+                with open(result_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Lỗi đọc file {result_file}: {e}")
+                continue
+            self._add_entry(self._make_entry(result_file.stem, None, data, result_file.stat().st_mtime))
+        self._compact()
+
+    @staticmethod
+    def _make_entry(name: str, source: Optional[str], result: Dict[str, Any], created_at: float) -> Dict[str, Any]:
+        return {
+            "filename": name,
+            "source_filename": source,
+            "document_type": result.get("document_type"),
+            "processed_data": result.get("processed_data"),
+            "confidence": result.get("confidence"),
+            "created_at": created_at,
+        }
+
+    def _add_entry(self, entry: Dict[str, Any]) -> None:
+        name = entry["filename"]
+        if name in self._entries:
+            self._remove_entry(name)
+        self._entries[name] = entry
+        key = (entry["created_at"], name)
+        bisect.insort(self._order, key)
+        bisect.insort(self._order_by_type.setdefault(entry.get("document_type") or "unknown", []), key)
+
+    def _remove_entry(self, name: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return None
+        key = (entry["created_at"], name)
+        for order in (self._order, self._order_by_type.get(entry.get("document_type") or "unknown", [])):
+            position = bisect.bisect_left(order, key)
+            if position < len(order) and order[position] == key:
+                del order[position]
+        return entry
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _compact(self) -> None:
+        """Ghi lại file chỉ mục chỉ với các entry còn hiệu lực"""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for _, name in self._order:
+                f.write(json.dumps({"op": "add", "entry": self._entries[name]}, ensure_ascii=False) + "\n")
+        tmp_path.replace(self.path)
+        self._removed = 0
+
+    @staticmethod
+    def _entry_buckets(entry: Dict[str, Any]) -> Dict[str, str]:
+        # Ngày theo UTC như bảng documents (created_at = utcnow), để /stats by_date
+        # không đổi khi bật/tắt DB
+        day = datetime.fromtimestamp(entry["created_at"], timezone.utc).strftime("%Y-%m-%d")
+        return bucket_info(entry.get("document_type"), entry.get("confidence"), day)
+
+    def rebuild(self) -> None:
+        """Bỏ file chỉ mục hiện tại và dựng lại từ results/*.json"""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+            self._entries, self._order, self._order_by_type = {}, [], {}
+            self._rebuild()
+            self._loaded = True
+
+    def add(self, filename: str, result: Dict[str, Any]) -> None:
+        """Thêm giấy tờ và cộng thống kê (nếu có stats_store)"""
+        self._ensure_loaded()
+        entry = self._make_entry(result_name(filename), filename, result, datetime.now().timestamp())
+        with self._lock:
+            self._add_entry(entry)
+            self._append({"op": "add", "entry": entry})
+        if self.stats_store is not None:
+            self.stats_store.apply(self._entry_buckets(entry), 1)
+
+    def find_source(self, name: str) -> Optional[str]:
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(name) or self._entries.get(result_name(name))
+        return entry.get("source_filename") if entry else None
+
+    def remove(self, name: str) -> List[Dict[str, str]]:
+        """Xóa giấy tờ, trả về thông tin phân nhóm của entry đã xóa"""
+        self._ensure_loaded()
+        with self._lock:
+            if name not in self._entries:
+                name = result_name(name)
+            entry = self._remove_entry(name)
+            if entry is None:
+                return []
+            self._append({"op": "remove", "filename": name})
+            self._removed += 1
+            if self._removed > max(100, len(self._entries)):
+                self._compact()
+        return [self._entry_buckets(entry)]
+
+    def list(
+        self,
+        limit: int,
+        doc_type: Optional[str] = None,
+        cursor: Optional[str] = None,
+        page: int = 1,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Trả về (documents, next_cursor), mới nhất trước"""
+        self._ensure_loaded()
+        with self._lock:
+            order = self._order_by_type.get(doc_type, []) if doc_type else self._order
+            if cursor:
+                created_at, name = decode_cursor(cursor)
+                end = bisect.bisect_left(order, (float(created_at), name))
+            else:
+                end = len(order) - (page - 1) * limit
+            start = max(end - limit, 0)
+            keys = order[start:max(end, 0)]
+            documents = [dict(self._entries[name]) for _, name in reversed(keys)]
+
+        next_cursor = None
+        if start > 0 and documents:
+            last = documents[-1]
+            next_cursor = encode_cursor(repr(last["created_at"]), last["filename"])
+        return documents, next_cursor
+
+    def count(self, doc_type: Optional[str] = None) -> int:
+        self._ensure_loaded()
+        with self._lock:
+            if doc_type:
+                return len(self._order_by_type.get(doc_type, []))
+            return len(self._order)
+
+    def bucket_counts(self) -> List[Tuple[Dict[str, str], int]]:
+        """Đếm theo (loại, độ tin cậy, ngày), dùng để dựng lại thống kê"""
+        self._ensure_loaded()
+        counts: Dict[Tuple[str, str, str], int] = {}
+        with self._lock:
+            for entry in self._entries.values():
+                buckets = self._entry_buckets(entry)
+                key = (buckets["document_type"], buckets["confidence"], buckets["day"])
+                counts[key] = counts.get(key, 0) + 1
+        return [
+            ({"document_type": doc_type, "confidence": confidence, "day": day}, count)
+            for (doc_type, confidence, day), count in counts.items()
+        ]
+
+
+def create_document_index(engine: Optional[Engine], session_factory, results_dir: Path, stats_store=None):
+    """Chọn chỉ mục: bảng documents nếu có DB, ngược lại dùng file chỉ mục phụ.
+
+    stats_store: bộ đếm được cộng khi giấy tờ thật sự vào chỉ mục
+    """
+    if engine is not None:
+        return SqlDocumentIndex(engine, session_factory, stats_store=stats_store)
+    return FileDocumentIndex(results_dir, stats_store)
@@ -6,18 +6,25 @@ Xử lý các loại giấy tờ nội bộ công ty với OCR thông minh
 """
 
 import os
-import re
 import json
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
-import pytesseract
 from PIL import Image
 import cv2
 import numpy as np
 
-# Cấu hình Tesseract cho tiếng Việt
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+from config import DOCUMENT_TYPES, HEADER_CLASSIFICATION_CONFIG, LAYOUT_CONFIG, PAGE_CONFIG
+from document_classifier import ClassificationResult, DocumentClassifier
+from field_extraction import extract_fields
+from layout import crop_region, find_text_regions, mask_outside_regions, region_coverage
+from ocr_backend import create_ocr_backend
+from page_source import PageImage, iter_pages
+from preprocessing import PreprocessResult, preprocess, read_dpi
 
 @dataclass
 class EmployeeInfo:
@@ -81,70 +88,71 @@ class DocumentProcessor:
             "khen_thuong_ky_luat": self._extract_reward_discipline
         }
         
-        # Từ khóa nhận diện loại giấy tờ
+        # Từ khóa nhận diện loại giấy tờ (nguồn duy nhất: config.DOCUMENT_TYPES)
         self.type_keywords = {
-            "hop_dong_lao_dong": [
-                "HỢP ĐỒNG LAO ĐỘNG", "Hợp đồng lao động", "HĐLĐ",
-                "BÊN A", "BÊN B", "Người lao động", "Người sử dụng lao động"
-            ],
-            "quyet_dinh_bo_nhiem": [
-                "QUYẾT ĐỊNH BỔ NHIỆM", "Quyết định bổ nhiệm", "Bổ nhiệm",
-                "Chức vụ", "Bổ nhiệm chức vụ"
-            ],
-            "quyet_dinh_dieu_chuyen": [
-                "QUYẾT ĐỊNH ĐIỀU CHUYỂN", "Quyết định điều chuyển", "Điều chuyển",
-                "Bộ phận", "Chuyển công tác"
-            ],
-            "khen_thuong_ky_luat": [
-                "QUYẾT ĐỊNH KHEN THƯỞNG", "QUYẾT ĐỊNH KỶ LUẬT",
-                "Khen thưởng", "Kỷ luật", "Thưởng", "Phạt"
-            ]
+            doc_type: cfg["keywords"] for doc_type, cfg in DOCUMENT_TYPES.items()
         }
+        self.classifier = DocumentClassifier(self.type_keywords)
+        
+        # Backend OCR tạo khi dùng lần đầu (nạp traineddata một lần cho mỗi process)
+        self._ocr_backend = None
+        self._region_executor = None
+    
+    @property
+    def ocr_backend(self):
+        """Backend OCR của process (tesserocr nếu có, ngược lại pytesseract)"""
+        if self._ocr_backend is None:
+            self._ocr_backend = create_ocr_backend(
+                max_instances=max(LAYOUT_CONFIG["max_workers"], PAGE_CONFIG["max_workers"])
+            )
+        return self._ocr_backend
     
     def preprocess_image(self, image_path: str) -> np.ndarray:
         """Tiền xử lý hình ảnh để cải thiện OCR"""
+        preprocessed = self._preprocess_path(image_path)
+        return preprocessed.image if preprocessed is not None else None
+    
+    def _preprocess_path(self, image_path: str) -> Optional[PreprocessResult]:
+        # Đọc hình ảnh
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"Lỗi tiền xử lý hình ảnh: Không thể đọc hình ảnh: {image_path}")
+            return None
+        return self.preprocess_adaptive(image, read_dpi(image_path))
+    
+    def preprocess_array(self, image: np.ndarray, dpi: Optional[float] = None) -> np.ndarray:
+        """Tiền xử lý ảnh đã giải mã (BGR) để cải thiện OCR"""
+        preprocessed = self.preprocess_adaptive(image, dpi)
+        return preprocessed.image if preprocessed is not None else None
+    
+    def preprocess_adaptive(self, image: np.ndarray, dpi: Optional[float] = None) -> Optional[PreprocessResult]:
+        """Tiền xử lý thích ứng (fast/standard/heavy), kèm thông tin đường đã chạy"""
         try:
-            # Đọc hình ảnh
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Không thể đọc hình ảnh: {image_path}")
-            
-            # Chuyển sang grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Loại bỏ nhiễu
-            denoised = cv2.fastNlMeansDenoising(gray)
-            
-            # Tăng độ tương phản
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(denoised)
-            
-            # Nhị phân hóa thích ứng
-            binary = cv2.adaptiveThreshold(
-                enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 11, 2
-            )
-            
-            return binary
-            
+            return preprocess(image, dpi)
         except Exception as e:
             print(f"Lỗi tiền xử lý hình ảnh: {e}")
             return None
     
     def extract_text(self, image_path: str) -> str:
         """Trích xuất văn bản từ hình ảnh"""
+        # Tiền xử lý hình ảnh
+        return self.ocr_image(self.preprocess_image(image_path))
+    
+    def ocr_image(self, processed_image: Optional[np.ndarray], psm: Optional[int] = None,
+                  regions: Optional[List] = None) -> str:
+        """OCR ảnh đã tiền xử lý (regions: chỉ OCR các khối này, None: tự tìm)"""
         try:
-            # Tiền xử lý hình ảnh
-            processed_image = self.preprocess_image(image_path)
             if processed_image is None:
                 return ""
             
+            # Chỉ OCR các khối chữ nếu chúng chiếm đủ ít diện tích trang
+            if regions is None:
+                regions = self._layout_regions(processed_image)
+            if regions is not None:
+                return self._ocr_regions(processed_image, regions, psm) if regions else ""
+            
             # OCR với Tesseract
-            text = pytesseract.image_to_string(
-                processed_image, 
-                lang='vie+eng',
-                config='--psm 6 --oem 3'
-            )
+            text = self.ocr_backend.image_to_string(processed_image, psm)
             
             return text
             
@@ -152,255 +160,233 @@ class DocumentProcessor:
             print(f"Lỗi OCR: {e}")
             return ""
     
+    @staticmethod
+    def _layout_regions(image: np.ndarray) -> Optional[List]:
+        """Các khối chữ của trang; None nếu nên OCR cả trang"""
+        if not LAYOUT_CONFIG["enabled"]:
+            return None
+        regions = find_text_regions(image)
+        if regions and region_coverage(regions, image.shape) <= LAYOUT_CONFIG["max_coverage"]:
+            return regions
+        return None
+    
+    def _ocr_regions(self, image: np.ndarray, regions, psm: Optional[int] = None) -> str:
+        """OCR từng khối chữ (song song) và ghép lại theo thứ tự đọc"""
+        backend = self.ocr_backend
+        if not backend.concurrent:
+            # pytesseract: mỗi lần gọi là một process, OCR một lần trên trang đã che
+            return backend.image_to_string(mask_outside_regions(image, regions), psm)
+        
+        recognize = partial(backend.image_to_string, psm=psm)
+        crops = [crop_region(image, box) for box in regions]
+        # Backend vision gộp các vùng gửi đồng thời thành một batch
+        max_workers = getattr(backend, "max_concurrency", LAYOUT_CONFIG["max_workers"])
+        if len(crops) > 1 and max_workers > 1:
+            if self._region_executor is None:
+                self._region_executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="ocr-region"
+                )
+            texts = list(self._region_executor.map(recognize, crops))
+        else:
+            texts = [recognize(crop) for crop in crops]
+        return "\n".join(text.strip() for text in texts if text.strip())
+    
+    @staticmethod
+    def _header_band(processed_image: np.ndarray) -> int:
+        """Chiều cao (px) dải đầu trang dùng để phân loại"""
+        return int(processed_image.shape[0] * HEADER_CLASSIFICATION_CONFIG["band_ratio"])
+    
+    def _ocr_header(self, processed_image: np.ndarray) -> Tuple[str, ClassificationResult, Optional[List]]:
+        """Giai đoạn 1: OCR dải đầu trang rồi phân loại; trả về cả các khối còn lại"""
+        band = self._header_band(processed_image)
+        regions = self._layout_regions(processed_image)
+        
+        # Theo khối chữ để không cắt ngang dòng
+        if regions is not None:
+            header_regions = [box for box in regions if box[1] < band]
+            body_regions = [box for box in regions if box[1] >= band]
+            header_text = self.ocr_image(processed_image, regions=header_regions)
+        else:
+            body_regions = None
+            header_text = self.ocr_image(processed_image[:band])
+        return header_text, self.classify(header_text), body_regions
+    
+    def _ocr_body(self, processed_image: np.ndarray, header_text: str,
+                  body_regions: Optional[List], psm: Optional[int]) -> str:
+        """Giai đoạn 2: OCR phần còn lại của trang, ghép sau văn bản tiêu đề"""
+        if body_regions is None:
+            # Không có khối chữ: chỉ OCR phần dưới dải tiêu đề (dải này đã OCR ở giai đoạn 1)
+            body_text = self.ocr_image(processed_image[self._header_band(processed_image):], psm)
+        else:
+            body_text = self.ocr_image(processed_image, psm, regions=body_regions)
+        body_text = body_text.strip()
+        return "\n".join(part for part in (header_text.strip(), body_text) if part)
+    
+    @staticmethod
+    def _type_psm(doc_type: str) -> Optional[int]:
+        return DOCUMENT_TYPES.get(doc_type, {}).get("ocr", {}).get("psm")
+    
+    @staticmethod
+    def _header_rejected(header: ClassificationResult, header_text: str) -> Optional[Dict[str, Any]]:
+        if header.document_type != "unknown" or not HEADER_CLASSIFICATION_CONFIG["reject_unknown"]:
+            return None
+        return {
+            "error": "Không thể nhận diện loại giấy tờ",
+            "extracted_text": header_text[:500],
+            "stage": "header"
+        }
+    
+    @staticmethod
+    def _header_info(header: ClassificationResult) -> Dict[str, Any]:
+        return {
+            "document_type": header.document_type,
+            "confidence": header.confidence,
+            "confidence_score": header.score
+        }
+    
+    def ocr_header_first(self, processed_image: np.ndarray) -> Dict[str, Any]:
+        """OCR hai giai đoạn: dải đầu trang để phân loại, rồi phần còn lại theo loại.
+        
+        Trả về {"text", "header"} hoặc {"error", ...} khi tiêu đề không thuộc loại
+        nào được hỗ trợ (không tốn OCR cả trang cho file rác).
+        """
+        header_text, header, body_regions = self._ocr_header(processed_image)
+        rejected = self._header_rejected(header, header_text)
+        if rejected is not None:
+            return rejected
+        
+        # Cấu hình OCR riêng của loại giấy tờ
+        psm = self._type_psm(header.document_type)
+        return {
+            "text": self._ocr_body(processed_image, header_text, body_regions, psm),
+            "header": self._header_info(header)
+        }
+    
+    def _ocr_page(self, page: PageImage, psm: Optional[int]) -> Optional[str]:
+        """Tiền xử lý + OCR một trang (từ trang thứ hai trở đi); None nếu tiền xử lý lỗi"""
+        preprocessed = self.preprocess_adaptive(page.image, page.dpi)
+        if preprocessed is None:
+            return None
+        return self.ocr_image(preprocessed.image, psm)
+    
+    def process_pages(self, pages: Iterable[PageImage]) -> Dict[str, Any]:
+        """Xử lý giấy tờ một hoặc nhiều trang.
+        
+        Trang đầu quyết định loại giấy tờ (header-first nếu bật). Các trang được
+        OCR song song, tối đa PAGE_CONFIG["max_workers"] trang cùng lúc, và trang
+        chỉ được đọc khi có chỗ trống nên bộ nhớ giữ vài trang dù tài liệu dài.
+        Văn bản ghép theo thứ tự trang trước khi phân loại và trích xuất; trang
+        tiền xử lý lỗi được ghi vào page_errors và bỏ qua.
+        """
+        pages = iter(pages)
+        first = next(pages, None)
+        if first is None:
+            return {"error": "Không thể đọc hình ảnh"}
+        preprocessed = self.preprocess_adaptive(first.image, first.dpi)
+        first = None
+        
+        psm = None
+        header_info = None
+        if preprocessed is None:
+            first_page_text = lambda: None
+        else:
+            first_page_text = partial(self.ocr_image, preprocessed.image)
+        if preprocessed is not None and HEADER_CLASSIFICATION_CONFIG["enabled"]:
+            header_text, header, body_regions = self._ocr_header(preprocessed.image)
+            rejected = self._header_rejected(header, header_text)
+            if rejected is not None:
+                return rejected
+            psm = self._type_psm(header.document_type)
+            header_info = self._header_info(header)
+            first_page_text = partial(self._ocr_body, preprocessed.image, header_text, body_regions, psm)
+        
+        second = next(pages, None)
+        if second is None:
+            texts = [first_page_text()]
+        else:
+            texts = []
+            window = max(1, PAGE_CONFIG["max_workers"])
+            with ThreadPoolExecutor(max_workers=window, thread_name_prefix="ocr-page") as executor:
+                in_flight = deque([executor.submit(first_page_text)])
+                for page in itertools.chain([second], pages):
+                    if len(in_flight) >= window:
+                        texts.append(in_flight.popleft().result())
+                    in_flight.append(executor.submit(self._ocr_page, page, psm))
+                    page = None
+                second = None
+                while in_flight:
+                    texts.append(in_flight.popleft().result())
+        
+        # Các trang cách nhau một dòng trống
+        result = self.process_text("\n\n".join(text for text in texts if text), preprocessed)
+        page_errors = [
+            {"page": number, "error": "Lỗi tiền xử lý hình ảnh"}
+            for number, text in enumerate(texts, start=1) if text is None
+        ]
+        if page_errors:
+            result["page_errors"] = page_errors
+        if "error" not in result:
+            result["page_count"] = len(texts)
+            if header_info is not None:
+                result["header_classification"] = header_info
+        return result
+    
+    def classify(self, text: str) -> ClassificationResult:
+        """Phân loại giấy tờ kèm điểm từng loại và độ tin cậy"""
+        return self.classifier.classify(text)
+    
     def detect_document_type(self, text: str) -> str:
         """Nhận diện loại giấy tờ dựa trên nội dung"""
-        text_upper = text.upper()
-        
-        for doc_type, keywords in self.type_keywords.items():
-            for keyword in keywords:
-                if keyword.upper() in text_upper:
-                    return doc_type
-        
-        return "unknown"
+        return self.classify(text).document_type
     
     def _extract_labor_contract(self, text: str) -> LaborContract:
         """Trích xuất thông tin hợp đồng lao động"""
-        contract = LaborContract()
-        
-        # Tìm họ tên nhân viên
-        name_patterns = [
-            r"Họ và tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Người lao động[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"BÊN B[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                contract.ho_ten = match.group(1).strip()
-                break
-        
-        # Tìm mã nhân viên
-        ma_patterns = [
-            r"Mã nhân viên[:\s]+([A-Z0-9]+)",
-            r"MSNV[:\s]+([A-Z0-9]+)",
-            r"Mã số[:\s]+([A-Z0-9]+)"
-        ]
-        
-        for pattern in ma_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                contract.ma_nhan_vien = match.group(1).strip()
-                break
-        
-        # Tìm chức danh
-        chuc_patterns = [
-            r"Chức danh[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Vị trí công việc[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in chuc_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                contract.chuc_danh = match.group(1).strip()
-                break
-        
-        # Tìm loại hợp đồng
-        loai_patterns = [
-            r"Loại hợp đồng[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Thời hạn[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in loai_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                contract.loai_hop_dong = match.group(1).strip()
-                break
-        
-        # Tìm thời hạn hợp đồng
-        thoi_han_patterns = [
-            r"Từ ngày[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
-            r"Đến ngày[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
-            r"Thời hạn[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})"
-        ]
-        
-        for pattern in thoi_han_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                contract.thoi_han_hop_dong = match.group(1).strip()
-                break
-        
-        return contract
+        return LaborContract(**extract_fields("hop_dong_lao_dong", text))
     
     def _extract_appointment_decision(self, text: str) -> AppointmentDecision:
         """Trích xuất thông tin quyết định bổ nhiệm"""
-        decision = AppointmentDecision()
-        
-        # Tìm họ tên
-        name_patterns = [
-            r"Ông[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Bà[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Họ và tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.ho_ten = match.group(1).strip()
-                break
-        
-        # Tìm chức vụ mới
-        chuc_moi_patterns = [
-            r"Bổ nhiệm[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Chức vụ[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in chuc_moi_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.chuc_vu_moi = match.group(1).strip()
-                break
-        
-        # Tìm ngày hiệu lực
-        ngay_patterns = [
-            r"Ngày hiệu lực[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
-            r"Có hiệu lực từ[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})"
-        ]
-        
-        for pattern in ngay_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.ngay_hieu_luc = match.group(1).strip()
-                break
-        
-        # Tìm người ký
-        nguoi_ky_patterns = [
-            r"Người ký[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Ký tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in nguoi_ky_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.nguoi_ky = match.group(1).strip()
-                break
-        
-        return decision
+        return AppointmentDecision(**extract_fields("quyet_dinh_bo_nhiem", text))
     
     def _extract_transfer_decision(self, text: str) -> TransferDecision:
         """Trích xuất thông tin quyết định điều chuyển"""
-        decision = TransferDecision()
-        
-        # Tìm họ tên
-        name_patterns = [
-            r"Ông[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Bà[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Họ và tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.ho_ten = match.group(1).strip()
-                break
-        
-        # Tìm bộ phận cũ
-        bo_phan_cu_patterns = [
-            r"Từ[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Bộ phận[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in bo_phan_cu_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.bo_phan_cu = match.group(1).strip()
-                break
-        
-        # Tìm bộ phận mới
-        bo_phan_moi_patterns = [
-            r"Sang[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Đến[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in bo_phan_moi_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.bo_phan_moi = match.group(1).strip()
-                break
-        
-        # Tìm ngày điều chuyển
-        ngay_patterns = [
-            r"Ngày điều chuyển[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
-            r"Từ ngày[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})"
-        ]
-        
-        for pattern in ngay_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.ngay_dieu_chuyen = match.group(1).strip()
-                break
-        
-        return decision
+        return TransferDecision(**extract_fields("quyet_dinh_dieu_chuyen", text))
     
     def _extract_reward_discipline(self, text: str) -> RewardDiscipline:
         """Trích xuất thông tin khen thưởng/kỷ luật"""
-        decision = RewardDiscipline()
-        
-        # Tìm họ tên
-        name_patterns = [
-            r"Ông[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Bà[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Họ và tên[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.ho_ten = match.group(1).strip()
-                break
+        decision = RewardDiscipline(**extract_fields("khen_thuong_ky_luat", text))
         
         # Xác định loại (khen thưởng hay kỷ luật)
-        if any(keyword in text.upper() for keyword in ["KHEN THƯỞNG", "THƯỞNG"]):
+        text_upper = text.upper()
+        if any(keyword in text_upper for keyword in ["KHEN THƯỞNG", "THƯỞNG"]):
             decision.hinh_thuc = "khen_thuong"
-        elif any(keyword in text.upper() for keyword in ["KỶ LUẬT", "PHẠT", "KỶ LUẬT"]):
+        elif any(keyword in text_upper for keyword in ["KỶ LUẬT", "PHẠT"]):
             decision.hinh_thuc = "ky_luat"
         
-        # Tìm nội dung quyết định
-        noi_dung_patterns = [
-            r"Nội dung[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)",
-            r"Lý do[:\s]+([A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ\s]+)"
-        ]
-        
-        for pattern in noi_dung_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.noi_dung_quyet_dinh = match.group(1).strip()
-                break
-        
-        # Tìm ngày ban hành
-        ngay_patterns = [
-            r"Ngày ban hành[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})",
-            r"Ngày[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})"
-        ]
-        
-        for pattern in ngay_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                decision.ngay_ban_hanh = match.group(1).strip()
-                break
-        
         return decision
     
     def process_document(self, image_path: str) -> Dict[str, Any]:
-        """Xử lý giấy tờ và trả về kết quả"""
+        """Xử lý giấy tờ (ảnh, TIFF nhiều trang hoặc PDF) và trả về kết quả"""
+        try:
+            return self.process_pages(iter_pages(image_path))
+        except Exception as e:
+            return {"error": f"Lỗi xử lý giấy tờ: {str(e)}"}
+    
+    def process_image_bytes(self, data: bytes) -> Dict[str, Any]:
+        """Xử lý giấy tờ từ nội dung file trong bộ nhớ (cv2.imdecode, không qua đĩa)"""
+        try:
+            return self.process_pages(iter_pages(data))
+        except Exception as e:
+            return {"error": f"Lỗi xử lý giấy tờ: {str(e)}"}
+    
+    def process_text(self, text: str, preprocessed: Optional[PreprocessResult] = None) -> Dict[str, Any]:
+        """Phân loại và trích xuất trường từ văn bản OCR"""
         try:
-            # Trích xuất văn bản
-            text = self.extract_text(image_path)
             if not text:
                 return {"error": "Không thể trích xuất văn bản từ hình ảnh"}
             
             # Nhận diện loại giấy tờ
-            doc_type = self.detect_document_type(text)
+            classification = self.classify(text)
+            doc_type = classification.document_type
             if doc_type == "unknown":
                 return {
                     "error": "Không thể nhận diện loại giấy tờ",
@@ -414,7 +400,10 @@ class DocumentProcessor:
                     "document_type": doc_type,
                     "extracted_text": text,
                     "processed_data": asdict(result),
-                    "confidence": "high"
+                    "confidence": classification.confidence,
+                    "confidence_score": classification.score,
+                    "type_scores": classification.scores,
+                    "preprocessing": preprocessed.info() if preprocessed is not None else None
                 }
             
             return {"error": f"Loại giấy tờ không được hỗ trợ: {doc_type}"}
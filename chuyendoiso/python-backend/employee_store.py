@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hồ sơ nhân viên cho CDS Scanner
+Mỗi giấy tờ hợp đồng/bổ nhiệm/điều chuyển/khen thưởng-kỷ luật thêm một mốc vào
+dòng thời gian của nhân viên khi được xử lý (và bị gỡ khi xóa), nên
+/employees/{ma_nhan_vien} chỉ đọc các mốc của một nhân viên thay vì quét mọi giấy tờ.
+
+Quyết định thường chỉ có họ tên: mốc được gắn vào nhân viên duy nhất có họ tên
+đó (theo hợp đồng đã gặp); nếu chưa biết thì giữ dưới khóa "ten:<họ tên>" và
+được chuyển sang mã nhân viên khi hợp đồng của người đó được xử lý.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from document_index import result_name
+from field_index import iter_result_files, normalize_value, parse_date
+from models import Employee, EmployeeEvent
+
+# Loại giấy tờ đưa vào hồ sơ -> các trường ngày của mốc (lấy trường đầu tiên có ngày)
+EVENT_DATE_FIELDS = {
+    "hop_dong_lao_dong": ("ngay_hieu_luc", "ngay_ky"),
+    "quyet_dinh_bo_nhiem": ("ngay_hieu_luc",),
+    "quyet_dinh_dieu_chuyen": ("ngay_dieu_chuyen",),
+    "khen_thuong_ky_luat": ("ngay_ban_hanh",),
+}
+
+NAME_KEY_PREFIX = "ten:"
+
+
+def normalize_employee_id(value: Optional[str]) -> str:
+    """Mã nhân viên để so khớp: bỏ khoảng trắng, chữ hoa ("nv 001" -> "NV001")"""
+    return re.sub(r"\s+", "", value or "").upper()
+
+
+def employee_event(name: str, source: Optional[str], result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Mốc hồ sơ của một kết quả xử lý; None nếu không phải giấy tờ nhân sự"""
+    document_type = result.get("document_type")
+    data = result.get("processed_data")
+    if document_type not in EVENT_DATE_FIELDS or not isinstance(data, dict):
+        return None
+    details = {
+        field: " ".join(value.split())
+        for field, value in data.items() if isinstance(value, str) and value.strip()
+    }
+    ma_nhan_vien = normalize_employee_id(details.get("ma_nhan_vien"))
+    ho_ten_norm = normalize_value(details.get("ho_ten", ""))
+    if not ma_nhan_vien and not ho_ten_norm:
+        return None
+    event_date = None
+    for field in EVENT_DATE_FIELDS[document_type]:
+        event_date = parse_date(details.get(field, ""))
+        if event_date:
+            break
+    return {
+        "document_name": name,
+        "source_filename": source,
+        "document_type": document_type,
+        "ma_nhan_vien": ma_nhan_vien,
+        "ho_ten": details.get("ho_ten"),
+        "ho_ten_norm": ho_ten_norm or None,
+        "event_date": event_date,
+        "details": details,
+    }
+
+
+def _document_key(name: str) -> str:
+    return name if name.endswith("_result") else result_name(name)
+
+
+def _timeline_item(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "date": event["event_date"].isoformat() if event["event_date"] else None,
+        "document_type": event["document_type"],
+        "filename": event["document_name"],
+        "source_filename": event["source_filename"],
+        "details": event["details"],
+    }
+
+
+def _timeline_order(event: Dict[str, Any]) -> Tuple[bool, date]:
+    # Mốc không có ngày xếp cuối, giữ thứ tự xử lý
+    return event["event_date"] is None, event["event_date"] or date.min
+
+
+def current_state(timeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Chức vụ/bộ phận hiện tại và số lần khen thưởng/kỷ luật, tính lại từ dòng thời gian"""
+    state: Dict[str, Any] = {"chuc_vu": None, "bo_phan": None, "loai_hop_dong": None,
+                             "khen_thuong": 0, "ky_luat": 0}
+    for item in timeline:
+        details = item["details"]
+        document_type = item["document_type"]
+        if document_type == "hop_dong_lao_dong":
+            state["chuc_vu"] = details.get("chuc_danh") or state["chuc_vu"]
+            state["bo_phan"] = details.get("bo_phan") or state["bo_phan"]
+            state["loai_hop_dong"] = details.get("loai_hop_dong") or state["loai_hop_dong"]
+        elif document_type == "quyet_dinh_bo_nhiem":
+            state["chuc_vu"] = details.get("chuc_vu_moi") or state["chuc_vu"]
+        elif document_type == "quyet_dinh_dieu_chuyen":
+            state["bo_phan"] = details.get("bo_phan_moi") or state["bo_phan"]
+            state["chuc_vu"] = details.get("chuc_vu") or state["chuc_vu"]
+        elif details.get("hinh_thuc") in ("khen_thuong", "ky_luat"):
+            state[details["hinh_thuc"]] += 1
+    return state
+
+
+def _dossier(ma_nhan_vien: str, ho_ten: Optional[str], events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    timeline = [_timeline_item(event) for event in events]
+    return {
+        "ma_nhan_vien": ma_nhan_vien,
+        "ho_ten": ho_ten or next((e["ho_ten"] for e in reversed(events) if e["ho_ten"]), None),
+        "current": current_state(timeline),
+        "timeline": timeline,
+    }
+
+
+def _rebuild_order(events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Giấy tờ có mã nhân viên trước để quyết định chỉ có họ tên được gắn đúng người"""
+    return sorted(events, key=lambda event: not event["ma_nhan_vien"])
+
+
+def _events_from(results: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Mốc hồ sơ từ các kết quả (tên kết quả, nội dung), bỏ kết quả không phải giấy tờ nhân viên"""
+    return [event for name, result in results
+            for event in [employee_event(name, None, result)] if event]
+
+
+class SqlEmployeeStore:
+    """Hồ sơ lưu trong bảng employees + employee_events"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def _remember_employee(self, session, event: Dict[str, Any]) -> None:
+        values = {"ho_ten": event["ho_ten"], "ho_ten_norm": event["ho_ten_norm"], "updated_at": datetime.utcnow()}
+        if not event["ho_ten_norm"]:
+            values = {"updated_at": values["updated_at"]}
+        updated = session.execute(
+            update(Employee).where(Employee.ma_nhan_vien == event["ma_nhan_vien"]).values(**values)
+        ).rowcount
+        if updated:
+            return
+        try:
+            with session.begin_nested():
+                session.add(Employee(ma_nhan_vien=event["ma_nhan_vien"], **values))
+        except IntegrityError:
+            # Request khác vừa tạo nhân viên này
+            session.execute(
+                update(Employee).where(Employee.ma_nhan_vien == event["ma_nhan_vien"]).values(**values)
+            )
+
+    def _employees_named(self, session, ho_ten_norm: str) -> List[str]:
+        return list(session.execute(
+            select(Employee.ma_nhan_vien).where(Employee.ho_ten_norm == ho_ten_norm).limit(2)
+        ).scalars())
+
+    def _resolve(self, session, event: Dict[str, Any]) -> str:
+        """Khóa hồ sơ của mốc; gom các mốc "ten:" cũ khi vừa biết mã của họ tên đó"""
+        ho_ten_norm = event["ho_ten_norm"]
+        if event["ma_nhan_vien"]:
+            self._remember_employee(session, event)
+            if ho_ten_norm and len(self._employees_named(session, ho_ten_norm)) == 1:
+                session.execute(
+                    update(EmployeeEvent)
+                    .where(EmployeeEvent.employee_key == NAME_KEY_PREFIX + ho_ten_norm)
+                    .values(employee_key=event["ma_nhan_vien"])
+                )
+            return event["ma_nhan_vien"]
+        matches = self._employees_named(session, ho_ten_norm)
+        return matches[0] if len(matches) == 1 else NAME_KEY_PREFIX + ho_ten_norm
+
+    def _insert(self, session, event: Dict[str, Any]) -> None:
+        session.execute(delete(EmployeeEvent).where(EmployeeEvent.document_name == event["document_name"]))
+        session.add(EmployeeEvent(
+            employee_key=self._resolve(session, event),
+            ho_ten_norm=event["ho_ten_norm"],
+            document_name=event["document_name"],
+            source_filename=event["source_filename"],
+            document_type=event["document_type"],
+            event_date=event["event_date"],
+            details=json.dumps(event["details"], ensure_ascii=False),
+            created_at=datetime.utcnow(),
+        ))
+
+    def add(self, filename: str, result: Dict[str, Any]) -> None:
+        event = employee_event(result_name(filename), filename, result)
+        if event is None:
+            return
+        with self.session_factory() as session:
+            self._insert(session, event)
+
+    def remove(self, name: str) -> None:
+        with self.session_factory() as session:
+            session.execute(delete(EmployeeEvent).where(EmployeeEvent.document_name == _document_key(name)))
+
+    def dossier(self, ma_nhan_vien: str) -> Optional[Dict[str, Any]]:
+        """Hồ sơ theo thứ tự thời gian; None nếu chưa có giấy tờ nào của mã này"""
+        key = normalize_employee_id(ma_nhan_vien)
+        with self.session_factory() as session:
+            ho_ten = session.execute(
+                select(Employee.ho_ten).where(Employee.ma_nhan_vien == key)
+            ).scalar_one_or_none()
+            rows = session.execute(
+                select(EmployeeEvent.document_name, EmployeeEvent.source_filename,
+                       EmployeeEvent.document_type, EmployeeEvent.event_date, EmployeeEvent.details)
+                .where(EmployeeEvent.employee_key == key)
+                .order_by(case((EmployeeEvent.event_date.is_(None), 1), else_=0),
+                          EmployeeEvent.event_date, EmployeeEvent.id)
+            ).all()
+        events = []
+        for row in rows:
+            details = json.loads(row.details) if row.details else {}
+            events.append({
+                "document_name": row.document_name,
+                "source_filename": row.source_filename,
+                "document_type": row.document_type,
+                "event_date": row.event_date,
+                "ho_ten": details.get("ho_ten"),
+                "details": details,
+            })
+        if not events and ho_ten is None:
+            return None
+        return _dossier(key, ho_ten, events)
+
+    def is_empty(self) -> bool:
+        with self.session_factory() as session:
+            return session.execute(select(EmployeeEvent.id).limit(1)).first() is None
+
+    def rebuild(self, results: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Dựng lại toàn bộ hồ sơ từ các kết quả (tên kết quả, nội dung)"""
+        events = _events_from(results)
+        with self.session_factory() as session:
+            session.execute(delete(EmployeeEvent))
+            session.execute(delete(Employee))
+            for event in _rebuild_order(events):
+                self._insert(session, event)
+                session.flush()
+        return len(events)
+
+    def close(self) -> None:
+        pass
+
+
+class FileEmployeeStore:
+    """Hồ sơ trong bộ nhớ, dựng từ results/*.json (khi database bị tắt)"""
+
+    def __init__(self, results_dir: Path):
+        self.results_dir = Path(results_dir)
+        self._lock = threading.Lock()
+        self._names: Dict[str, str] = {}  # mã -> họ tên
+        self._codes_by_name: Dict[str, set] = {}  # họ tên chuẩn hóa -> các mã
+        self._events: Dict[str, List[Dict[str, Any]]] = {}  # khóa hồ sơ -> mốc
+        self._keys: Dict[str, str] = {}  # tên kết quả -> khóa hồ sơ
+        self._loaded = False
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._load(_events_from(
+                (name, result) for name, result, _ in iter_result_files(self.results_dir)
+            ))
+
+    def _remove_event(self, name: str) -> None:
+        key = self._keys.pop(name, None)
+        if key is not None:
+            self._events[key] = [e for e in self._events[key] if e["document_name"] != name]
+
+    def _insert(self, event: Dict[str, Any]) -> None:
+        self._remove_event(event["document_name"])
+        ho_ten_norm = event["ho_ten_norm"]
+        key = event["ma_nhan_vien"]
+        if key:
+            if ho_ten_norm:
+                self._names[key] = event["ho_ten"]
+                self._codes_by_name.setdefault(ho_ten_norm, set()).add(key)
+                if len(self._codes_by_name[ho_ten_norm]) == 1:
+                    for moved in self._events.pop(NAME_KEY_PREFIX + ho_ten_norm, []):
+                        self._keys[moved["document_name"]] = key
+                        self._events.setdefault(key, []).append(moved)
+            else:
+                self._names.setdefault(key, None)
+        else:
+            codes = self._codes_by_name.get(ho_ten_norm, set())
+            key = next(iter(codes)) if len(codes) == 1 else NAME_KEY_PREFIX + ho_ten_norm
+        self._keys[event["document_name"]] = key
+        self._events.setdefault(key, []).append(event)
+
+    def add(self, filename: str, result: Dict[str, Any]) -> None:
+        event = employee_event(result_name(filename), filename, result)
+        if event is None:
+            return
+        self._ensure_loaded()
+        with self._lock:
+            self._insert(event)
+
+    def remove(self, name: str) -> None:
+        self._ensure_loaded()
+        with self._lock:
+            self._remove_event(_document_key(name))
+
+    def dossier(self, ma_nhan_vien: str) -> Optional[Dict[str, Any]]:
+        key = normalize_employee_id(ma_nhan_vien)
+        self._ensure_loaded()
+        with self._lock:
+            events = sorted(self._events.get(key, []), key=_timeline_order)
+            if not events and key not in self._names:
+                return None
+            return _dossier(key, self._names.get(key), events)
+
+    def is_empty(self) -> bool:
+        return False  # luôn dựng từ results/*.json khi dùng lần đầu
+
+    def _load(self, events: List[Dict[str, Any]]) -> None:
+        """Thay toàn bộ hồ sơ bằng events (gọi khi đang giữ self._lock)"""
+        self._names, self._codes_by_name, self._events, self._keys = {}, {}, {}, {}
+        for event in _rebuild_order(events):
+            self._insert(event)
+        self._loaded = True
+
+    def rebuild(self, results: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        events = _events_from(results)
+        with self._lock:
+            self._load(events)
+        return len(events)
+
+    def close(self) -> None:
+        pass
+
+
+def create_employee_store(engine, session_factory, results_dir: Path):
+    """Bảng employee_events nếu có DB, ngược lại hồ sơ trong bộ nhớ từ results/"""
+    if engine is not None:
+        return SqlEmployeeStore(session_factory)
+    return FileEmployeeStore(results_dir)
+
+
+def rebuild_employee_store(store, results_dir: Path) -> int:
+    """Dựng lại hồ sơ từ results/*.json (nguồn gốc của mọi giấy tờ đã xử lý)"""
+    return store.rebuild((name, result) for name, result, _ in iter_result_files(results_dir))
+
+
+def main() -> int:
+    """Lệnh dựng lại/xem hồ sơ: py employee_store.py --rebuild | py employee_store.py NV001"""
+    from config import RESULTS_DIR
+    from db import db_session, init_db
+    from models import Base
+
+    parser = argparse.ArgumentParser(description="Hồ sơ nhân viên CDS Scanner")
+    parser.add_argument("ma_nhan_vien", nargs="?", help="In hồ sơ của nhân viên")
+    parser.add_argument("--rebuild", action="store_true", help="Dựng lại hồ sơ từ results/")
+    args = parser.parse_args()
+
+    engine = init_db()
+    if engine is not None:
+        Base.metadata.create_all(bind=engine)
+    store = create_employee_store(engine, db_session, RESULTS_DIR)
+
+    if args.rebuild:
+        print(f"✅ Đã dựng lại hồ sơ từ {rebuild_employee_store(store, RESULTS_DIR)} giấy tờ")
+    if args.ma_nhan_vien:
+        dossier = store.dossier(args.ma_nhan_vien)
+        if dossier is None:
+            print(f"❌ Không có hồ sơ: {args.ma_nhan_vien}")
+            return 1
+        print(json.dumps(dossier, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Engine trích xuất trường thông tin cho CDS Scanner
+Khai báo các trường theo loại giấy tờ; pattern được biên dịch một lần khi import
+và mỗi nhãn chỉ được tìm một lần trên văn bản, dù dùng cho nhiều trường
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from config import REGEX_PATTERNS
+
+# Các mẫu giá trị dùng chung
+NAME = REGEX_PATTERNS["vietnamese_name"]
+CODE = REGEX_PATTERNS["employee_code"]
+DATE = REGEX_PATTERNS["date"]
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """Một trường cần trích xuất: các nhãn theo thứ tự ưu tiên + mẫu giá trị"""
+    field: str
+    labels: Tuple[str, ...]
+    value: str
+
+    def patterns(self) -> List[str]:
+        """Regex đầy đủ cho từng nhãn: '<nhãn>[:\\s]+(<giá trị>)'"""
+        return [rf"{label}[:\s]+({self.value})" for label in self.labels]
+
+
+# Khai báo trường theo loại giấy tờ (thứ tự nhãn = thứ tự ưu tiên)
+FIELD_SPECS: Dict[str, List[FieldSpec]] = {
+    "hop_dong_lao_dong": [
+        FieldSpec("ho_ten", ("Họ và tên", "Người lao động", "BÊN B"), NAME),
+        FieldSpec("ma_nhan_vien", ("Mã nhân viên", "MSNV", "Mã số"), CODE),
+        FieldSpec("chuc_danh", ("Chức danh", "Vị trí công việc"), NAME),
+        FieldSpec("loai_hop_dong", ("Loại hợp đồng", "Thời hạn"), NAME),
+        FieldSpec("thoi_han_hop_dong", ("Từ ngày", "Đến ngày", "Thời hạn"), DATE),
+    ],
+    "quyet_dinh_bo_nhiem": [
+        FieldSpec("ho_ten", ("Ông", "Bà", "Họ và tên"), NAME),
+        FieldSpec("chuc_vu_moi", ("Bổ nhiệm", "Chức vụ"), NAME),
+        FieldSpec("ngay_hieu_luc", ("Ngày hiệu lực", "Có hiệu lực từ"), DATE),
+        FieldSpec("nguoi_ky", ("Người ký", "Ký tên"), NAME),
+    ],
+    "quyet_dinh_dieu_chuyen": [
+        FieldSpec("ho_ten", ("Ông", "Bà", "Họ và tên"), NAME),
+        FieldSpec("bo_phan_cu", ("Từ", "Bộ phận"), NAME),
+        FieldSpec("bo_phan_moi", ("Sang", "Đến"), NAME),
+        FieldSpec("ngay_dieu_chuyen", ("Ngày điều chuyển", "Từ ngày"), DATE),
+    ],
+    "khen_thuong_ky_luat": [
+        FieldSpec("ho_ten", ("Ông", "Bà", "Họ và tên"), NAME),
+        FieldSpec("noi_dung_quyet_dinh", ("Nội dung", "Lý do"), NAME),
+        FieldSpec("ngay_ban_hanh", ("Ngày ban hành", "Ngày"), DATE),
+    ],
+}
+
+
+class FieldExtractor:
+    """Trích xuất các trường của một loại giấy tờ.
+
+    Pattern được biên dịch sẵn và gom theo nhãn. Vị trí của mỗi nhãn khác nhau
+    được tìm một lần trên văn bản đã lower() bằng str.find (quét ở tốc độ C,
+    không chạy regex IGNORECASE trên toàn văn bản); regex đầy đủ chỉ được thử
+    tại các vị trí đó. Với mỗi trường, nhãn được thử theo thứ tự ưu tiên và lấy
+    vị trí xuất hiện đầu tiên — cùng kết quả với re.search lần lượt từng pattern.
+    """
+
+    def __init__(self, specs: List[FieldSpec], flags: int = re.IGNORECASE):
+        self.specs = specs
+        # (trường, [(nhãn đã lower, pattern đã biên dịch), ...] theo thứ tự ưu tiên)
+        self._fields: List[Tuple[str, List[Tuple[str, "re.Pattern[str]"]]]] = [
+            (
+                spec.field,
+                [
+                    (label.lower(), re.compile(pattern, flags))
+                    for label, pattern in zip(spec.labels, spec.patterns())
+                ],
+            )
+            for spec in specs
+        ]
+
+    @staticmethod
+    def _positions(haystack: str, needle: str) -> List[int]:
+        positions = []
+        position = haystack.find(needle)
+        while position != -1:
+            positions.append(position)
+            position = haystack.find(needle, position + 1)
+        return positions
+
+    def extract(self, text: str) -> Dict[str, str]:
+        """Trả về {tên trường: giá trị} cho các trường tìm thấy"""
+        lowered = text.lower()
+        # lower() đổi độ dài (ký tự đặc biệt như 'İ'): vị trí không còn khớp, quét bằng regex
+        exact_positions = len(lowered) == len(text)
+        label_positions: Dict[str, List[int]] = {}
+        fields: Dict[str, str] = {}
+
+        for field, candidates in self._fields:
+            for label, pattern in candidates:
+                if not exact_positions:
+                    match = pattern.search(text)
+                else:
+                    positions = label_positions.get(label)
+                    if positions is None:
+                        positions = label_positions[label] = self._positions(lowered, label)
+                    match = None
+                    for position in positions:
+                        match = pattern.match(text, position)
+                        if match:
+                            break
+                if match:
+                    fields[field] = match.group(1).strip()
+                    break
+        return fields
+
+
+# Biên dịch sẵn cho tất cả loại giấy tờ khi import
+EXTRACTORS: Dict[str, FieldExtractor] = {
+    doc_type: FieldExtractor(specs) for doc_type, specs in FIELD_SPECS.items()
+}
+
+
+def extract_fields(doc_type: str, text: str) -> Dict[str, str]:
+    """Trích xuất các trường của loại giấy tờ doc_type từ văn bản OCR"""
+    return EXTRACTORS[doc_type].extract(text)
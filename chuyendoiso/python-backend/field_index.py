@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chỉ mục trường thông tin đã trích xuất cho CDS Scanner
+Mỗi trường của processed_data là một dòng trong bảng document_fields (giá trị
+đã chuẩn hóa + ngày dạng ISO), có index theo (trường, giá trị) và (trường, ngày),
+nên các truy vấn như "mọi giấy tờ của NV001" hay "quyết định hiệu lực trong
+năm 2025" là index seek thay vì quét và parse JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import re
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, select
+from sqlalchemy.engine import Engine
+
+from document_index import DocumentWriteBuffer, result_name
+from models import Document, DocumentField
+from search_index import fold_text
+
+_WHITESPACE = re.compile(r"\s+")
+_DMY = re.compile(r"(\d{1,2})\s*[/.-]\s*(\d{1,2})\s*[/.-]\s*(\d{4})")
+_VIETNAMESE_DATE = re.compile(r"ngay\s+(\d{1,2})\s+thang\s+(\d{1,2})\s+nam\s+(\d{4})")
+_ISO = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+VALUE_LENGTH = 255
+
+
+def normalize_value(value: str) -> str:
+    """Giá trị để so khớp: bỏ dấu, chữ thường, gộp khoảng trắng ("NGUYỄN  VĂN A" -> "nguyen van a")"""
+    return _WHITESPACE.sub(" ", fold_text(value)).strip()[:VALUE_LENGTH]
+
+
+def parse_date(value: str) -> Optional[date]:
+    """Ngày trong giá trị: dd/mm/yyyy, dd-mm-yyyy, 'ngày d tháng m năm yyyy' hoặc ISO"""
+    folded = fold_text(value)
+    match = _ISO.search(folded)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+    else:
+        match = _DMY.search(folded) or _VIETNAMESE_DATE.search(folded)
+        if not match:
+            return None
+        day, month, year = (int(part) for part in match.groups())
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def field_rows(name: str, source: Optional[str], result: Dict[str, Any],
+               created_at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Các dòng document_fields của một kết quả xử lý (bỏ qua trường rỗng)"""
+    data = result.get("processed_data")
+    if not isinstance(data, dict):
+        return []
+    created_at = created_at or datetime.utcnow()
+    rows = []
+    for field, value in data.items():
+        if not isinstance(value, str) or not value.strip():
+            continue
+        value = _WHITESPACE.sub(" ", value).strip()
+        rows.append({
+            "document_name": name,
+            "source_filename": source,
+            "document_type": result.get("document_type"),
+            "field": field,
+            "value": value[:VALUE_LENGTH],
+            "value_norm": normalize_value(value),
+            "value_date": parse_date(value),
+            "created_at": created_at,
+        })
+    return rows
+
+
+def _document_key(name: str) -> str:
+    return name if name.endswith("_result") else result_name(name)
+
+
+def _match(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "filename": row["document_name"],
+        "source_filename": row["source_filename"],
+        "document_type": row["document_type"],
+        "field": row["field"],
+        "value": row["value"],
+        "date": row["value_date"].isoformat() if row["value_date"] else None,
+    }
+
+
+class SqlFieldIndex:
+    """Chỉ mục trên bảng document_fields (ghi theo lô như bảng documents)"""
+
+    def __init__(self, engine: Engine, session_factory, writer: Optional[DocumentWriteBuffer] = None):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.writer = writer or DocumentWriteBuffer(engine, table=DocumentField.__table__)
+
+    def ensure_schema(self) -> None:
+        """Tạo bảng/index còn thiếu (bảng đã tồn tại từ trước vẫn được bổ sung index)"""
+        DocumentField.__table__.create(bind=self.engine, checkfirst=True)
+        for index in DocumentField.__table__.indexes:
+            index.create(bind=self.engine, checkfirst=True)
+
+    def is_empty(self) -> bool:
+        self.writer.flush()
+        with self.session_factory() as session:
+            return session.execute(select(DocumentField.id).limit(1)).first() is None
+
+    def add(self, filename: str, result: Dict[str, Any]) -> None:
+        for row in field_rows(result_name(filename), filename, result):
+            self.writer.add(row)
+
+    def add_many(self, rows: List[Dict[str, Any]]) -> None:
+        """Ghi ngay nhiều dòng trong một transaction (dùng khi backfill)"""
+        if rows:
+            with self.engine.begin() as connection:
+                connection.execute(DocumentField.__table__.insert(), rows)
+
+    def remove(self, name: str) -> None:
+        self.writer.flush()
+        with self.session_factory() as session:
+            session.execute(delete(DocumentField).where(DocumentField.document_name == _document_key(name)))
+
+    def indexed_names(self) -> set:
+        self.writer.flush()
+        with self.session_factory() as session:
+            return set(session.execute(select(DocumentField.document_name).distinct()).scalars())
+
+    def find(self, field: str, value: Optional[str] = None, date_from: Optional[date] = None,
+             date_to: Optional[date] = None, doc_type: Optional[str] = None,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        """Tìm theo giá trị (không phân biệt dấu/hoa thường) và/hoặc khoảng ngày"""
+        self.writer.flush()
+        conditions = [DocumentField.field == field]
+        if value is not None:
+            conditions.append(DocumentField.value_norm == normalize_value(value))
+        if date_from is not None:
+            conditions.append(DocumentField.value_date >= date_from)
+        if date_to is not None:
+            conditions.append(DocumentField.value_date <= date_to)
+        if doc_type:
+            conditions.append(DocumentField.document_type == doc_type)
+
+        if value is None:
+            # Truy vấn theo ngày: đi theo index (field, value_date)
+            order = (DocumentField.value_date.desc(), DocumentField.id.desc())
+        else:
+            order = (DocumentField.created_at.desc(), DocumentField.id.desc())
+        query = select(DocumentField.__table__).where(and_(*conditions)).order_by(*order).limit(limit)
+        with self.session_factory() as session:
+            rows = session.execute(query).mappings().all()
+        return [_match(row) for row in rows]
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class FileFieldIndex:
+    """Chỉ mục trong bộ nhớ dựng từ results/*.json (khi database bị tắt)"""
+
+    def __init__(self, results_dir: Path):
+        self.results_dir = Path(results_dir)
+        self._lock = threading.Lock()
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        # (trường, giá trị chuẩn hóa) -> tên giấy tờ; trường -> [(ngày, tên)] đã sắp xếp
+        self._by_value: Dict[Tuple[str, str], set] = {}
+        self._by_date: Dict[str, List[Tuple[date, str]]] = {}
+        self._loaded = False
+
+    def ensure_schema(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for name, result, mtime in iter_result_files(self.results_dir):
+                self._add_rows(name, field_rows(name, None, result, datetime.utcfromtimestamp(mtime)))
+            self._loaded = True
+
+    def is_empty(self) -> bool:
+        return False  # luôn dựng từ results/*.json, không cần backfill
+
+    def _add_rows(self, name: str, rows: List[Dict[str, Any]]) -> None:
+        self._remove_rows(name)
+        self._rows[name] = rows
+        for row in rows:
+            self._by_value.setdefault((row["field"], row["value_norm"]), set()).add(name)
+            if row["value_date"]:
+                bisect.insort(self._by_date.setdefault(row["field"], []), (row["value_date"], name))
+
+    def _remove_rows(self, name: str) -> None:
+        for row in self._rows.pop(name, []):
+            self._by_value.get((row["field"], row["value_norm"]), set()).discard(name)
+            if row["value_date"]:
+                dates = self._by_date.get(row["field"], [])
+                position = bisect.bisect_left(dates, (row["value_date"], name))
+                if position < len(dates) and dates[position] == (row["value_date"], name):
+                    del dates[position]
+
+    def add(self, filename: str, result: Dict[str, Any]) -> None:
+        self.ensure_schema()
+        name = result_name(filename)
+        with self._lock:
+            self._add_rows(name, field_rows(name, filename, result))
+
+    def remove(self, name: str) -> None:
+        self.ensure_schema()
+        with self._lock:
+            self._remove_rows(_document_key(name))
+
+    def find(self, field: str, value: Optional[str] = None, date_from: Optional[date] = None,
+             date_to: Optional[date] = None, doc_type: Optional[str] = None,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        self.ensure_schema()
+        with self._lock:
+            if value is not None:
+                names = self._by_value.get((field, normalize_value(value)), set())
+            else:
+                dates = self._by_date.get(field, [])
+                low = bisect.bisect_left(dates, (date_from or date.min, ""))
+                high = bisect.bisect_right(dates, (date_to or date.max, "\uffff"))
+                names = {name for _, name in dates[low:high]}
+            rows = [
+                row for name in names for row in self._rows.get(name, [])
+                if row["field"] == field
+                and (value is None or row["value_norm"] == normalize_value(value))
+                and (date_from is None or (row["value_date"] and row["value_date"] >= date_from))
+                and (date_to is None or (row["value_date"] and row["value_date"] <= date_to))
+                and (not doc_type or row["document_type"] == doc_type)
+            ]
+        if value is None:
+            rows.sort(key=lambda row: row["value_date"], reverse=True)
+        else:
+            rows.sort(key=lambda row: row["created_at"], reverse=True)
+        return [_match(row) for row in rows[:limit]]
+
+    def close(self) -> None:
+        pass
+
+
+def create_field_index(engine: Optional[Engine], session_factory, results_dir: Path):
+    """Bảng document_fields nếu có DB, ngược lại chỉ mục trong bộ nhớ từ results/"""
+    if engine is not None:
+        return SqlFieldIndex(engine, session_factory)
+    return FileFieldIndex(results_dir)
+
+
+def iter_result_files(results_dir: Path) -> Iterable[Tuple[str, Dict[str, Any], float]]:
+    """(tên kết quả, nội dung, mtime) của các file results/*.json đọc được"""
+    for result_file in Path(results_dir).glob("*.json"):
+        try:
+            with open(result_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Lỗi đọc file {result_file}: {e}")
+            continue
+        if isinstance(data, dict):
+            yield result_file.stem, data, result_file.stat().st_mtime
+
+
+def backfill_field_index(index: SqlFieldIndex, results_dir: Path, batch_size: int = 500) -> int:
+    """Migration: điền document_fields từ các dòng documents có sẵn, rồi từ results/*.json
+    của giấy tờ chưa có trong DB. Chạy lại an toàn (bỏ qua giấy tờ đã có)."""
+    indexed = index.indexed_names()
+    pending: List[Dict[str, Any]] = []
+    total = 0
+
+    def queue(rows: List[Dict[str, Any]]) -> None:
+        nonlocal pending, total
+        pending.extend(rows)
+        if len(pending) >= batch_size:
+            index.add_many(pending)
+            total += len(pending)
+            pending = []
+
+    # Duyệt bảng documents theo id (keyset) để không nạp tất cả vào bộ nhớ
+    last_id = 0
+    while True:
+        with index.session_factory() as session:
+            documents = session.execute(
+                select(Document.id, Document.filename, Document.document_type,
+                       Document.processed_data, Document.created_at)
+                .where(Document.id > last_id).order_by(Document.id).limit(batch_size)
+            ).all()
+        if not documents:
+            break
+        last_id = documents[-1].id
+        for document in documents:
+            name = result_name(document.filename)
+            if name in indexed:
+                continue
+            try:
+                data = json.loads(document.processed_data) if document.processed_data else None
+            except ValueError:
+                continue
+            indexed.add(name)
+            queue(field_rows(name, document.filename,
+                             {"document_type": document.document_type, "processed_data": data},
+                             document.created_at))
+
+    for name, result, mtime in iter_result_files(results_dir):
+        if name not in indexed:
+            indexed.add(name)
+            queue(field_rows(name, None, result, datetime.utcfromtimestamp(mtime)))
+
+    if pending:
+        index.add_many(pending)
+        total += len(pending)
+    return total
+
+
+def main() -> int:
+    """Lệnh migration: py field_index.py --backfill"""
+    from config import RESULTS_DIR
+    from db import db_session, init_db
+    from models import Base
+
+    parser = argparse.ArgumentParser(description="Chỉ mục trường thông tin CDS Scanner")
+    parser.add_argument("--backfill", action="store_true", help="Điền document_fields từ documents và results/")
+    args = parser.parse_args()
+
+    engine = init_db()
+    if engine is None:
+        print("Database bị tắt: chỉ mục trường được dựng trong bộ nhớ từ results/ khi server khởi động")
+        return 0
+    Base.metadata.create_all(bind=engine)
+    index = SqlFieldIndex(engine, db_session)
+    index.ensure_schema()
+    if args.backfill:
+        print(f"✅ Đã thêm {backfill_field_index(index, RESULTS_DIR)} dòng document_fields")
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,17 +1,23 @@
 import os
+from bisect import bisect_left
+from functools import lru_cache
 import numpy as np
 import torch
-import torchvision
-import torchvision.transforms as T
 from PIL import Image
-from torchvision.transforms.functional import InterpolationMode
-import transformers
 
 IMAGENET_MEAN = (0.485, 0.456, 0.406)
 IMAGENET_STD = (0.229, 0.224, 0.225)
 
+# Dạng tensor (3, 1, 1) để chuẩn hóa cả batch trong một phép tính
+_MEAN_TENSOR = torch.tensor(IMAGENET_MEAN).view(3, 1, 1)
+_STD_TENSOR = torch.tensor(IMAGENET_STD).view(3, 1, 1)
+
 def build_transform(input_size):
     """Xây dựng pipeline transform cho hình ảnh"""
+    # torchvision chỉ cần cho pipeline này (batched_preprocess không dùng)
+    import torchvision.transforms as T
+    from torchvision.transforms.functional import InterpolationMode
+    
     MEAN, STD = IMAGENET_MEAN, IMAGENET_STD
     transform = T.Compose([
         T.Lambda(lambda img: img.convert('RGB') if img.mode != 'RGB' else img),
@@ -40,24 +46,53 @@ def find_closest_aspect_ratio(aspect_ratio, target_ratios, width, height, image_
     
     return best_ratio
 
+@lru_cache(maxsize=None)
+def get_target_ratios(min_num=1, max_num=12):
+    """Bảng các lưới (cột, hàng) hợp lệ, sắp theo số khối - tính một lần cho mỗi (min_num, max_num)"""
+    target_ratios = sorted(
+        set(
+            (i, j) for n in range(min_num, max_num + 1)
+            for i in range(1, n + 1)
+            for j in range(1, n + 1)
+            if i * j <= max_num and i * j >= min_num
+        ),
+        key=lambda x: x[0] * x[1]
+    )
+    # Các tỷ lệ khác nhau (đã sắp) để tìm bằng bisect; mỗi tỷ lệ giữ các lưới
+    # tương ứng theo đúng thứ tự của target_ratios (cần cho luật hòa)
+    groups = {}
+    for ratio in target_ratios:
+        groups.setdefault(ratio[0] / ratio[1], []).append(ratio)
+    aspects = tuple(sorted(groups))
+    return tuple(target_ratios), aspects, tuple(tuple(groups[a]) for a in aspects)
+
+@lru_cache(maxsize=1024)
+def closest_grid(width, height, min_num=1, max_num=12, image_size=448):
+    """Lưới (cột, hàng) cho ảnh width x height, cùng kết quả với find_closest_aspect_ratio.
+    
+    Chỉ xét các tỷ lệ liền kề vị trí bisect; cache theo kích thước ảnh nên các
+    trang cùng khổ scan không phải tính lại.
+    """
+    target_ratios, aspects, groups = get_target_ratios(min_num, max_num)
+    aspect_ratio = width / height
+    index = bisect_left(aspects, aspect_ratio)
+    neighbours = [k for k in (index - 1, index) if 0 <= k < len(aspects)]
+    best_diff = min(abs(aspect_ratio - aspects[k]) for k in neighbours)
+    candidates = {
+        ratio for k in neighbours if abs(aspect_ratio - aspects[k]) == best_diff
+        for ratio in groups[k]
+    }
+    # Chạy luật chọn gốc trên các ứng viên, theo thứ tự của target_ratios
+    return find_closest_aspect_ratio(
+        aspect_ratio, [r for r in target_ratios if r in candidates], width, height, image_size
+    )
+
 def dynamic_preprocess(image, min_num=1, max_num=12, image_size=448, use_thumbnail=False):
     """Tiền xử lý hình ảnh động với việc chia thành các khối"""
     orig_width, orig_height = image.size
-    aspect_ratio = orig_width / orig_height
-    
-    # Tạo danh sách các tỷ lệ khung hình mục tiêu
-    target_ratios = set(
-        (i, j) for n in range(min_num, max_num + 1) 
-        for i in range(1, n + 1) 
-        for j in range(1, n + 1) 
-        if i * j <= max_num and i * j >= min_num
-    )
-    target_ratios = sorted(target_ratios, key=lambda x: x[0] * x[1])
     
-    # Tìm tỷ lệ khung hình gần nhất
-    target_aspect_ratio = find_closest_aspect_ratio(
-        aspect_ratio, target_ratios, orig_width, orig_height, image_size
-    )
+    # Tìm tỷ lệ khung hình gần nhất (bảng tỷ lệ và kết quả đều được cache)
+    target_aspect_ratio = closest_grid(orig_width, orig_height, min_num, max_num, image_size)
     
     target_width = image_size * target_aspect_ratio[0]
     target_height = image_size * target_aspect_ratio[1]
@@ -87,24 +122,48 @@ def dynamic_preprocess(image, min_num=1, max_num=12, image_size=448, use_thumbna
     
     return processed_images
 
+def _to_chw_uint8(image):
+    """PIL RGB -> tensor uint8 (3, H, W), chỉ một lần copy"""
+    return torch.from_numpy(np.array(image, dtype=np.uint8)).permute(2, 0, 1)
+
+def batched_preprocess(image, min_num=1, max_num=12, image_size=448, use_thumbnail=False):
+    """Giống dynamic_preprocess + build_transform nhưng xử lý cả batch một lần.
+    
+    Resize một lần, chuyển cả ảnh sang tensor một lần, cắt các khối bằng view
+    (không crop từng khối qua PIL), rồi ToTensor/Normalize trên cả batch.
+    Kết quả trùng với cách cũ (mỗi khối đã đúng image_size nên Resize của
+    transform không làm gì).
+    """
+    orig_width, orig_height = image.size
+    cols, rows = closest_grid(orig_width, orig_height, min_num, max_num, image_size)
+    blocks = cols * rows
+    with_thumbnail = use_thumbnail and blocks != 1
+    
+    resized = _to_chw_uint8(image.resize((image_size * cols, image_size * rows)))
+    batch = torch.empty((blocks + int(with_thumbnail), 3, image_size, image_size), dtype=torch.uint8)
+    
+    # (3, rows*S, cols*S) -> (rows, cols, 3, S, S): khối i = hàng i // cols, cột i % cols
+    batch[:blocks].view(rows, cols, 3, image_size, image_size).copy_(
+        resized.view(3, rows, image_size, cols, image_size).permute(1, 3, 0, 2, 4)
+    )
+    if with_thumbnail:
+        batch[blocks].copy_(_to_chw_uint8(image.resize((image_size, image_size))))
+    
+    # ToTensor + Normalize cho cả batch
+    pixel_values = batch.to(dtype=torch.get_default_dtype()).div_(255)
+    return pixel_values.sub_(_MEAN_TENSOR).div_(_STD_TENSOR)
+
 def load_image(image_file, input_size=448, max_num=12):
     """Tải và xử lý hình ảnh từ file"""
     image = Image.open(image_file).convert('RGB')
-    transform = build_transform(input_size=input_size)
     
-    # Tiền xử lý hình ảnh
-    images = dynamic_preprocess(
+    # Tiền xử lý và chuyển thành tensor theo batch
+    return batched_preprocess(
         image, 
         image_size=input_size, 
         use_thumbnail=True, 
         max_num=max_num
     )
-    
-    # Chuyển đổi thành tensor
-    pixel_values = [transform(image) for image in images]
-    pixel_values = torch.stack(pixel_values)
-    
-    return pixel_values
 
 def process_image_file(image_path, input_size=448, max_num=12):
     """Hàm tiện ích để xử lý file hình ảnh"""
@@ -127,6 +186,9 @@ def process_image_file(image_path, input_size=448, max_num=12):
 
 # Ví dụ sử dụng
 if __name__ == "__main__":
+    import torchvision
+    import transformers
+    
     # Kiểm tra xem có thể import các thư viện không
     print("Kiểm tra các thư viện đã cài đặt:")
     print(f"PyTorch version: {torch.__version__}")
@@ -138,6 +200,7 @@ if __name__ == "__main__":
     print("\nCác hàm đã sẵn sàng sử dụng:")
     print("- build_transform(input_size)")
     print("- find_closest_aspect_ratio(aspect_ratio, target_ratios, width, height, image_size)")
+    print("- closest_grid(width, height, min_num, max_num, image_size)")
     print("- dynamic_preprocess(image, min_num, max_num, image_size, use_thumbnail)")
     print("- load_image(image_file, input_size, max_num)")
     print("- process_image_file(image_path, input_size, max_num)") 
\ No newline at end of file
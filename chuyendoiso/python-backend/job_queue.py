@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hàng đợi job bền vững (SQLite) cho CDS Scanner
+Cho phép submit giấy tờ cần xử lý rồi poll trạng thái, không mất job khi restart
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import JOB_QUEUE_CONFIG
+
+# Trạng thái job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    stage TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS ix_jobs_batch ON jobs (batch_id);
+"""
+
+
+class JobRetryLater(Exception):
+    """Handler báo job cần được đưa lại vào hàng đợi (tài nguyên đang bận)"""
+
+
+class JobQueue:
+    """Hàng đợi job lưu trong file SQLite cục bộ"""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or JOB_QUEUE_CONFIG["db_path"])
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat()
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, filename: str, batch_id: Optional[str] = None) -> str:
+        """Thêm job mới, trả về job id"""
+        return self.submit_many([filename], batch_id)[0]
+
+    def submit_many(self, filenames: List[str], batch_id: Optional[str] = None) -> List[str]:
+        """Thêm nhiều job trong một transaction, trả về danh sách job id"""
+        now = self._now()
+        rows = [(uuid.uuid4().hex, batch_id, filename, JOB_QUEUED, now, now) for filename in filenames]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO jobs (id, batch_id, filename, status, progress, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 0, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [row[0] for row in rows]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy thông tin job theo id"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Lấy tất cả job thuộc một batch"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE batch_id = ? ORDER BY created_at, filename", (batch_id,)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Lấy job đang chờ lâu nhất và đánh dấu running (nguyên tử)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                    (JOB_QUEUED,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, progress = 5, stage = 'claimed', "
+                    "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (JOB_RUNNING, self._now(), row["id"]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = self._row_to_dict(row)
+        job["status"] = JOB_RUNNING
+        job["attempts"] += 1
+        return job
+
+    def update_progress(self, job_id: str, progress: int, stage: str) -> None:
+        """Cập nhật tiến độ (0-100) và giai đoạn xử lý"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ?, stage = ?, updated_at = ? WHERE id = ?",
+                (progress, stage, self._now(), job_id),
+            )
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Đánh dấu job hoàn thành và lưu kết quả"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, progress = 100, stage = 'done', result = ?, "
+                "error = NULL, updated_at = ? WHERE id = ?",
+                (JOB_DONE, json.dumps(result, ensure_ascii=False), self._now(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str, result: Optional[Dict[str, Any]] = None) -> None:
+        """Đánh dấu job thất bại"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, progress = 100, stage = 'failed', result = ?, "
+                "error = ?, updated_at = ? WHERE id = ?",
+                (
+                    JOB_FAILED,
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error,
+                    self._now(),
+                    job_id,
+                ),
+            )
+
+    def requeue(self, job_id: str) -> None:
+        """Đưa job về trạng thái chờ (ví dụ khi engine OCR đang đầy)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, progress = 0, stage = 'requeued', "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE id = ?",
+                (JOB_QUEUED, self._now(), job_id),
+            )
+
+    def recover(self) -> int:
+        """Sau khi restart: đưa các job đang chạy dở về hàng đợi"""
+        max_attempts = JOB_QUEUE_CONFIG.get("max_attempts", 3)
+        now = self._now()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, progress = 100, stage = 'failed', "
+                "error = 'Vượt quá số lần thử lại', updated_at = ? "
+                "WHERE status = ? AND attempts >= ?",
+                (JOB_FAILED, now, JOB_RUNNING, max_attempts),
+            )
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, progress = 0, stage = 'recovered', updated_at = ? "
+                "WHERE status = ?",
+                (JOB_QUEUED, now, JOB_RUNNING),
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Số job theo trạng thái"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class JobRunner:
+    """Chạy các consumer asyncio lấy job từ JobQueue và gọi handler"""
+
+    def __init__(self, queue: JobQueue, handler: JobHandler, concurrency: int = 1):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = JOB_QUEUE_CONFIG.get("poll_interval", 1.0)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Khởi động các consumer trên event loop hiện tại"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Dừng consumer; job đang chạy dở sẽ được recover khi khởi động lại"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Đánh thức consumer khi có job mới"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _consume(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self.queue.claim_next)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                result = await self.handler(job)
+            except asyncio.CancelledError:
+                raise
+            except JobRetryLater:
+                await asyncio.to_thread(self.queue.requeue, job["id"])
+                await asyncio.sleep(self.poll_interval)
+                continue
+            except Exception as e:
+                await asyncio.to_thread(self.queue.fail, job["id"], str(e))
+                continue
+
+            if result.get("success"):
+                await asyncio.to_thread(self.queue.complete, job["id"], result)
+            else:
+                await asyncio.to_thread(
+                    self.queue.fail, job["id"], result.get("error") or "Lỗi xử lý", result
+                )
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Phân tích bố cục trang cho CDS Scanner
+Tìm các khối chữ trên ảnh đã nhị phân hóa (morphology + connected components)
+để chỉ OCR những vùng đó thay vì cả trang (lề, logo, vùng ảnh đặc)
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from config import LAYOUT_CONFIG
+
+# (x, y, width, height)
+Box = Tuple[int, int, int, int]
+
+
+def find_text_regions(binary: np.ndarray, config: Dict[str, Any] = LAYOUT_CONFIG) -> List[Box]:
+    """Tìm các khối chữ trên ảnh nhị phân (chữ đen trên nền trắng), theo thứ tự đọc"""
+    height, width = binary.shape[:2]
+    ink = cv2.bitwise_not(binary)
+
+    # Nối các ký tự gần nhau thành dòng/khối: kernel ngang rộng hơn kernel dọc
+    kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT,
+        (max(1, int(width * config["merge_x"])), max(1, int(height * config["merge_y"]))),
+    )
+    merged = cv2.dilate(ink, kernel)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(merged, connectivity=8)
+
+    boxes: List[Box] = []
+    for x, y, box_width, box_height, _ in stats[1:count]:
+        if box_height < config["min_height"] or box_width * box_height < config["min_area"]:
+            continue  # chấm nhiễu, vết bẩn
+        density = cv2.countNonZero(ink[y:y + box_height, x:x + box_width]) / float(box_width * box_height)
+        if density > config["max_ink_density"]:
+            continue  # vùng ảnh/logo đặc, không phải chữ
+        boxes.append((int(x), int(y), int(box_width), int(box_height)))
+    return reading_order(boxes)
+
+
+def reading_order(boxes: List[Box]) -> List[Box]:
+    """Sắp xếp khối theo thứ tự đọc: từng hàng từ trên xuống, trong hàng từ trái sang"""
+    rows: List[List[Box]] = []
+    row_bottom = -1
+    for box in sorted(boxes, key=lambda b: (b[1], b[0])):
+        center_y = box[1] + box[3] / 2
+        if rows and center_y < row_bottom:
+            rows[-1].append(box)
+            row_bottom = max(row_bottom, box[1] + box[3])
+        else:
+            rows.append([box])
+            row_bottom = box[1] + box[3]
+    return [box for row in rows for box in sorted(row, key=lambda b: b[0])]
+
+
+def crop_region(image: np.ndarray, box: Box, padding: int = LAYOUT_CONFIG["padding"]) -> np.ndarray:
+    """Cắt vùng kèm lề trắng nhỏ (Tesseract nhận diện kém khi chữ sát mép ảnh)"""
+    x, y, box_width, box_height = box
+    height, width = image.shape[:2]
+    crop = image[max(0, y - padding):min(height, y + box_height + padding),
+                 max(0, x - padding):min(width, x + box_width + padding)]
+    return cv2.copyMakeBorder(crop, padding, padding, padding, padding, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+
+
+def mask_outside_regions(image: np.ndarray, boxes: List[Box]) -> np.ndarray:
+    """Tô trắng mọi thứ ngoài các khối chữ, cắt theo khung bao của chúng
+    (dùng khi OCR tất cả các khối bằng một lần gọi)"""
+    left = min(x for x, _, _, _ in boxes)
+    top = min(y for _, y, _, _ in boxes)
+    right = max(x + w for x, _, w, _ in boxes)
+    bottom = max(y + h for _, y, _, h in boxes)
+    masked = np.full_like(image[top:bottom, left:right], 255)
+    for x, y, box_width, box_height in boxes:
+        masked[y - top:y - top + box_height, x - left:x - left + box_width] = \
+            image[y:y + box_height, x:x + box_width]
+    return masked
+
+
+def region_coverage(boxes: List[Box], shape) -> float:
+    """Tỉ lệ diện tích trang mà các khối chiếm"""
+    page_area = float(shape[0] * shape[1]) or 1.0
+    return sum(w * h for _, _, w, h in boxes) / page_area
@@ -8,7 +8,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Integer, String, Text
+from sqlalchemy import Column, Date, DateTime, Index, Integer, String, Text, Unicode
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -21,10 +21,79 @@ class Document(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     filename = Column(String(255), nullable=False, index=True)
+    # Tên file kết quả (<stem>_result); cột thêm sau nên bảng cũ được điền bởi ensure_schema
+    result_name = Column(String(255), nullable=True, index=True)
     document_type = Column(String(100), nullable=True, index=True)
     extracted_text = Column(Text, nullable=True)
     processed_data = Column(Text, nullable=True)  # store JSON as text for MSSQL compatibility
     confidence = Column(String(50), nullable=True)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
 
+    __table_args__ = (
+        # Keyset pagination cho /documents (lọc theo loại, mới nhất trước)
+        Index("ix_documents_type_created_id", "document_type", "created_at", "id"),
+        Index("ix_documents_created_id", "created_at", "id"),
+    )
 
+
+class DocumentStat(Base):
+    """Bộ đếm thống kê được cập nhật tăng dần (materialized cho /stats)"""
+    __tablename__ = "document_stats"
+
+    bucket_kind = Column(String(20), primary_key=True)  # total, type, day, confidence
+    bucket_key = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class DocumentField(Base):
+    """Một trường đã trích xuất của một giấy tờ (thay cho việc parse JSON processed_data)"""
+    __tablename__ = "document_fields"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_name = Column(String(255), nullable=False)  # tên file kết quả (không có .json)
+    source_filename = Column(String(255), nullable=True)
+    document_type = Column(String(100), nullable=True)
+    field = Column(String(50), nullable=False)
+    value = Column(Unicode(255), nullable=False)
+    value_norm = Column(String(255), nullable=False)  # bỏ dấu, chữ thường, gộp khoảng trắng
+    value_date = Column(Date, nullable=True)  # ngày ISO nếu giá trị là ngày
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # ho_ten / ma_nhan_vien / so_quyet_dinh = ..., lọc thêm theo loại giấy tờ
+        Index("ix_document_fields_field_value_type", "field", "value_norm", "document_type"),
+        # ngay_hieu_luc / ngay_ky trong khoảng
+        Index("ix_document_fields_field_date", "field", "value_date"),
+        Index("ix_document_fields_document", "document_name"),
+    )
+
+
+class Employee(Base):
+    """Nhân viên đã gặp trong giấy tờ có mã nhân viên (để gắn quyết định chỉ có họ tên)"""
+    __tablename__ = "employees"
+
+    ma_nhan_vien = Column(String(50), primary_key=True)
+    ho_ten = Column(Unicode(255), nullable=True)
+    ho_ten_norm = Column(String(255), nullable=True, index=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class EmployeeEvent(Base):
+    """Một mốc trong hồ sơ nhân viên (hợp đồng, bổ nhiệm, điều chuyển, khen thưởng/kỷ luật)"""
+    __tablename__ = "employee_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Mã nhân viên, hoặc "ten:<họ tên chuẩn hóa>" khi chưa xác định được mã
+    employee_key = Column(String(300), nullable=False)
+    ho_ten_norm = Column(String(255), nullable=True)
+    document_name = Column(String(255), nullable=False, index=True)
+    source_filename = Column(String(255), nullable=True)
+    document_type = Column(String(100), nullable=True)
+    event_date = Column(Date, nullable=True)
+    details = Column(Text, nullable=True)  # JSON các trường đã trích xuất
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # GET /employees/{ma_nhan_vien}: một index seek, đã theo thứ tự thời gian
+        Index("ix_employee_events_key_date", "employee_key", "event_date", "id"),
+    )
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend OCR cho CDS Scanner
+tesserocr: engine Tesseract nằm trong process, nạp traineddata vie+eng một lần
+và nhận trực tiếp mảng numpy; pytesseract (mỗi lần gọi một process tesseract)
+được giữ làm phương án dự phòng
+"""
+
+from __future__ import annotations
+
+import queue
+import re
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from config import TESSERACT_CONFIG
+
+try:
+    import tesserocr
+except ImportError:  # tesserocr là tùy chọn
+    tesserocr = None
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+
+def parse_tesseract_options(config: str) -> Tuple[int, int]:
+    """Lấy (psm, oem) từ chuỗi cấu hình dạng '--psm 6 --oem 3'"""
+    psm = re.search(r"--psm\s+(\d+)", config)
+    oem = re.search(r"--oem\s+(\d+)", config)
+    return int(psm.group(1)) if psm else 6, int(oem.group(1)) if oem else 3
+
+
+class TesserocrBackend:
+    """Engine Tesseract dùng chung trong process (PyTessBaseAPI).
+
+    Mỗi PyTessBaseAPI chỉ phục vụ một luồng tại một thời điểm; để OCR song song
+    nhiều vùng, backend giữ tối đa max_instances engine, tạo thêm khi cần.
+    """
+
+    name = "tesserocr"
+    concurrent = True
+
+    def __init__(self, lang: str = TESSERACT_CONFIG["lang"], config: str = TESSERACT_CONFIG["config"],
+                 tessdata_path: Optional[str] = TESSERACT_CONFIG.get("tessdata_path"),
+                 max_instances: int = 1):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr chưa được cài đặt")
+        self.psm, oem = parse_tesseract_options(config)
+        self._kwargs = {"lang": lang, "psm": self.psm, "oem": oem}
+        if tessdata_path:
+            self._kwargs["path"] = str(tessdata_path)
+        self.max_instances = max(1, max_instances)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._apis = []
+        # Nạp traineddata một lần; các lần OCR sau chỉ đổi ảnh
+        self._idle.put(self._new_api())
+
+    def _new_api(self):
+        api = tesserocr.PyTessBaseAPI(**self._kwargs)
+        self._created += 1
+        self._apis.append(api)
+        return api
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_instances:
+                return self._new_api()
+        return self._idle.get()
+
+    def image_to_string(self, image: np.ndarray, psm: Optional[int] = None) -> str:
+        """OCR ảnh numpy (grayscale hoặc BGR) mà không ghi file tạm"""
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        if channels == 3:
+            image = np.ascontiguousarray(image[:, :, ::-1])  # BGR (OpenCV) -> RGB
+
+        api = self._acquire()
+        try:
+            api.SetPageSegMode(psm if psm is not None else self.psm)
+            api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+    def close(self) -> None:
+        for api in self._apis:
+            api.End()
+
+
+class PytesseractBackend:
+    """Gọi tesseract qua pytesseract (mỗi lần gọi là một process mới)"""
+
+    name = "pytesseract"
+    concurrent = False
+
+    def __init__(self, lang: str = TESSERACT_CONFIG["lang"], config: str = TESSERACT_CONFIG["config"]):
+        if pytesseract is None:
+            raise RuntimeError("pytesseract chưa được cài đặt")
+        if TESSERACT_CONFIG.get("tesseract_cmd"):
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CONFIG["tesseract_cmd"]
+        self.lang = lang
+        self.config = config
+        self.psm, _ = parse_tesseract_options(config)
+
+    def image_to_string(self, image: np.ndarray, psm: Optional[int] = None) -> str:
+        config = self.config
+        if psm is not None and psm != self.psm:
+            config = re.sub(r"--psm\s+\d+", f"--psm {psm}", config)
+        return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def close(self) -> None:
+        pass
+
+
+def create_ocr_backend(backend: str = TESSERACT_CONFIG.get("backend", "auto"), max_instances: int = 1):
+    """Tạo backend OCR theo cấu hình: auto (ưu tiên tesserocr), tesserocr, pytesseract, vision"""
+    if backend == "vision":
+        from vision_inference import get_vision_service
+        return get_vision_service()
+    if backend in ("auto", "tesserocr"):
+        try:
+            return TesserocrBackend(max_instances=max_instances)
+        except Exception as e:
+            if backend == "tesserocr":
+                raise
+            print(f"⚠️ Không dùng được tesserocr ({e}), chuyển sang pytesseract")
+    return PytesseractBackend()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Engine OCR chạy trên process pool cho CDS Scanner
+Đưa tiền xử lý ảnh + Tesseract ra khỏi event loop của FastAPI
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Dict, Optional, Set, Tuple
+
+from config import PERFORMANCE_CONFIG, TESSERACT_CONFIG
+from result_cache import ResultCache
+
+# DocumentProcessor của worker process hiện tại (mỗi worker tạo một lần và giữ lại)
+_worker_processor = None
+
+
+def _init_worker(worker_pids=None) -> None:
+    """Khởi tạo DocumentProcessor một lần cho mỗi worker process"""
+    global _worker_processor
+    if worker_pids is not None:
+        # Báo PID để engine dừng được worker bị treo
+        worker_pids.put(os.getpid())
+    from document_processor import DocumentProcessor
+    _worker_processor = DocumentProcessor()
+    if TESSERACT_CONFIG.get("backend") == "vision":
+        # Nạp mô hình vision ngay khi worker khởi động, không đợi giấy tờ đầu tiên
+        _worker_processor.ocr_backend
+
+
+def _run_process_document(image_path: str) -> Dict[str, Any]:
+    """Chạy trong worker: xử lý một giấy tờ bằng processor của worker"""
+    return _worker_processor.process_document(image_path)
+
+
+def _run_process_image_bytes(data: bytes) -> Dict[str, Any]:
+    """Chạy trong worker: xử lý giấy tờ từ nội dung file trong bộ nhớ"""
+    return _worker_processor.process_image_bytes(data)
+
+
+class OCRQueueFullError(RuntimeError):
+    """Hàng đợi OCR đã đầy (vượt quá max_concurrent_requests)"""
+
+
+class OCRTimeoutError(TimeoutError):
+    """Xử lý OCR vượt quá ocr_timeout"""
+
+
+class OCREngine:
+    """Process pool xử lý OCR với hàng đợi giới hạn và timeout"""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache: Optional[ResultCache] = None,
+    ):
+        self.max_workers = max_workers or PERFORMANCE_CONFIG.get("max_workers", 4)
+        # Số yêu cầu tối đa đang chờ + đang chạy; vượt quá thì từ chối ngay
+        self.max_pending = max_pending or PERFORMANCE_CONFIG.get("max_concurrent_requests", 10)
+        self.timeout = timeout or PERFORMANCE_CONFIG.get("ocr_timeout", 45)
+        self.cache = cache if cache is not None else ResultCache.from_config()
+        self._executor: Optional[Executor] = None
+        self._worker_pids = None  # hàng đợi PID worker của pool hiện tại
+        self._inflight: Set[Future] = set()  # tác vụ đã gửi vào pool hiện tại
+        self._executor_lock = threading.Lock()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._rejected = 0
+        self._recycled = 0
+
+    def _new_executor(self) -> Tuple[Executor, Any]:
+        """Tạo pool mới, trả về (pool, hàng đợi PID worker)"""
+        # spawn để worker không kế thừa event loop/thread của uvicorn
+        context = multiprocessing.get_context("spawn")
+        worker_pids = context.SimpleQueue()
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(worker_pids,),
+        )
+        return executor, worker_pids
+
+    def _start_locked(self) -> Executor:
+        if self._executor is None:
+            self._executor, self._worker_pids = self._new_executor()
+            self._inflight = set()
+        return self._executor
+
+    def start(self) -> None:
+        """Khởi động process pool (idempotent)"""
+        with self._executor_lock:
+            self._start_locked()
+
+    def _detach(self, executor: Optional[Executor] = None):
+        """Tách pool hiện tại khỏi engine (chỉ khi vẫn là executor, nếu có truyền).
+
+        Trả về (pool, hàng đợi PID, các tác vụ còn chạy) hoặc None nếu pool
+        đã được người khác thay; yêu cầu mới sẽ dùng pool mới.
+        """
+        with self._executor_lock:
+            if self._executor is None or (executor is not None and self._executor is not executor):
+                return None
+            detached = (self._executor, self._worker_pids, set(self._inflight))
+            self._executor, self._worker_pids, self._inflight = None, None, set()
+            return detached
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Dừng process pool, hủy các tác vụ chưa chạy"""
+        detached = self._detach()
+        if detached is not None:
+            detached[0].shutdown(wait=wait, cancel_futures=True)
+
+    def _restart(self, executor: Executor) -> None:
+        """Bỏ pool bị hỏng (BrokenProcessPool); pool mới được tạo ở yêu cầu kế tiếp.
+
+        Mọi yêu cầu đang chờ trên pool hỏng đều nhận BrokenProcessPool, nhưng chỉ
+        người đầu tiên thay pool; những người sau không đụng tới pool mới.
+        """
+        detached = self._detach(executor)
+        if detached is not None:
+            detached[0].shutdown(wait=False, cancel_futures=True)
+
+    def _recycle(self, executor: Executor, hung: Future) -> None:
+        """Thay pool có worker bị treo sau timeout.
+
+        Yêu cầu mới chạy trên pool mới ngay; pool cũ được chạy nốt các tác vụ
+        khác (tối đa thêm một timeout) rồi mới dừng hẳn các worker của nó.
+        """
+        detached = self._detach(executor)
+        if detached is None:
+            return
+        self._recycled += 1
+        old_executor, worker_pids, inflight = detached
+        inflight.discard(hung)
+        threading.Thread(
+            target=self._reap, args=(old_executor, worker_pids, inflight, hung),
+            name="ocr-reaper", daemon=True,
+        ).start()
+
+    def _reap(self, executor: Executor, worker_pids, inflight: Set[Future], hung: Future) -> None:
+        wait(inflight, timeout=self.timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if worker_pids is None:
+            return
+        # Worker chết làm tác vụ treo kết thúc (BrokenProcessPool) và trả chỗ;
+        # lặp lại vì worker vừa được tạo có thể chưa kịp báo PID
+        while not hung.done():
+            while not worker_pids.empty():
+                try:
+                    os.kill(worker_pids.get(), signal.SIGTERM)
+                except OSError:
+                    pass  # worker đã thoát
+            wait([hung], timeout=0.5)
+
+    def _release(self, _future=None) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _forget(self, inflight: Set[Future], future: Future) -> None:
+        with self._executor_lock:
+            inflight.discard(future)
+
+    async def run(self, func, *args) -> Any:
+        """Chạy func(*args) trong worker, tôn trọng giới hạn hàng đợi và timeout.
+
+        Chỗ trong hàng đợi chỉ được trả khi tác vụ thật sự kết thúc, nên
+        max_pending giới hạn đúng công việc đang chiếm worker. Tác vụ treo quá
+        timeout bị dừng cùng worker của nó (xem _recycle) để trả lại chỗ.
+        """
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise OCRQueueFullError(
+                    f"Hàng đợi OCR đã đầy ({self._pending}/{self.max_pending})"
+                )
+            self._pending += 1
+
+        executor = None
+        try:
+            with self._executor_lock:
+                executor = self._start_locked()
+                future = executor.submit(func, *args)
+                inflight = self._inflight
+                inflight.add(future)
+        except BaseException as e:
+            self._release()
+            if isinstance(e, BrokenProcessPool):
+                self._failed += 1
+                self._restart(executor)
+            raise
+        future.add_done_callback(self._release)
+        future.add_done_callback(partial(self._forget, inflight))
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            # Hủy nếu chưa được worker nhận; nếu worker đang chạy thì thay pool và dừng worker
+            if not future.cancel():
+                self._recycle(executor, future)
+            raise OCRTimeoutError(f"OCR vượt quá {self.timeout} giây")
+        except BrokenProcessPool:
+            self._failed += 1
+            self._restart(executor)
+            raise
+        self._completed += 1
+        return result
+
+    async def process_document(self, image_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Xử lý giấy tờ trong process pool, dùng cache theo nội dung file.
+
+        content_hash: SHA-256 đã tính lúc upload (bỏ qua bước đọc lại file để hash)
+        """
+        if self.cache is None:
+            return await self.run(_run_process_document, image_path)
+
+        if content_hash is not None:
+            key = self.cache.make_key(content_hash)
+        else:
+            key = await asyncio.to_thread(self.cache.key_for_file, image_path)
+        return await self._run_cached(key, _run_process_document, image_path)
+
+    async def process_bytes(self, data: bytes, content_hash: str) -> Dict[str, Any]:
+        """Xử lý giấy tờ từ bytes đã upload (giải mã trong worker, không qua đĩa)"""
+        if self.cache is None:
+            return await self.run(_run_process_image_bytes, data)
+        return await self._run_cached(self.cache.make_key(content_hash), _run_process_image_bytes, data)
+
+    async def _run_cached(self, key: str, func, arg) -> Dict[str, Any]:
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return dict(cached)
+
+        result = await self.run(func, arg)
+        if "error" not in result:
+            await asyncio.to_thread(self.cache.set, key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Thông số hoạt động của engine"""
+        return {
+            "running": self._executor is not None,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "timeout": self.timeout,
+            "pending": self._pending,
+            "completed": self._completed,
+            "failed": self._failed,
+            "timed_out": self._timed_out,
+            "rejected": self._rejected,
+            "recycled": self._recycled,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
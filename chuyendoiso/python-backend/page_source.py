@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đọc từng trang của giấy tờ cho CDS Scanner
+TIFF nhiều frame và PDF nhiều trang được đọc/rasterize lần lượt từng trang
+(generator), nên bộ nhớ chỉ giữ vài trang dù tài liệu dài bao nhiêu
+"""
+
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence
+
+from config import PAGE_CONFIG
+from preprocessing import read_dpi
+from upload_storage import SNIFF_BYTES, sniff_image_type
+
+Source = Union[str, Path, bytes]
+
+
+@dataclass
+class PageImage:
+    """Một trang đã giải mã (BGR) kèm DPI nếu biết"""
+    number: int
+    image: np.ndarray
+    dpi: Optional[float] = None
+
+
+def _head(source: Source) -> bytes:
+    if isinstance(source, bytes):
+        return source[:SNIFF_BYTES]
+    with open(source, "rb") as f:
+        return f.read(SNIFF_BYTES)
+
+
+def _iter_tiff(source: Source, max_pages: int) -> Iterator[PageImage]:
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as tiff:
+        for index, frame in enumerate(ImageSequence.Iterator(tiff)):
+            if index >= max_pages:
+                break
+            dpi = frame.info.get("dpi")
+            rgb = np.asarray(frame.convert("RGB"))
+            yield PageImage(index + 1, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), float(dpi[0]) if dpi else None)
+
+
+def _iter_pdf(source: Source, max_pages: int, dpi: int) -> Iterator[PageImage]:
+    try:
+        import pypdfium2 as pdfium  # chỉ nạp khi gặp file PDF
+    except ImportError:
+        raise RuntimeError("Cần cài pypdfium2 để xử lý file PDF")
+    pdf = pdfium.PdfDocument(source if isinstance(source, bytes) else str(source))
+    try:
+        for index in range(min(len(pdf), max_pages)):
+            page = pdf[index]
+            try:
+                # Rasterize thẳng ra mảng BGR, không qua file tạm
+                bitmap = page.render(scale=dpi / 72, grayscale=False, rev_byteorder=False)
+                image = np.array(bitmap.to_numpy()[:, :, :3])
+            finally:
+                page.close()
+            yield PageImage(index + 1, image, float(dpi))
+    finally:
+        pdf.close()
+
+
+def iter_pages(source: Source, max_pages: int = PAGE_CONFIG["max_pages"],
+               pdf_dpi: int = PAGE_CONFIG["pdf_dpi"]) -> Iterator[PageImage]:
+    """Sinh lần lượt các trang của file ảnh/TIFF/PDF (đường dẫn hoặc bytes)"""
+    content_type = sniff_image_type(_head(source))
+    if content_type == "application/pdf":
+        yield from _iter_pdf(source, max_pages, pdf_dpi)
+    elif content_type == "image/tiff":
+        yield from _iter_tiff(source, max_pages)
+    else:
+        if isinstance(source, bytes):
+            image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_COLOR)
+        else:
+            image = cv2.imread(str(source))
+        if image is None:
+            raise ValueError("Không thể đọc hình ảnh")
+        yield PageImage(1, image, read_dpi(source))
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache kết quả OCR theo nội dung file (SHA-256) cho CDS Scanner
+Scan upload lại không phải chạy lại tiền xử lý + Tesseract
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    CACHE_CONFIG, DOCUMENT_TYPES, HEADER_CLASSIFICATION_CONFIG, IMAGE_PROCESSING, LAYOUT_CONFIG,
+    PAGE_CONFIG, PREPROCESSING_CONFIG, TESSERACT_CONFIG, VISION_CONFIG
+)
+
+# Tăng khi thay đổi logic xử lý làm kết quả cũ không còn đúng
+CACHE_VERSION = 3
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    """Tính SHA-256 của file theo từng chunk"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _result_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Bỏ các khóa chỉ ảnh hưởng tốc độ/song song, không ảnh hưởng kết quả"""
+    return {key: value for key, value in config.items() if key != "max_workers"}
+
+
+def ocr_config_fingerprint() -> str:
+    """Chuỗi đại diện cấu hình OCR; đổi cấu hình thì key cache cũng đổi.
+
+    Gồm cả cấu hình tiền xử lý, bố cục, header-first, trang và psm theo loại
+    giấy tờ, nên chỉnh các cấu hình này không trả về kết quả cũ.
+    """
+    vision = TESSERACT_CONFIG.get("backend") == "vision"
+    return json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "lang": TESSERACT_CONFIG.get("lang"),
+            "config": TESSERACT_CONFIG.get("config"),
+            "backend": TESSERACT_CONFIG.get("backend"),
+            "vision_model": (VISION_CONFIG["model_path"], VISION_CONFIG.get("quantization"))
+            if vision else None,
+            "vision": {
+                "max_num": VISION_CONFIG.get("max_num"),
+                "question": VISION_CONFIG.get("question"),
+                "generation_config": VISION_CONFIG.get("generation_config"),
+                "image_processing": IMAGE_PROCESSING,
+            } if vision else None,
+            "preprocessing": PREPROCESSING_CONFIG,
+            "layout": _result_settings(LAYOUT_CONFIG),
+            "header": HEADER_CLASSIFICATION_CONFIG,
+            "pages": _result_settings(PAGE_CONFIG),
+            "type_ocr": {name: spec.get("ocr") for name, spec in DOCUMENT_TYPES.items()},
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+
+class ResultCache:
+    """Cache LRU + TTL trong bộ nhớ, có thêm tầng lưu trên đĩa (tùy chọn).
+
+    Tầng đĩa được dọn định kỳ: xóa file hết hạn, rồi xóa file cũ nhất khi vượt
+    disk_max_entries hoặc disk_max_bytes.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: float = 3600,
+        disk_dir: Optional[Path] = None,
+        disk_max_entries: int = 10000,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+        disk_sweep_interval: float = 600,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_sweep_interval = disk_sweep_interval
+        # Ước lượng dung lượng tầng đĩa (chính xác sau mỗi lần dọn, cộng dồn khi ghi)
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self.disk_evictions = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self._fingerprint = ocr_config_fingerprint()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls) -> Optional["ResultCache"]:
+        """Tạo cache theo CACHE_CONFIG; trả về None nếu cache bị tắt"""
+        if not CACHE_CONFIG.get("enabled"):
+            return None
+        return cls(
+            max_size=CACHE_CONFIG.get("max_size", 1000),
+            ttl=CACHE_CONFIG.get("ttl", 3600),
+            disk_dir=CACHE_CONFIG.get("disk_dir") if CACHE_CONFIG.get("disk_enabled") else None,
+            disk_max_entries=CACHE_CONFIG.get("disk_max_entries", 10000),
+            disk_max_bytes=CACHE_CONFIG.get("disk_max_bytes", 512 * 1024 * 1024),
+            disk_sweep_interval=CACHE_CONFIG.get("disk_sweep_interval", 600),
+        )
+
+    def make_key(self, content_hash: str) -> str:
+        """Key cache = SHA-256(nội dung file + cấu hình OCR)"""
+        return hashlib.sha256(f"{content_hash}|{self._fingerprint}".encode("utf-8")).hexdigest()
+
+    def key_for_file(self, path: str) -> str:
+        return self.make_key(hash_file(path))
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Lấy kết quả đã cache (None nếu không có hoặc đã hết hạn)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self._disk_get(key, now)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._memory_set(key, value, now)
+            return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Lưu kết quả vào cache (bộ nhớ và đĩa nếu bật)"""
+        now = time.time()
+        self._memory_set(key, value, now)
+        self._disk_set(key, value)
+
+    def _memory_set(self, key: str, value: Dict[str, Any], stored_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            if now - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_set(self, key: str, value: Dict[str, Any]) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        # Tên tạm riêng cho mỗi lần ghi: hai thread cùng ghi một key không đè file của nhau
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            path.parent.mkdir(exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            tmp_path.unlink(missing_ok=True)
+            print(f"Lỗi ghi cache: {e}")
+            return
+        with self._lock:
+            self._disk_entries += 1
+            self._disk_bytes += size
+            due = (
+                time.time() - self._last_sweep >= self.disk_sweep_interval
+                or self._disk_entries > self.disk_max_entries
+                or self._disk_bytes > self.disk_max_bytes
+            )
+        if due:
+            self.sweep_disk()
+
+    def _disk_files(self) -> List[Tuple[float, int, Path]]:
+        files = []
+        for path in self.disk_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def sweep_disk(self) -> int:
+        """Xóa file hết hạn và file cũ nhất khi vượt giới hạn; trả về số file đã xóa"""
+        if self.disk_dir is None or not self._sweep_lock.acquire(blocking=False):
+            return 0  # một luồng khác đang dọn
+        try:
+            now = time.time()
+            removed = 0
+            kept = []
+            for mtime, size, path in self._disk_files():
+                if now - mtime > self.ttl:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                else:
+                    kept.append((mtime, size, path))
+
+            kept.sort()
+            total_bytes = sum(size for _, size, _ in kept)
+            evict = 0
+            while evict < len(kept) and (
+                len(kept) - evict > self.disk_max_entries or total_bytes > self.disk_max_bytes
+            ):
+                _, size, path = kept[evict]
+                path.unlink(missing_ok=True)
+                total_bytes -= size
+                evict += 1
+
+            with self._lock:
+                self._disk_entries = len(kept) - evict
+                self._disk_bytes = total_bytes
+                self._last_sweep = now
+                self.disk_evictions += removed + evict
+            return removed + evict
+        finally:
+            self._sweep_lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Thông số cache"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "disk": self.disk_dir is not None,
+                "disk_entries": self._disk_entries,
+                "disk_evictions": self.disk_evictions,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
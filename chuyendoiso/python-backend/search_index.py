@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tìm kiếm toàn văn trên văn bản OCR cho CDS Scanner
+SQLite FTS5 khi chạy cục bộ (cùng file DB, hoặc results/search.db khi tắt DB),
+SQL Server Full-Text Search khi dùng MSSQL. Văn bản được bỏ dấu tiếng Việt
+trước khi đánh chỉ mục nên "nguyen van a" tìm được "Nguyễn Văn A".
+"""
+
+from __future__ import annotations
+
+import html
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, MetaData, PrimaryKeyConstraint, String, Table, Unicode,
+    delete, func, insert, select, text,
+)
+from sqlalchemy.engine import Engine
+
+from config import SEARCH_CONFIG
+from document_index import DocumentWriteBuffer, result_name
+
+_TERM = re.compile(r"\w+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=None)
+def _fold_char(char: str) -> str:
+    if char in "đĐ":
+        return "d"
+    base = "".join(c for c in unicodedata.normalize("NFD", char) if not unicodedata.combining(c)).lower()
+    # Giữ nguyên độ dài: vị trí trong văn bản đã bỏ dấu trùng với văn bản gốc (NFC)
+    return base if len(base) == 1 else char
+
+
+def fold_text(text: str) -> str:
+    """Bỏ dấu tiếng Việt + chữ thường, cùng độ dài với unicodedata.normalize('NFC', text)"""
+    return "".join(map(_fold_char, unicodedata.normalize("NFC", text)))
+
+
+def parse_query(query: str) -> Tuple[List[str], bool]:
+    """(các từ đã bỏ dấu, có phải tìm cụm chính xác không); "..." là tìm theo cụm"""
+    stripped = query.strip()
+    phrase = len(stripped) > 1 and stripped.startswith('"') and stripped.endswith('"')
+    return _TERM.findall(fold_text(stripped)), phrase
+
+
+def make_snippet(content: str, terms: List[str], width: int = SEARCH_CONFIG["snippet_chars"]) -> str:
+    """Đoạn trích quanh vùng có nhiều từ khớp nhất, từ khớp bọc trong <mark> (đã escape HTML)"""
+    original = unicodedata.normalize("NFC", content)
+    folded = fold_text(original)
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\b") if terms else None
+    matches = [m.span() for m in pattern.finditer(folded)] if pattern else []
+
+    start = 0
+    if matches:
+        # Cửa sổ bắt đầu ngay trước từ khớp có nhiều từ khớp khác theo sau nhất
+        best = max(matches, key=lambda span: sum(1 for s, _ in matches if span[0] <= s < span[0] + width))
+        start = max(0, best[0] - width // 4)
+    end = min(len(original), start + width)
+
+    parts, position = [], start
+    for match_start, match_end in matches:
+        if match_start < start or match_end > end:
+            continue
+        parts.append(html.escape(original[position:match_start]))
+        parts.append(f"<mark>{html.escape(original[match_start:match_end])}</mark>")
+        position = match_end
+    parts.append(html.escape(original[position:end]))
+    snippet = _WHITESPACE.sub(" ", "".join(parts)).strip()
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(original) else "")
+
+
+def _search_row(source: Optional[str], name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    content = result.get("extracted_text") or ""
+    return {
+        "name": name,
+        "source_filename": source,
+        "document_type": result.get("document_type"),
+        "created_at": datetime.utcnow(),
+        "content": content,
+        "folded": fold_text(content),
+    }
+
+
+def _index_key(name: str) -> str:
+    """Khóa chỉ mục là tên kết quả ('<stem>_result'); nhận cả tên file upload"""
+    return name if name.endswith("_result") else result_name(name)
+
+
+def phrase_first(query_fn, query: str, doc_type: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """Kết quả khớp nguyên cụm xếp trước, sau đó các giấy tờ chỉ chứa đủ các từ.
+
+    query_fn(terms, phrase, doc_type, limit) chạy một truy vấn trên chỉ mục.
+    """
+    terms, phrase = parse_query(query)
+    if not terms:
+        return []
+    hits = query_fn(terms, True, doc_type, limit) if phrase or len(terms) > 1 else []
+    if not phrase and len(hits) < limit:
+        seen = {hit["filename"] for hit in hits}
+        more = query_fn(terms, False, doc_type, limit + len(hits))
+        hits += [hit for hit in more if hit["filename"] not in seen][:limit - len(hits)]
+    return hits
+
+
+def _hit(row, score: float, terms: List[str]) -> Dict[str, Any]:
+    return {
+        "filename": row["name"],
+        "source_filename": row["source_filename"],
+        "document_type": row["document_type"],
+        "score": round(score, 4),
+        "snippet": make_snippet(row["content"] or "", terms),
+    }
+
+
+class SqliteSearchIndex:
+    """Chỉ mục FTS5: bảng search_documents giữ văn bản gốc, documents_fts đánh chỉ mục bản bỏ dấu"""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS search_documents (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        source_filename TEXT,
+        document_type TEXT,
+        created_at TEXT NOT NULL,
+        content TEXT NOT NULL
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        folded, tokenize = 'unicode61 remove_diacritics 2'
+    );
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def ensure_schema(self) -> None:
+        with self._lock:
+            self._conn.executescript(self._SCHEMA)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM search_documents LIMIT 1").fetchone() is None
+
+    def add(self, filename: str, result: Dict[str, Any]) -> None:
+        self.add_many([(filename, result_name(filename), result)])
+
+    def add_many(self, documents: List[Tuple[Optional[str], str, Dict[str, Any]]]) -> None:
+        """Thêm/thay thế nhiều giấy tờ (source_filename, tên kết quả, result) trong một transaction"""
+        rows = [_search_row(source, name, result) for source, name, result in documents]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for row in rows:
+                    self._delete(row["name"])
+                    cursor = self._conn.execute(
+                        "INSERT INTO search_documents (name, source_filename, document_type, created_at, content) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (row["name"], row["source_filename"], row["document_type"],
+                         row["created_at"].isoformat(), row["content"]),
+                    )
+                    self._conn.execute(
+                        "INSERT INTO documents_fts (rowid, folded) VALUES (?, ?)", (cursor.lastrowid, row["folded"])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete(self, name: str) -> bool:
+        row = self._conn.execute("SELECT id FROM search_documents WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return False
+        self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row["id"],))
+        self._conn.execute("DELETE FROM search_documents WHERE id = ?", (row["id"],))
+        return True
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                removed = self._delete(_index_key(name))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    def search(self, query: str, doc_type: Optional[str] = None,
+               limit: int = SEARCH_CONFIG["default_limit"]) -> List[Dict[str, Any]]:
+        """Tìm theo từ (AND) hoặc theo cụm ("..."), xếp hạng BM25"""
+        return phrase_first(self._query, query, doc_type, limit)
+
+    def _query(self, terms: List[str], phrase: bool, doc_type: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        match = '"' + " ".join(terms) + '"' if phrase else " ".join(f'"{term}"' for term in terms)
+        sql = (
+            "SELECT d.name, d.source_filename, d.document_type, d.content, bm25(documents_fts) AS rank "
+            "FROM documents_fts JOIN search_documents d ON d.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ?"
+        )
+        params: List[Any] = [match]
+        if doc_type:
+            sql += " AND d.document_type = ?"
+            params.append(doc_type)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        # bm25() càng nhỏ càng liên quan
+        return [_hit(row, -row["rank"], terms) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_metadata = MetaData()
+
+document_search = Table(
+    "document_search",
+    _metadata,
+    Column("id", Integer, autoincrement=True),
+    Column("name", String(255), nullable=False),
+    Column("source_filename", String(255)),
+    Column("document_type", String(100)),
+    Column("created_at", DateTime, nullable=False),
+    Column("content", Unicode, nullable=False),  # NVARCHAR(max)
+    Column("folded", Unicode, nullable=False),
+    # Full-text index cần khóa duy nhất một cột với tên cố định
+    PrimaryKeyConstraint("id", name="pk_document_search"),
+    Index("ix_document_search_name", "name", unique=True),
+)
+
+
+class MssqlSearchIndex:
+    """Chỉ mục SQL Server Full-Text Search trên bảng document_search (cột folded).
+
+    Nếu server không cài Full-Text Search, vẫn tìm được bằng LIKE trên cột
+    folded (chậm hơn, không xếp hạng).
+    """
+
+    def __init__(self, engine: Engine, writer: Optional[DocumentWriteBuffer] = None):
+        self.engine = engine
+        self.catalog = SEARCH_CONFIG["mssql_catalog"]
+        self.fulltext = False
+        # Ghi theo lô như bảng documents; tìm kiếm flush trước
+        self.writer = writer or DocumentWriteBuffer(engine, table=document_search)
+
+    def ensure_schema(self) -> None:
+        _metadata.create_all(bind=self.engine)
+        # CREATE FULLTEXT ... không chạy được trong transaction
+        try:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text(
+                    f"IF NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = '{self.catalog}') "
+                    f"CREATE FULLTEXT CATALOG [{self.catalog}]"
+                ))
+                connection.execute(text(
+                    "IF NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('document_search')) "
+                    "CREATE FULLTEXT INDEX ON document_search (folded LANGUAGE 0) "
+                    f"KEY INDEX pk_document_search ON [{self.catalog}] "
+                    "WITH CHANGE_TRACKING AUTO, STOPLIST = OFF"
+                ))
+            self.fulltext = True
+        except Exception as e:
+            print(f"⚠️ Không tạo được SQL Server full-text index, tìm kiếm dùng LIKE: {e}")
+
+    def is_empty(self) -> bool:
+        self.writer.flush()
+        with self.engine.connect() as connection:
+            return connection.execute(select(document_search.c.id).limit(1)).first() is None
+
+    def add(self, filename: str, result: Dict[str, Any]) -> None:
+        # Tên file upload luôn mới (timestamp + uuid) nên chỉ cần INSERT
+        self.writer.add(_search_row(filename, result_name(filename), result))
+
+    def add_many(self, documents: List[Tuple[Optional[str], str, Dict[str, Any]]]) -> None:
+        rows = [_search_row(source, name, result) for source, name, result in documents]
+        with self.engine.begin() as connection:
+            connection.execute(delete(document_search).where(document_search.c.name.in_([r["name"] for r in rows])))
+            connection.execute(insert(document_search), rows)
+
+    def remove(self, name: str) -> bool:
+        self.writer.flush()
+        with self.engine.begin() as connection:
+            result = connection.execute(delete(document_search).where(document_search.c.name == _index_key(name)))
+        return result.rowcount > 0
+
+    def search(self, query: str, doc_type: Optional[str] = None,
+               limit: int = SEARCH_CONFIG["default_limit"]) -> List[Dict[str, Any]]:
+        """Tìm theo từ (AND) hoặc theo cụm ("..."), xếp hạng theo RANK của CONTAINSTABLE"""
+        self.writer.flush()
+        return phrase_first(self._query, query, doc_type, limit)
+
+    def _query(self, terms: List[str], phrase: bool, doc_type: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        columns = [document_search.c[name] for name in ("name", "source_filename", "document_type", "content")]
+
+        if self.fulltext:
+            condition = '"' + " ".join(terms) + '"' if phrase else " AND ".join(f'"{term}"' for term in terms)
+            matches = func.CONTAINSTABLE(
+                text("document_search"), text("folded"), condition
+            ).table_valued("KEY", "RANK").alias("k")
+            query_ = (
+                select(*columns, matches.c.RANK.label("rank"))
+                .join_from(matches, document_search, document_search.c.id == matches.c.KEY)
+                .order_by(matches.c.RANK.desc())
+            )
+        else:
+            patterns = [" ".join(terms)] if phrase else terms
+            query_ = select(*columns, text("0 AS rank")).where(
+                *(document_search.c.folded.like(f"%{p.replace('_', '[_]')}%") for p in patterns)
+            ).order_by(document_search.c.created_at.desc())
+
+        if doc_type:
+            query_ = query_.where(document_search.c.document_type == doc_type)
+        with self.engine.connect() as connection:
+            rows = connection.execute(query_.limit(limit)).all()
+        return [_hit(row._mapping, float(row.rank or 0), terms) for row in rows]
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def create_search_index(engine: Optional[Engine], results_dir: Path):
+    """SQL Server full-text nếu DB là MSSQL; ngược lại FTS5 trong file SQLite
+    (cùng file DB nếu DB là SQLite, results/search.db nếu tắt DB)"""
+    if engine is not None and engine.dialect.name == "mssql":
+        return MssqlSearchIndex(engine)
+    if engine is not None and engine.dialect.name == "sqlite" and engine.url.database:
+        return SqliteSearchIndex(Path(engine.url.database))
+    return SqliteSearchIndex(Path(results_dir) / SEARCH_CONFIG["sidecar_filename"])
+
+
+def rebuild_search_index(index, results_dir: Path, batch_size: int = 500) -> int:
+    """Đánh chỉ mục lại từ results/*.json (lần đầu bật tìm kiếm), trả về số giấy tờ"""
+    batch: List[Tuple[Optional[str], str, Dict[str, Any]]] = []
+    total = 0
+    for result_file in Path(results_dir).glob("*.json"):
+        try:
+            with open(result_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Lỗi đọc file {result_file}: {e}")
+            continue
+        if not isinstance(data, dict) or not data.get("extracted_text"):
+            continue
+        batch.append((None, result_file.stem, data))
+        if len(batch) >= batch_size:
+            index.add_many(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        index.add_many(batch)
+        total += len(batch)
+    return total
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thống kê giấy tờ dạng materialized cho CDS Scanner
+Bộ đếm theo loại, ngày và độ tin cậy được cập nhật tăng dần khi xử lý/xóa,
+/stats chỉ còn đọc các bucket thay vì đếm lại toàn bộ giấy tờ
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import DocumentStat
+
+# Tên file thống kê (dùng khi database bị tắt); không dùng đuôi .json để
+# không lẫn với các file kết quả results/*.json
+STATS_FILENAME = "stats.jsonl"
+
+# Các loại bucket; "total" chỉ có một key "all"
+BUCKET_KINDS = ("total", "type", "day", "confidence")
+
+
+def _bucket_keys(buckets: Dict[str, str]) -> List[Tuple[str, str]]:
+    """Danh sách (bucket_kind, bucket_key) mà một giấy tờ thuộc về"""
+    return [
+        ("total", "all"),
+        ("type", buckets["document_type"]),
+        ("day", buckets["day"]),
+        ("confidence", buckets["confidence"]),
+    ]
+
+
+def _aggregate(bucket_counts: Iterable[Tuple[Dict[str, str], int]]) -> Dict[Tuple[str, str], int]:
+    totals: Dict[Tuple[str, str], int] = {}
+    for buckets, count in bucket_counts:
+        for key in _bucket_keys(buckets):
+            totals[key] = totals.get(key, 0) + count
+    return totals
+
+
+def _empty_snapshot() -> Dict[str, Dict[str, int]]:
+    return {kind: {} for kind in BUCKET_KINDS}
+
+
+class SqlStatsStore:
+    """Bộ đếm lưu trong bảng document_stats"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def apply(self, buckets: Dict[str, str], delta: int) -> None:
+        """Cộng delta (+1 khi thêm, -1 khi xóa) vào các bucket của giấy tờ"""
+        self.apply_counts([(buckets, delta)])
+
+    def apply_counts(self, bucket_counts: Iterable[Tuple[Dict[str, str], int]]) -> None:
+        """Cộng nhiều nhóm (buckets, delta) trong một transaction (vd. một lô vừa ghi)"""
+        totals = _aggregate(bucket_counts)
+        with self.session_factory() as session:
+            for (kind, key), delta in totals.items():
+                if not delta:
+                    continue
+                updated = session.execute(
+                    update(DocumentStat)
+                    .where(DocumentStat.bucket_kind == kind, DocumentStat.bucket_key == key)
+                    .values(count=DocumentStat.count + delta)
+                ).rowcount
+                if updated or delta < 0:
+                    continue
+                try:
+                    with session.begin_nested():
+                        session.add(DocumentStat(bucket_kind=kind, bucket_key=key, count=delta))
+                except IntegrityError:
+                    # Request khác vừa tạo bucket này: cộng vào dòng đã có
+                    session.execute(
+                        update(DocumentStat)
+                        .where(DocumentStat.bucket_kind == kind, DocumentStat.bucket_key == key)
+                        .values(count=DocumentStat.count + delta)
+                    )
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Toàn bộ bucket (O(số bucket))"""
+        result = _empty_snapshot()
+        with self.session_factory() as session:
+            rows = session.execute(
+                select(DocumentStat.bucket_kind, DocumentStat.bucket_key, DocumentStat.count)
+                .where(DocumentStat.count > 0)
+            ).all()
+        for kind, key, count in rows:
+            result.setdefault(kind, {})[key] = count
+        return result
+
+    def count(self, doc_type: Optional[str] = None) -> int:
+        kind, key = ("type", doc_type) if doc_type else ("total", "all")
+        with self.session_factory() as session:
+            value = session.execute(
+                select(DocumentStat.count)
+                .where(DocumentStat.bucket_kind == kind, DocumentStat.bucket_key == key)
+            ).scalar_one_or_none()
+        return value or 0
+
+    def is_empty(self) -> bool:
+        with self.session_factory() as session:
+            return session.execute(select(DocumentStat.bucket_kind).limit(1)).first() is None
+
+    def rebuild(self, bucket_counts: Iterable[Tuple[Dict[str, str], int]]) -> None:
+        """Thay toàn bộ bộ đếm bằng số liệu đếm lại từ chỉ mục"""
+        totals = _aggregate(bucket_counts)
+        with self.session_factory() as session:
+            session.execute(delete(DocumentStat))
+            session.add_all(
+                DocumentStat(bucket_kind=kind, bucket_key=key, count=count)
+                for (kind, key), count in totals.items()
+            )
+
+
+class FileStatsStore:
+    """Bộ đếm lưu trong results/stats.jsonl (khi database bị tắt)"""
+
+    def __init__(self, results_dir: Path):
+        self.path = Path(results_dir) / STATS_FILENAME
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Dict[str, int]]] = None
+
+    def _ensure_loaded(self) -> Dict[str, Dict[str, int]]:
+        if self._data is None:
+            data = _empty_snapshot()
+            if self.path.exists():
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data.update(json.load(f))
+                except (OSError, ValueError) as e:
+                    print(f"Lỗi đọc file thống kê: {e}")
+            self._data = data
+        return self._data
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def apply(self, buckets: Dict[str, str], delta: int) -> None:
+        """Cộng delta (+1 khi thêm, -1 khi xóa) vào các bucket của giấy tờ"""
+        self.apply_counts([(buckets, delta)])
+
+    def apply_counts(self, bucket_counts: Iterable[Tuple[Dict[str, str], int]]) -> None:
+        """Cộng nhiều nhóm (buckets, delta), ghi file một lần"""
+        totals = _aggregate(bucket_counts)
+        with self._lock:
+            data = self._ensure_loaded()
+            for (kind, key), delta in totals.items():
+                count = data.setdefault(kind, {}).get(key, 0) + delta
+                if count > 0:
+                    data[kind][key] = count
+                else:
+                    data[kind].pop(key, None)
+            self._save()
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {kind: dict(values) for kind, values in self._ensure_loaded().items()}
+
+    def count(self, doc_type: Optional[str] = None) -> int:
+        kind, key = ("type", doc_type) if doc_type else ("total", "all")
+        with self._lock:
+            return self._ensure_loaded().get(kind, {}).get(key, 0)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return not any(self._ensure_loaded().values())
+
+    def rebuild(self, bucket_counts: Iterable[Tuple[Dict[str, str], int]]) -> None:
+        """Thay toàn bộ bộ đếm bằng số liệu đếm lại từ chỉ mục"""
+        data = _empty_snapshot()
+        for (kind, key), count in _aggregate(bucket_counts).items():
+            if count > 0:
+                data[kind][key] = count
+        with self._lock:
+            self._data = data
+            self._save()
+
+
+def create_stats_store(engine, session_factory, results_dir: Path):
+    """Chọn nơi lưu bộ đếm: bảng document_stats nếu có DB, ngược lại results/stats.jsonl"""
+    if engine is not None:
+        return SqlStatsStore(session_factory)
+    return FileStatsStore(results_dir)
+
+
+def main() -> int:
+    """Lệnh đối chiếu/dựng lại thống kê: py stats_store.py --rebuild"""
+    from config import RESULTS_DIR
+    from db import db_session, init_db
+    from document_index import FileDocumentIndex, create_document_index
+    from models import Base
+
+    parser = argparse.ArgumentParser(description="Thống kê giấy tờ CDS Scanner")
+    parser.add_argument("--rebuild", action="store_true", help="Đếm lại và ghi đè bộ đếm")
+    args = parser.parse_args()
+
+    engine = init_db()
+    if engine is not None:
+        Base.metadata.create_all(bind=engine)
+    index = create_document_index(engine, db_session, RESULTS_DIR)
+    store = create_stats_store(engine, db_session, RESULTS_DIR)
+
+    if args.rebuild:
+        if isinstance(index, FileDocumentIndex):
+            # Không có DB: results/*.json là nguồn dữ liệu gốc
+            index.rebuild()
+        store.rebuild(index.bucket_counts())
+        print("✅ Đã dựng lại thống kê")
+
+    snapshot = store.snapshot()
+    indexed = index.count()
+    result_files = sum(1 for _ in RESULTS_DIR.glob("*.json"))
+    print(f"📊 Tổng (bộ đếm): {snapshot['total'].get('all', 0)}")
+    print(f"📋 Tổng (chỉ mục): {indexed}")
+    print(f"📁 File kết quả trong {RESULTS_DIR}: {result_files}")
+    for kind in ("type", "confidence"):
+        for key, count in sorted(snapshot[kind].items()):
+            print(f"  • {kind}/{key}: {count}")
+
+    if snapshot["total"].get("all", 0) != indexed:
+        print("⚠️ Bộ đếm lệch so với chỉ mục, chạy lại với --rebuild")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -10,7 +10,7 @@ import sys
 import json
 import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Thêm thư mục hiện tại vào Python path
 sys.path.append(str(Path(__file__).parent))
@@ -153,6 +153,228 @@ def test_document_type_detection():
         print(f"❌ Document type detection test failed: {e}")
         return False
 
+def test_field_extraction():
+    """Test trích xuất trường thông tin theo loại giấy tờ"""
+    print("\n🧾 Testing field extraction...")
+    
+    try:
+        from field_extraction import extract_fields
+        
+        text = (
+            "HỢP ĐỒNG LAO ĐỘNG\n"
+            "BÊN B: TRẦN VĂN BÌNH; Ngày sinh: 02/01/1990\n"
+            "Họ và tên: NGUYỄN VĂN AN; Mã nhân viên: NV001\n"
+            "Từ ngày: 01/03/2024\n"
+        )
+        fields = extract_fields("hop_dong_lao_dong", text)
+        
+        # "Họ và tên" ưu tiên hơn "BÊN B" dù xuất hiện sau
+        assert fields["ho_ten"] == "NGUYỄN VĂN AN", f"Unexpected ho_ten: {fields.get('ho_ten')}"
+        assert fields["ma_nhan_vien"] == "NV001", f"Unexpected ma_nhan_vien: {fields.get('ma_nhan_vien')}"
+        assert fields["thoi_han_hop_dong"] == "01/03/2024", "Unexpected thoi_han_hop_dong"
+        assert "chuc_danh" not in fields, "Missing field should not be extracted"
+        
+        print("✅ Field extraction test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Field extraction test failed: {e}")
+        return False
+
+def test_document_classifier():
+    """Test phân loại giấy tờ theo điểm từ khóa"""
+    print("\n🏷️ Testing document classifier...")
+    
+    try:
+        from document_classifier import DocumentClassifier
+        
+        classifier = DocumentClassifier()
+        
+        # "Bộ phận" (điều chuyển) không được kéo hợp đồng sang loại khác
+        result = classifier.classify("HỢP ĐỒNG LAO ĐỘNG\nBÊN A: CÔNG TY CDS\nBộ phận: Kế toán")
+        assert result.document_type == "hop_dong_lao_dong", f"Unexpected type: {result.document_type}"
+        assert result.confidence == "high", f"Unexpected confidence: {result.confidence}"
+        assert result.scores["quyet_dinh_dieu_chuyen"] > 0, "Competing type should still be scored"
+        
+        # Từ khóa phải khớp trọn từ
+        assert classifier.classify("THƯỞNGX").document_type == "unknown", "Partial word should not match"
+        weak = classifier.classify("Tiền thưởng tháng")
+        assert weak.confidence == "low" and weak.score < 0.45, "Single weak keyword should be low confidence"
+        
+        print("✅ Document classifier test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Document classifier test failed: {e}")
+        return False
+
+def test_adaptive_preprocessing():
+    """Test chọn đường tiền xử lý theo chất lượng ảnh"""
+    print("\n🧹 Testing adaptive preprocessing...")
+    
+    try:
+        import cv2
+        import numpy as np
+        from preprocessing import PATH_FAST, PATH_HEAVY, preprocess
+        
+        page = np.full((1200, 900), 235, np.uint8)
+        for i in range(15):
+            cv2.putText(page, "HOP DONG LAO DONG 125/2024", (40, 60 + i * 70),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, 30, 2)
+        noisy = np.clip(page + np.random.default_rng(0).normal(0, 15, page.shape), 0, 255).astype(np.uint8)
+        
+        clean_result = preprocess(page)
+        assert clean_result.path == PATH_FAST, f"Clean scan should take fast path: {clean_result.info()}"
+        assert preprocess(noisy).path == PATH_HEAVY, "Noisy scan should take heavy path"
+        
+        # Ảnh 600 DPI được thu nhỏ về 300 DPI trước khi lọc
+        downscaled = preprocess(page, dpi=600)
+        assert downscaled.image.shape == (600, 450), f"Unexpected size: {downscaled.image.shape}"
+        
+        print("✅ Adaptive preprocessing test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Adaptive preprocessing test failed: {e}")
+        return False
+
+def test_layout_regions():
+    """Test tìm khối chữ và thứ tự đọc"""
+    print("\n🧱 Testing layout regions...")
+    
+    try:
+        import cv2
+        import numpy as np
+        from layout import find_text_regions, reading_order
+        
+        page = np.full((1200, 900), 255, np.uint8)
+        cv2.rectangle(page, (40, 40), (200, 200), 0, -1)  # logo đặc
+        cv2.putText(page, "BEN B", (500, 400), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+        cv2.putText(page, "BEN A", (60, 400), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+        cv2.putText(page, "DIEU 1", (60, 700), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+        
+        regions = find_text_regions(page)
+        assert len(regions) == 3, f"Expected 3 text regions (logo skipped), got {regions}"
+        assert [x < 300 for x, _, _, _ in regions] == [True, False, True], "Wrong reading order"
+        assert reading_order([(500, 10, 50, 20), (10, 12, 50, 20)])[0][0] == 10, "Same row should read left to right"
+        
+        print("✅ Layout regions test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Layout regions test failed: {e}")
+        return False
+
+def test_header_first_classification():
+    """Test phân loại từ dải đầu trang, dừng sớm với file không nhận diện được"""
+    print("\n🪧 Testing header-first classification...")
+    
+    try:
+        import cv2
+        import numpy as np
+        from document_processor import DocumentProcessor
+        
+        class FakeBackend:
+            """Backend OCR giả: trả về văn bản cố định, ghi lại số lần gọi"""
+            name = "tesserocr"
+            concurrent = True
+            
+            def __init__(self, text: str):
+                self.text = text
+                self.calls = 0
+            
+            def image_to_string(self, image, psm=None) -> str:
+                self.calls += 1
+                return self.text
+        
+        page = np.full((1400, 1000), 255, np.uint8)
+        cv2.putText(page, "TIEU DE", (300, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+        for i in range(8):
+            cv2.putText(page, "Noi dung dong", (60, 500 + i * 80), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+        
+        processor = DocumentProcessor()
+        processor._ocr_backend = FakeBackend("Văn bản thông thường")
+        result = processor.ocr_header_first(page)
+        assert result.get("stage") == "header", "Unknown header should stop after stage 1"
+        assert processor._ocr_backend.calls == 1, f"Body should not be OCR'd, got {processor._ocr_backend.calls} calls"
+        
+        processor._ocr_backend = FakeBackend("HỢP ĐỒNG LAO ĐỘNG")
+        result = processor.ocr_header_first(page)
+        assert result["header"]["document_type"] == "hop_dong_lao_dong", "Header type mismatch"
+        assert processor._ocr_backend.calls > 1, "Supported type should continue to full OCR"
+        
+        # Không có khối chữ (layout tắt): giai đoạn 2 chỉ OCR phần dưới dải tiêu đề
+        from config import LAYOUT_CONFIG
+        heights = []
+        
+        class RecordingBackend(FakeBackend):
+            def image_to_string(self, image, psm=None) -> str:
+                heights.append(image.shape[0])
+                return "HỢP ĐỒNG LAO ĐỘNG" if len(heights) == 1 else "Nội dung"
+        
+        LAYOUT_CONFIG["enabled"] = False
+        try:
+            processor._ocr_backend = RecordingBackend("")
+            result = processor.ocr_header_first(page)
+        finally:
+            LAYOUT_CONFIG["enabled"] = True
+        assert sum(heights) == page.shape[0], f"Header band OCR'd twice: {heights}"
+        assert result["text"] == "HỢP ĐỒNG LAO ĐỘNG\nNội dung", "Header and body text not joined"
+        
+        print("✅ Header-first classification test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Header-first classification test failed: {e}")
+        return False
+
+def test_multipage_ingestion():
+    """Test đọc TIFF nhiều frame theo từng trang"""
+    print("\n📚 Testing multi-page ingestion...")
+    
+    try:
+        import io
+        from PIL import Image
+        from page_source import iter_pages
+        
+        frames = [Image.new("L", (200, 300), color) for color in (255, 128, 0)]
+        buffer = io.BytesIO()
+        frames[0].save(buffer, format="TIFF", save_all=True, append_images=frames[1:], dpi=(200, 200))
+        
+        pages = iter_pages(buffer.getvalue())
+        first = next(pages)
+        assert first.number == 1 and first.image.shape == (300, 200, 3), "Unexpected first page"
+        assert first.dpi == 200, f"Unexpected DPI: {first.dpi}"
+        assert [page.image[0, 0, 0] for page in pages] == [128, 0], "Frames should be read in order"
+        assert len(list(iter_pages(buffer.getvalue(), max_pages=2))) == 2, "max_pages not applied"
+        
+        # Trang 1 tiền xử lý lỗi: ghi lỗi theo trang, vẫn xử lý các trang còn lại
+        import numpy as np
+        from document_processor import DocumentProcessor
+        from page_source import PageImage
+        
+        class FakeBackend:
+            name = "tesserocr"
+            concurrent = True
+            
+            def image_to_string(self, image, psm=None) -> str:
+                return "HỢP ĐỒNG LAO ĐỘNG\nHọ và tên: Nguyễn Văn A"
+        
+        processor = DocumentProcessor()
+        processor._ocr_backend = FakeBackend()
+        good = np.full((600, 400, 3), 255, np.uint8)
+        result = processor.process_pages([PageImage(1, np.zeros((0, 0), np.uint8)), PageImage(2, good)])
+        assert result.get("document_type") == "hop_dong_lao_dong", f"Remaining pages not processed: {result.get('error')}"
+        assert result["page_count"] == 2, "Failed page should still be counted"
+        assert [e["page"] for e in result.get("page_errors", [])] == [1], "Page 1 error not recorded"
+        
+        print("✅ Multi-page ingestion test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Multi-page ingestion test failed: {e}")
+        return False
+
 def test_api_structure():
     """Test cấu trúc API"""
     print("\n🌐 Testing API structure...")
@@ -166,7 +388,11 @@ def test_api_structure():
             "/",
             "/health",
             "/upload",
+            "/scan",
             "/documents",
+            "/search",
+            "/fields/{field}",
+            "/employees/{ma_nhan_vien}",
             "/stats"
         ]
         
@@ -232,6 +458,1074 @@ def test_ai_ml_dependencies():
         print(f"❌ AI/ML dependencies test failed: {e}")
         return False
 
+def test_aspect_ratio_grid():
+    """Test bảng tỷ lệ khung hình cache + bisect cho image_processor"""
+    print("\n📐 Testing aspect-ratio grid...")
+    
+    try:
+        from image_processor import closest_grid, find_closest_aspect_ratio, get_target_ratios
+        
+        target_ratios = list(get_target_ratios(1, 12)[0])
+        sizes = [(2480, 3508), (1000, 1000), (3000, 800), (448, 896), (896, 448), (1, 5000), (5000, 1)]
+        for width, height in sizes:
+            expected = find_closest_aspect_ratio(width / height, target_ratios, width, height, 448)
+            assert closest_grid(width, height, 1, 12, 448) == expected, f"Grid mismatch for {width}x{height}"
+        
+        # Cùng khổ scan lần sau lấy thẳng từ cache
+        hits = closest_grid.cache_info().hits
+        closest_grid(2480, 3508, 1, 12, 448)
+        assert closest_grid.cache_info().hits == hits + 1, "Repeat size should hit the cache"
+        
+        print("✅ Aspect-ratio grid test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Aspect-ratio grid test failed: {e}")
+        return False
+
+def test_vision_batching():
+    """Test gom micro-batch của dịch vụ suy luận vision (mô hình giả)"""
+    print("\n🧠 Testing vision inference batching...")
+    
+    try:
+        import threading
+        import torch
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from config import VISION_CONFIG
+        from vision_inference import VisionInferenceService
+        
+        class FakeModel:
+            """Mô hình giả: batch_chat trả về số khối của từng yêu cầu"""
+            dtype = torch.float32
+            
+            def __init__(self):
+                self.batch_sizes = []
+            
+            def batch_chat(self, tokenizer, pixel_values, num_patches_list, questions, generation_config):
+                assert pixel_values.shape[0] == sum(num_patches_list), "Tiles/patches mismatch"
+                self.batch_sizes.append(len(questions))
+                return [f"tiles={n}" for n in num_patches_list]
+        
+        model = FakeModel()
+        config = dict(VISION_CONFIG, max_wait_ms=200, max_batch_tiles=8)
+        service = VisionInferenceService(config=config, model=model, tokenizer=object())
+        
+        # 6 yêu cầu đồng thời, 1-3 khối mỗi yêu cầu
+        tile_counts = [1, 2, 3, 1, 2, 3]
+        results = [None] * len(tile_counts)
+        
+        def run(index: int):
+            results[index] = service.infer(torch.zeros(tile_counts[index], 3, 448, 448))
+        
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(tile_counts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        service.close()
+        
+        assert results == [f"tiles={n}" for n in tile_counts], "Responses routed to wrong requests"
+        assert len(model.batch_sizes) < len(tile_counts), "Requests were not batched"
+        assert service.stats()["tiles"] == sum(tile_counts), "Tile count mismatch"
+        
+        # Yêu cầu quá hạn bị hủy, không chạy trong batch sau
+        class BlockingModel(FakeModel):
+            def __init__(self):
+                super().__init__()
+                self.release = threading.Event()
+            
+            def batch_chat(self, *args, **kwargs):
+                self.release.wait(5)
+                return super().batch_chat(*args, **kwargs)
+        
+        blocking = BlockingModel()
+        service = VisionInferenceService(config=dict(config, max_wait_ms=0, timeout=0.2), model=blocking, tokenizer=object())
+        busy = service.submit(torch.zeros(1, 3, 448, 448))
+        try:
+            service.infer(torch.zeros(2, 3, 448, 448))
+            raise AssertionError("infer should time out while the model is busy")
+        except FutureTimeoutError:
+            pass
+        blocking.release.set()
+        assert busy.result(timeout=5) == "tiles=1", "Busy request lost"
+        service.close()
+        assert blocking.batch_sizes == [1], f"Timed-out request still ran: {blocking.batch_sizes}"
+        assert service.stats()["requests"] == 1, "Timed-out request counted"
+        
+        print(f"✅ Vision batching test passed (batches: {model.batch_sizes})")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Vision batching test failed: {e}")
+        return False
+
+def test_vision_cpu_settings():
+    """Test lượng tử hóa int8 và chia thread cho đường vision trên CPU"""
+    print("\n🧮 Testing vision CPU settings...")
+    
+    try:
+        import torch
+        from config import PERFORMANCE_CONFIG, VISION_CONFIG
+        from vision_inference import quantize_model, thread_settings
+        
+        model = torch.nn.Sequential(torch.nn.Linear(64, 64), torch.nn.ReLU(), torch.nn.Linear(64, 8)).eval()
+        quantized = quantize_model(model)
+        assert not any(isinstance(m, torch.nn.Linear) for m in quantized.modules()), "Linear layers not quantized"
+        inputs = torch.randn(4, 64)
+        with torch.inference_mode():
+            error = (model(inputs) - quantized(inputs)).abs().max().item()
+        assert error < 0.1, f"Quantization error too large: {error}"
+        
+        # Mặc định chia nhân CPU cho các worker OCR; cấu hình tường minh được ưu tiên
+        intra, inter = thread_settings(dict(VISION_CONFIG, num_threads=None, interop_threads=1))
+        assert intra == max(1, (os.cpu_count() or 1) // PERFORMANCE_CONFIG["max_workers"]), "Unexpected intra-op threads"
+        assert inter == 1, "Unexpected inter-op threads"
+        assert thread_settings(dict(VISION_CONFIG, num_threads=3))[0] == 3, "Explicit num_threads ignored"
+        
+        print(f"✅ Vision CPU settings test passed (max error {error:.4f})")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Vision CPU settings test failed: {e}")
+        return False
+
+def test_document_write_buffer():
+    """Test ghi bảng documents theo lô (write-behind)"""
+    print("\n🗄️ Testing document write buffer...")
+    
+    try:
+        import tempfile
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from document_index import DocumentWriteBuffer, SqlDocumentIndex
+        from models import Base
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = create_engine(f"sqlite:///{tmp_dir}/documents.db", future=True)
+            Base.metadata.create_all(bind=engine)
+            writer = DocumentWriteBuffer(engine, batch_size=3, flush_interval=60)
+            index = SqlDocumentIndex(engine, sessionmaker(bind=engine, future=True), writer)
+            
+            # Đủ 3 dòng thì luồng nền ghi một lô
+            for i in range(3):
+                index.add(f"scan_{i}.png", {"document_type": "hop_dong_lao_dong", "confidence": "high"})
+            deadline = time.time() + 5
+            while writer.flushed < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            assert writer.flushed == 3 and writer.batches == 1, "Batch flush by size failed"
+            
+            # Chưa đủ lô: các dòng chờ (flush_interval dài)
+            for i in range(3, 5):
+                index.add(f"scan_{i}.png", {"document_type": "unknown"})
+            assert writer.pending() == 2, "Rows below batch size should stay buffered"
+            
+            # Đọc luôn thấy dòng vừa thêm; close ghi nốt phần còn lại
+            assert index.count() == 5, "Reads should flush pending rows"
+            index.add("scan_5.png", {"document_type": "unknown"})
+            index.close()
+            assert writer.pending() == 0 and writer.flushed == 6, "Close should flush pending rows"
+            assert writer.batches == 3, f"Unexpected batch count: {writer.batches}"
+            
+            # Chỉ mục file phân nhóm theo ngày UTC như bảng documents
+            from document_index import FileDocumentIndex
+            late_utc = datetime(2025, 1, 1, 23, 30).replace(tzinfo=timezone.utc).timestamp()
+            assert FileDocumentIndex._entry_buckets({"created_at": late_utc})["day"] == "2025-01-01", "File index should bucket by UTC day"
+            
+            # Dòng không ghi được bị bỏ, các dòng khác trong lô vẫn được ghi, đọc không lỗi;
+            # thống kê chỉ đếm các dòng đã vào bảng
+            from stats_store import SqlStatsStore
+            stats = SqlStatsStore(sessionmaker(bind=engine, future=True).begin)
+            writer = DocumentWriteBuffer(engine, batch_size=100, flush_interval=60)
+            index = SqlDocumentIndex(engine, sessionmaker(bind=engine, future=True).begin, writer, stats)
+            index.add("scan_6.png", {"document_type": "unknown"})
+            index.add("scan_bad.png", {"document_type": "unknown", "extracted_text": [object()]})
+            index.add("scan_7.png", {"document_type": "unknown"})
+            assert index.count() == 8, "Valid rows should be written around a bad row"
+            assert writer.dropped == 1 and writer.pending() == 0, "Bad row should be dropped"
+            assert stats.count() == 2 and stats.count("unknown") == 2, "Stats should count only written rows"
+            
+            # Tìm/xóa theo đúng tên: "a_result" không được khớp "a.b.png" (kết quả "a.b_result")
+            index.add("a.png", {"document_type": "unknown"})
+            index.add("a.b.png", {"document_type": "unknown"})
+            assert index.find_source("a_result") == "a.png", "Result name should match exactly"
+            assert len(index.remove("a_result")) == 1, "Remove should delete only the exact match"
+            assert index.find_source("a_result") is None, "Removed document should be gone"
+            assert index.find_source("a.b_result") == "a.b.png", "Other document should remain"
+            index.close()
+            engine.dispose()
+            
+            # Bảng documents cũ chưa có cột result_name: ensure_schema thêm cột và điền giá trị
+            from sqlalchemy import text
+            legacy_engine = create_engine(f"sqlite:///{tmp_dir}/legacy.db", future=True)
+            with legacy_engine.begin() as connection:
+                connection.execute(text(
+                    "CREATE TABLE documents (id INTEGER PRIMARY KEY, filename VARCHAR(255) NOT NULL, "
+                    "document_type VARCHAR(100), extracted_text TEXT, processed_data TEXT, "
+                    "confidence VARCHAR(50), created_at DATETIME NOT NULL)"
+                ))
+                connection.execute(text(
+                    "INSERT INTO documents (filename, created_at) VALUES ('old.scan.png', '2025-01-01 00:00:00')"
+                ))
+            Base.metadata.create_all(bind=legacy_engine)
+            legacy = SqlDocumentIndex(legacy_engine, sessionmaker(bind=legacy_engine, future=True))
+            legacy.ensure_schema()
+            assert legacy.find_source("old.scan_result") == "old.scan.png", "Legacy rows should get result_name"
+            legacy.close()
+            legacy_engine.dispose()
+        
+        print("✅ Document write buffer test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Document write buffer test failed: {e}")
+        return False
+
+def test_stats_store():
+    """Test bộ đếm thống kê materialized: cộng/trừ tăng dần và dựng lại từ chỉ mục"""
+    print("\n📊 Testing stats store...")
+    
+    try:
+        import tempfile
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from document_index import SqlDocumentIndex
+        from models import Base
+        from stats_store import FileStatsStore, SqlStatsStore
+        
+        contract = {"document_type": "hop_dong_lao_dong", "confidence": "high", "day": "2025-01-02"}
+        decision = {"document_type": "quyet_dinh_bo_nhiem", "confidence": "low", "day": "2025-01-02"}
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = create_engine(f"sqlite:///{tmp_dir}/stats.db", future=True)
+            Base.metadata.create_all(bind=engine)
+            session_factory = sessionmaker(bind=engine, future=True)
+            
+            for store in (SqlStatsStore(session_factory.begin), FileStatsStore(Path(tmp_dir))):
+                name = type(store).__name__
+                store.apply(contract, 1)
+                before = store.snapshot()
+                store.apply(decision, 1)
+                assert store.count() == 2 and store.count("quyet_dinh_bo_nhiem") == 1, f"{name}: apply(+1) not counted"
+                store.apply(decision, -1)
+                assert store.snapshot() == before, f"{name}: apply(+1) then apply(-1) should round-trip"
+                assert store.count("quyet_dinh_bo_nhiem") == 0, f"{name}: removed bucket should read as 0"
+                
+                store.rebuild([(contract, 3), (decision, 2)])
+                snapshot = store.snapshot()
+                assert snapshot["total"] == {"all": 5} and snapshot["day"] == {"2025-01-02": 5}, f"{name}: rebuild totals wrong"
+                assert snapshot["type"] == {"hop_dong_lao_dong": 3, "quyet_dinh_bo_nhiem": 2}, f"{name}: rebuild by type wrong"
+                assert snapshot["confidence"] == {"high": 3, "low": 2}, f"{name}: rebuild by confidence wrong"
+            
+            # Bộ đếm cập nhật tăng dần khớp với việc đếm lại toàn bộ bảng documents
+            incremental = SqlStatsStore(session_factory.begin)
+            incremental.rebuild([])
+            index = SqlDocumentIndex(engine, session_factory.begin, stats_store=incremental)
+            for i, (doc_type, confidence) in enumerate([
+                ("hop_dong_lao_dong", "high"), ("hop_dong_lao_dong", "low"),
+                ("quyet_dinh_bo_nhiem", None), (None, "high"),
+            ]):
+                index.add(f"doc_{i}.png", {"document_type": doc_type, "confidence": confidence})
+            index.remove("doc_1_result")
+            incremental.apply({"document_type": "hop_dong_lao_dong", "confidence": "low",
+                               "day": datetime.utcnow().strftime("%Y-%m-%d")}, -1)
+            index.flush()
+            
+            recounted = FileStatsStore(Path(tmp_dir) / "recount")
+            (Path(tmp_dir) / "recount").mkdir()
+            recounted.rebuild(index.bucket_counts())
+            assert incremental.snapshot() == recounted.snapshot(), "Incremental counters drifted from a full recount"
+            assert incremental.count() == index.count() == 3, "Total should match the documents table"
+            index.close()
+            engine.dispose()
+        
+        print("✅ Stats store test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Stats store test failed: {e}")
+        return False
+
+def test_db_thread_pool():
+    """Test chạy truy vấn DB trên thread pool riêng và số liệu pool"""
+    print("\n🧵 Testing DB thread pool...")
+    
+    try:
+        import asyncio
+        import threading
+        from db import pool_metrics, run_db
+        
+        before = pool_metrics()["executor"]["calls"]
+        
+        def active_count():
+            return pool_metrics()["executor"]["active"]
+        
+        async def run_queries():
+            loop_thread = threading.get_ident()
+            thread_ids = await asyncio.gather(*(run_db(threading.get_ident) for _ in range(4)))
+            total = await run_db(sum, [1, 2, 3])
+            return loop_thread, thread_ids, total, await run_db(active_count)
+        
+        loop_thread, thread_ids, total, active = asyncio.run(run_queries())
+        assert active == 1, "In-flight DB call not counted as active"
+        assert total == 6, "run_db returned wrong result"
+        assert loop_thread not in thread_ids, "DB calls must not run on the event loop thread"
+        
+        metrics = pool_metrics()["executor"]
+        assert metrics["calls"] == before + 6, "Executor calls not counted"
+        assert metrics["queued"] == 0 and metrics["active"] == 0, "Queue counters not released"
+        assert metrics["threads"] > 0 and metrics["max_wait_ms"] >= 0, "Unexpected executor metrics"
+        
+        print("✅ DB thread pool test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ DB thread pool test failed: {e}")
+        return False
+
+def test_full_text_search():
+    """Test tìm kiếm toàn văn không phân biệt dấu (SQLite FTS5)"""
+    print("\n🔎 Testing full-text search...")
+    
+    try:
+        import tempfile
+        from search_index import SqliteSearchIndex, fold_text
+        
+        assert fold_text("Nguyễn Văn Đức") == "nguyen van duc", "Diacritic folding failed"
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = SqliteSearchIndex(Path(tmp_dir) / "search.db")
+            index.ensure_schema()
+            index.add("qd_bo_nhiem.png", {
+                "document_type": "quyet_dinh_bo_nhiem",
+                "extracted_text": "QUYẾT ĐỊNH BỔ NHIỆM\nBổ nhiệm ông Nguyễn Văn A giữ chức vụ Trưởng phòng"
+            })
+            index.add("qd_dieu_chuyen.png", {
+                "document_type": "quyet_dinh_dieu_chuyen",
+                "extracted_text": "QUYẾT ĐỊNH ĐIỀU CHUYỂN ông Nguyễn Văn Bình; người ký: Văn A"
+            })
+            
+            # Khớp nguyên cụm xếp trước giấy tờ chỉ chứa đủ các từ
+            hits = index.search("nguyen van a")
+            assert [h["filename"] for h in hits] == ["qd_bo_nhiem_result", "qd_dieu_chuyen_result"], "Unexpected ranking"
+            assert "<mark>Nguyễn</mark> <mark>Văn</mark> <mark>A</mark>" in hits[0]["snippet"], "Snippet not highlighted"
+            
+            assert len(index.search('"nguyen van a"')) == 1, "Phrase search failed"
+            assert index.search("điều chuyển")[0]["document_type"] == "quyet_dinh_dieu_chuyen", "đ/Đ folding failed"
+            assert index.search("nguyen", doc_type="khen_thuong_ky_luat") == [], "doc_type filter failed"
+            
+            assert index.remove("qd_dieu_chuyen_result"), "Remove failed"
+            assert len(index.search("nguyen")) == 1, "Removed document still searchable"
+            index.close()
+        
+        print("✅ Full-text search test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Full-text search test failed: {e}")
+        return False
+
+def test_field_index():
+    """Test chỉ mục trường đã trích xuất (document_fields) và backfill"""
+    print("\n🏷️ Testing field index...")
+    
+    try:
+        import tempfile
+        from datetime import date, datetime
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from field_index import FileFieldIndex, SqlFieldIndex, backfill_field_index, parse_date
+        from models import Base, Document
+        
+        assert parse_date("ngày 05 tháng 3 năm 2025") == date(2025, 3, 5), "Vietnamese date parse failed"
+        assert parse_date("31/02/2025") is None, "Invalid date should be ignored"
+        
+        contract = {
+            "document_type": "hop_dong_lao_dong",
+            "processed_data": {"ho_ten": "NGUYỄN  VĂN AN", "ma_nhan_vien": "NV001", "ngay_hieu_luc": "01/03/2025", "nguoi_ky": ""}
+        }
+        decision = {
+            "document_type": "quyet_dinh_bo_nhiem",
+            "processed_data": {"ho_ten": "Nguyễn Văn An", "so_quyet_dinh": "12/QĐ-CT", "ngay_hieu_luc": "15/07/2024"}
+        }
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results_dir = Path(tmp_dir) / "results"
+            results_dir.mkdir()
+            with open(results_dir / "qd_result.json", "w", encoding="utf-8") as f:
+                json.dump(decision, f, ensure_ascii=False)
+            
+            engine = create_engine(f"sqlite:///{tmp_dir}/fields.db", future=True)
+            Base.metadata.create_all(bind=engine)
+            session_factory = sessionmaker(bind=engine, future=True).begin
+            with session_factory() as session:
+                session.add(Document(filename="hd.png", document_type="hop_dong_lao_dong",
+                                     processed_data=json.dumps(contract["processed_data"]), created_at=datetime.utcnow()))
+            
+            # Backfill từ bảng documents và results/*.json; chạy lại không nhân đôi
+            index = SqlFieldIndex(engine, session_factory)
+            index.ensure_schema()
+            assert backfill_field_index(index, results_dir) == 6, "Unexpected backfill row count"
+            assert backfill_field_index(index, results_dir) == 0, "Backfill should be idempotent"
+            
+            for fields in (index, FileFieldIndex(results_dir)):
+                if isinstance(fields, FileFieldIndex):
+                    fields.add("hd.png", contract)
+                hits = fields.find("ho_ten", "nguyen van an")
+                assert sorted(h["filename"] for h in hits) == ["hd_result", "qd_result"], "Value lookup failed"
+                assert [h["filename"] for h in fields.find("ho_ten", "Nguyễn Văn An", doc_type="quyet_dinh_bo_nhiem")] == ["qd_result"], "doc_type filter failed"
+                hits = fields.find("ngay_hieu_luc", date_from=date(2025, 1, 1), date_to=date(2025, 12, 31))
+                assert [(h["filename"], h["date"]) for h in hits] == [("hd_result", "2025-03-01")], "Date range lookup failed"
+                assert fields.find("nguoi_ky", "") == [], "Empty fields should not be indexed"
+                fields.remove("hd_result")
+                assert [h["filename"] for h in fields.find("ho_ten", "nguyen van an")] == ["qd_result"], "Remove failed"
+                fields.close()
+            engine.dispose()
+        
+        print("✅ Field index test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Field index test failed: {e}")
+        return False
+
+def test_employee_dossier():
+    """Test hồ sơ nhân viên cập nhật tăng dần (bảng employee_events)"""
+    print("\n👤 Testing employee dossier...")
+    
+    try:
+        import tempfile
+        import threading
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from employee_store import FileEmployeeStore, SqlEmployeeStore
+        from models import Base
+        
+        transfer = {
+            "document_type": "quyet_dinh_dieu_chuyen",
+            "processed_data": {"ho_ten": "Nguyễn Văn An", "bo_phan_moi": "Kế toán", "ngay_dieu_chuyen": "01/06/2025"}
+        }
+        contract = {
+            "document_type": "hop_dong_lao_dong",
+            "processed_data": {"ho_ten": "NGUYỄN VĂN AN", "ma_nhan_vien": "nv 001", "chuc_danh": "Nhân viên", "ngay_hieu_luc": "01/03/2024"}
+        }
+        appointment = {
+            "document_type": "quyet_dinh_bo_nhiem",
+            "processed_data": {"ho_ten": "Nguyễn Văn An", "chuc_vu_moi": "Trưởng phòng", "ngay_hieu_luc": "15/01/2025"}
+        }
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = create_engine(f"sqlite:///{tmp_dir}/employees.db", future=True)
+            Base.metadata.create_all(bind=engine)
+            stores = [SqlEmployeeStore(sessionmaker(bind=engine, future=True).begin), FileEmployeeStore(Path(tmp_dir))]
+            
+            for store in stores:
+                # Quyết định đến trước hợp đồng: được gắn vào NV001 khi biết mã
+                store.add("dc.png", transfer)
+                assert store.dossier("NV001") is None, "Unknown employee should have no dossier"
+                store.add("hd.png", contract)
+                store.add("bn.png", appointment)
+                
+                dossier = store.dossier("nv001")
+                timeline = [(item["date"], item["document_type"]) for item in dossier["timeline"]]
+                assert timeline == [
+                    ("2024-03-01", "hop_dong_lao_dong"),
+                    ("2025-01-15", "quyet_dinh_bo_nhiem"),
+                    ("2025-06-01", "quyet_dinh_dieu_chuyen")
+                ], f"Unexpected timeline: {timeline}"
+                assert dossier["current"]["chuc_vu"] == "Trưởng phòng", "Current position mismatch"
+                assert dossier["current"]["bo_phan"] == "Kế toán", "Current department mismatch"
+                
+                store.remove("bn_result")
+                assert len(store.dossier("NV001")["timeline"]) == 2, "Remove failed"
+                assert store.dossier("NV001")["current"]["chuc_vu"] == "Nhân viên", "Projection not updated on remove"
+            engine.dispose()
+            
+            # Nhiều request đầu tiên cùng lúc: chỉ dựng hồ sơ từ results/ một lần
+            lazy = FileEmployeeStore(Path(tmp_dir))
+            loads = []
+            load = lazy._load
+            lazy._load = lambda events: (loads.append(1), time.sleep(0.05), load(events))
+            threads = [threading.Thread(target=lazy.dossier, args=("NV001",)) for _ in range(4)]
+            threads.append(threading.Thread(target=lazy.add, args=("hd.png", contract)))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert len(loads) == 1, f"Store loaded {len(loads)} times"
+            assert lazy.dossier("NV001") is not None, "Concurrent load wiped an added event"
+        
+        print("✅ Employee dossier test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Employee dossier test failed: {e}")
+        return False
+
+def test_ocr_backends():
+    """Test chọn backend OCR và pool engine tesserocr (module tesserocr giả)"""
+    print("\n🔤 Testing OCR backends...")
+    
+    try:
+        import threading
+        import types
+        import numpy as np
+        import ocr_backend
+        from ocr_backend import PytesseractBackend, TesserocrBackend, create_ocr_backend
+        
+        class FakeTessAPI:
+            """PyTessBaseAPI giả: phát hiện hai luồng dùng chung một engine"""
+            instances = []
+            
+            def __init__(self, **kwargs):
+                self.kwargs = kwargs
+                self.busy = False
+                self.shared = False
+                self.images = []
+                self.ended = False
+                FakeTessAPI.instances.append(self)
+            
+            def SetPageSegMode(self, psm):
+                self.shared = self.shared or self.busy
+                self.busy = True
+                self.psm = psm
+            
+            def SetImageBytes(self, data, width, height, channels, stride):
+                self.images.append((data[:channels], width, height, channels, stride))
+            
+            def GetUTF8Text(self):
+                time.sleep(0.05)
+                return "HỢP ĐỒNG"
+            
+            def Clear(self):
+                self.busy = False
+            
+            def End(self):
+                self.ended = True
+        
+        saved_modules = (ocr_backend.tesserocr, ocr_backend.pytesseract)
+        try:
+            # auto: không có tesserocr thì dùng pytesseract; chỉ định tesserocr thì báo lỗi
+            ocr_backend.tesserocr = None
+            ocr_backend.pytesseract = types.SimpleNamespace(
+                pytesseract=types.SimpleNamespace(tesseract_cmd=None),
+                image_to_string=lambda image, lang, config: config,
+            )
+            backend = create_ocr_backend("auto")
+            assert isinstance(backend, PytesseractBackend), f"Unexpected fallback: {type(backend).__name__}"
+            assert backend.image_to_string(np.zeros((4, 4), np.uint8), psm=7).startswith("--psm 7"), "psm override lost"
+            try:
+                create_ocr_backend("tesserocr")
+                raise AssertionError("Explicit tesserocr without the module should fail")
+            except RuntimeError:
+                pass
+            
+            # Có tesserocr: auto chọn tesserocr, engine được nạp một lần lúc khởi tạo
+            ocr_backend.tesserocr = types.SimpleNamespace(PyTessBaseAPI=FakeTessAPI)
+            backend = create_ocr_backend("auto", max_instances=2)
+            assert isinstance(backend, TesserocrBackend) and len(FakeTessAPI.instances) == 1, "Engine should be created eagerly"
+            assert FakeTessAPI.instances[0].kwargs["psm"] == backend.psm, "psm from config not passed"
+            
+            # 4 luồng OCR song song: tối đa max_instances engine, mỗi engine một luồng tại một thời điểm
+            image = np.zeros((2, 3, 3), np.uint8)
+            image[:, :, 0] = 255  # BGR: kênh xanh dương
+            texts = []
+            threads = [threading.Thread(target=lambda: texts.append(backend.image_to_string(image))) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert texts == ["HỢP ĐỒNG"] * 4, "OCR text mismatch"
+            assert len(FakeTessAPI.instances) == 2, f"Expected 2 pooled engines, got {len(FakeTessAPI.instances)}"
+            assert not any(api.shared for api in FakeTessAPI.instances), "An engine was used by two threads at once"
+            assert sum(len(api.images) for api in FakeTessAPI.instances) == 4, "Every call should reuse a pooled engine"
+            first_pixel, width, height, channels, stride = FakeTessAPI.instances[0].images[0]
+            assert first_pixel == bytes([0, 0, 255]) and (width, height, channels, stride) == (3, 2, 3, 9), "Image should be passed as RGB"
+            backend.close()
+            assert all(api.ended for api in FakeTessAPI.instances), "close() should end every engine"
+        finally:
+            ocr_backend.tesserocr, ocr_backend.pytesseract = saved_modules
+        
+        print("✅ OCR backends test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ OCR backends test failed: {e}")
+        return False
+
+def test_ocr_engine_slots():
+    """Test giới hạn hàng đợi OCR, thay pool khi worker chết hoặc bị treo"""
+    print("\n⏱️ Testing OCR engine slots...")
+    
+    try:
+        import asyncio
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        from ocr_engine import OCREngine, OCRQueueFullError, OCRTimeoutError
+        
+        class ThreadEngine(OCREngine):
+            """Thread thay cho process trong test (thread không dừng được nên không có PID)"""
+            def _new_executor(self):
+                return ThreadPoolExecutor(max_workers=self.max_workers), None
+        
+        release = threading.Event()
+        engine = ThreadEngine(max_workers=1, max_pending=1, timeout=0.1, cache=None)
+        
+        async def scenario():
+            try:
+                await engine.run(release.wait, 5)
+                raise AssertionError("Expected timeout")
+            except OCRTimeoutError:
+                pass
+            # Tác vụ vẫn chiếm worker: request mới bị từ chối
+            assert engine.stats()["pending"] == 1, "Timed-out task should keep its slot"
+            assert engine.stats()["recycled"] == 1, "Pool with a running timed-out task should be recycled"
+            try:
+                await engine.run(sum, [1, 2])
+                raise AssertionError("Expected queue full")
+            except OCRQueueFullError:
+                pass
+            release.set()
+            for _ in range(100):
+                if engine.stats()["pending"] == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert await engine.run(sum, [1, 2]) == 3, "Slot should be released when the task ends"
+        
+        asyncio.run(scenario())
+        engine.shutdown()
+        
+        # Worker chết: mọi yêu cầu trên pool hỏng nhận BrokenProcessPool nhưng chỉ pool đó bị bỏ
+        def broken(gate):
+            gate.wait(5)
+            raise BrokenProcessPool("worker died")
+        
+        engine = ThreadEngine(max_workers=2, max_pending=10, timeout=5, cache=None)
+        
+        async def broken_scenario():
+            first_gate, second_gate = threading.Event(), threading.Event()
+            first = asyncio.ensure_future(engine.run(broken, first_gate))
+            second = asyncio.ensure_future(engine.run(broken, second_gate))
+            await asyncio.sleep(0.05)
+            first_gate.set()
+            try:
+                await first
+                raise AssertionError("Expected BrokenProcessPool")
+            except BrokenProcessPool:
+                pass
+            assert await engine.run(sum, [1, 2]) == 3, "New pool should serve requests"
+            new_pool = engine._executor
+            second_gate.set()
+            try:
+                await second
+                raise AssertionError("Expected BrokenProcessPool")
+            except BrokenProcessPool:
+                pass
+            assert engine._executor is new_pool, "Late failure must not replace the new pool"
+            assert await engine.run(sum, [3, 4]) == 7, "New pool should still serve requests"
+        
+        asyncio.run(broken_scenario())
+        engine.shutdown()
+        
+        # Worker process bị treo: bị dừng sau timeout và trả lại chỗ
+        engine = OCREngine(max_workers=1, max_pending=1, timeout=1, cache=None)
+        
+        async def hung_scenario():
+            try:
+                await engine.run(time.sleep, 60)
+                raise AssertionError("Expected timeout")
+            except OCRTimeoutError:
+                pass
+            for _ in range(200):
+                if engine.stats()["pending"] == 0:
+                    break
+                await asyncio.sleep(0.05)
+            assert engine.stats()["pending"] == 0, "Hung worker should be stopped and its slot released"
+            assert await engine.run(sum, [1, 2]) == 3, "Recycled pool should serve requests"
+        
+        asyncio.run(hung_scenario())
+        engine.shutdown()
+        
+        print("✅ OCR engine slots test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ OCR engine slots test failed: {e}")
+        return False
+
+def test_job_queue():
+    """Test hàng đợi job bền vững (SQLite): nhận, hoàn thành, thử lại, khôi phục"""
+    print("\n📬 Testing job queue...")
+    
+    try:
+        import tempfile
+        from config import JOB_QUEUE_CONFIG
+        from job_queue import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobQueue
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            queue = JobQueue(Path(tmp_dir) / "jobs.db")
+            try:
+                # submit -> claim_next (cũ nhất trước) -> complete/fail
+                first = queue.submit("a.png")
+                second = queue.submit("b.png", batch_id="batch-1")
+                job = queue.claim_next()
+                assert job["id"] == first and job["status"] == JOB_RUNNING, "Oldest queued job should be claimed"
+                assert job["attempts"] == 1 and queue.get(first)["attempts"] == 1, "Claim should count an attempt"
+                queue.complete(first, {"success": True, "document_type": "hop_dong_lao_dong"})
+                done = queue.get(first)
+                assert done["status"] == JOB_DONE and done["progress"] == 100, "Complete should finish the job"
+                assert done["result"]["document_type"] == "hop_dong_lao_dong", "Result should round-trip as JSON"
+                
+                assert queue.claim_next()["id"] == second, "Next queued job should be claimed"
+                queue.fail(second, "Lỗi OCR")
+                failed = queue.get(second)
+                assert failed["status"] == JOB_FAILED and failed["error"] == "Lỗi OCR", "Fail should record the error"
+                assert [j["id"] for j in queue.list_batch("batch-1")] == [second], "Batch listing mismatch"
+                assert queue.claim_next() is None, "No queued job should be left"
+                
+                # requeue (engine đang bận) không tính là một lần thử
+                third = queue.submit("c.png")
+                queue.claim_next()
+                queue.requeue(third)
+                requeued = queue.get(third)
+                assert requeued["status"] == JOB_QUEUED and requeued["attempts"] == 0, "Requeue should not count an attempt"
+                assert queue.claim_next()["attempts"] == 1, "Requeued job should be claimable again"
+                queue.complete(third, {"success": True})
+                
+                # recover sau restart: job running về hàng đợi, job đã hết lượt thử thì thất bại
+                max_attempts = JOB_QUEUE_CONFIG.get("max_attempts", 3)
+                exhausted = queue.submit("d.png")
+                for attempt in range(1, max_attempts + 1):
+                    assert queue.claim_next()["attempts"] == attempt, "Each claim should count an attempt"
+                    if attempt < max_attempts:
+                        assert queue.recover() == 1, "Interrupted job should be requeued"
+                interrupted = queue.submit("e.png")
+                assert queue.claim_next()["id"] == interrupted, "New job should be claimed"
+                assert queue.recover() == 1, "Only the job with attempts left should be requeued"
+                assert queue.get(interrupted)["status"] == JOB_QUEUED, "Running job should be requeued on recover"
+                assert queue.get(exhausted)["status"] == JOB_FAILED, "Job at max_attempts should fail on recover"
+                assert queue.counts() == {JOB_DONE: 2, JOB_FAILED: 2, JOB_QUEUED: 1}, f"Unexpected counts: {queue.counts()}"
+            finally:
+                queue.close()
+        
+        print("✅ Job queue test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Job queue test failed: {e}")
+        return False
+
+def test_batch_upload():
+    """Test /batch: ZIP có member không phải ảnh, giới hạn batch, tổng hợp /batch/{id}"""
+    print("\n📦 Testing batch upload...")
+    
+    try:
+        import io
+        import tempfile
+        import zipfile
+        from fastapi.testclient import TestClient
+        import api_server
+        from config import BATCH_CONFIG
+        from job_queue import JobQueue, JobRunner
+        
+        png_bytes = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1000
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("scans/a.png", png_bytes)
+            zf.writestr("scans/fake.png", b"GIF89a: not a png")
+            zf.writestr("notes.txt", b"ghi chu")
+        
+        def post_batch(client, files):
+            return client.post("/batch", files=[("files", item) for item in files])
+        
+        saved_state = (api_server.UPLOAD_DIR, api_server.job_queue, api_server.job_runner, dict(BATCH_CONFIG))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            upload_dir = Path(tmp_dir) / "uploads"
+            upload_dir.mkdir()
+            queue = JobQueue(Path(tmp_dir) / "jobs.db")
+            # Runner chưa start: job chỉ được xếp hàng, test tự hoàn thành job
+            api_server.UPLOAD_DIR, api_server.job_queue = upload_dir, queue
+            api_server.job_runner = JobRunner(queue, None)
+            try:
+                client = TestClient(api_server.app)
+                
+                # ZIP: member ảnh được lưu, member giả ảnh bị bỏ qua; file không phải ảnh cũng bị bỏ qua
+                response = post_batch(client, [
+                    ("scans.zip", archive.getvalue(), "application/zip"),
+                    ("b.png", png_bytes, "image/png"),
+                    ("readme.txt", b"hello", "text/plain"),
+                ])
+                assert response.status_code == 202, f"Unexpected status: {response.status_code} {response.text}"
+                batch = response.json()
+                assert batch["total"] == 2 and len(list(upload_dir.iterdir())) == 2, "Two images should be saved"
+                assert sorted(batch["skipped"]) == ["fake.png", "readme.txt"], f"Unexpected skipped: {batch['skipped']}"
+                
+                # /batch/{id} tổng hợp trạng thái các job
+                first, second = batch["jobs"]
+                queue.complete(first["job_id"], {"success": True})
+                queue.fail(second["job_id"], "Lỗi OCR")
+                progress = client.get(f"/batch/{batch['batch_id']}").json()
+                assert (progress["total"], progress["completed"], progress["failed"]) == (2, 1, 1), f"Unexpected progress: {progress}"
+                assert {job["status"] for job in progress["jobs"]} == {"done", "failed"}, "Job statuses not reported"
+                assert client.get("/batch/khong-co").status_code == 404, "Unknown batch should be 404"
+                
+                # Vượt max_files / max_total_size: 413 và không để lại file nào của batch
+                for limits in ({"max_files": 1}, {"max_total_size": len(png_bytes) + 10}):
+                    BATCH_CONFIG.update(limits)
+                    before = sorted(upload_dir.iterdir())
+                    response = post_batch(client, [
+                        ("c.png", png_bytes, "image/png"),
+                        ("d.png", png_bytes, "image/png"),
+                    ])
+                    assert response.status_code == 413, f"{limits} should reject the batch: {response.status_code}"
+                    assert sorted(upload_dir.iterdir()) == before, f"{limits}: saved files should be removed"
+                    BATCH_CONFIG.update(saved_state[3])
+            finally:
+                api_server.UPLOAD_DIR, api_server.job_queue, api_server.job_runner = saved_state[:3]
+                BATCH_CONFIG.update(saved_state[3])
+                queue.close()
+        
+        print("✅ Batch upload test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Batch upload test failed: {e}")
+        return False
+
+def test_scan_endpoint():
+    """Test POST /scan: xử lý trong bộ nhớ, chỉ lưu file sau khi có kết quả"""
+    print("\n🖨️ Testing scan endpoint...")
+    
+    try:
+        import hashlib
+        import tempfile
+        from fastapi.testclient import TestClient
+        import api_server
+        from document_index import create_document_index
+        from employee_store import create_employee_store
+        from field_index import create_field_index
+        from search_index import create_search_index
+        from stats_store import create_stats_store
+        
+        png_bytes = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1000
+        names = ("UPLOAD_DIR", "PROCESSED_DIR", "RESULTS_DIR", "ocr_engine", "document_index",
+                 "stats_store", "search_index", "field_index", "employee_store")
+        saved_state = {name: getattr(api_server, name) for name in names}
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            upload_dir, processed_dir, results_dir = (Path(tmp_dir) / name for name in ("uploads", "processed", "results"))
+            for directory in (upload_dir, processed_dir, results_dir):
+                directory.mkdir()
+            
+            class RecordingEngine:
+                """OCR giả: ghi lại các file đã có trên đĩa lúc đang xử lý"""
+                def __init__(self, result):
+                    self.result = result
+                    self.calls = []
+                
+                async def process_bytes(self, data, content_hash):
+                    on_disk = sorted(p.name for d in (upload_dir, processed_dir) for p in d.iterdir())
+                    self.calls.append((data, content_hash, on_disk))
+                    return dict(self.result)
+            
+            stats = create_stats_store(None, None, results_dir)
+            api_server.UPLOAD_DIR, api_server.PROCESSED_DIR, api_server.RESULTS_DIR = upload_dir, processed_dir, results_dir
+            api_server.stats_store = stats
+            api_server.document_index = create_document_index(None, None, results_dir, stats)
+            api_server.search_index = create_search_index(None, results_dir)
+            api_server.field_index = create_field_index(None, None, results_dir)
+            api_server.employee_store = create_employee_store(None, None, results_dir)
+            for index in (api_server.document_index, api_server.search_index, api_server.field_index):
+                index.ensure_schema()
+            try:
+                client = TestClient(api_server.app)
+                engine = RecordingEngine({
+                    "document_type": "hop_dong_lao_dong", "extracted_text": "HỢP ĐỒNG LAO ĐỘNG",
+                    "processed_data": {"ho_ten": "Nguyễn Văn A"}, "confidence": "high",
+                })
+                api_server.ocr_engine = engine
+                
+                # Ảnh hợp lệ: OCR chạy trên bytes trong bộ nhớ, file được lưu sau khi có kết quả
+                response = client.post("/scan", files={"file": ("scan.png", png_bytes, "image/png")})
+                assert response.status_code == 200, f"Unexpected status: {response.status_code} {response.text}"
+                body = response.json()
+                assert body["success"] and body["document_type"] == "hop_dong_lao_dong", "Scan should return the OCR result"
+                assert body["content_hash"] == hashlib.sha256(png_bytes).hexdigest(), "Hash mismatch"
+                data, content_hash, on_disk = engine.calls[0]
+                assert data == png_bytes and content_hash == body["content_hash"], "OCR should get the uploaded bytes"
+                assert on_disk == [], f"Nothing should be written before OCR finishes: {on_disk}"
+                assert (processed_dir / body["filename"]).read_bytes() == png_bytes, "Scan should be persisted afterwards"
+                assert (results_dir / f"{Path(body['filename']).stem}_result.json").exists(), "Result JSON not saved"
+                assert stats.count("hop_dong_lao_dong") == 1 and not list(upload_dir.iterdir()), "Result not recorded"
+                
+                # Không nhận diện được: file giữ trong uploads/ để xử lý lại qua /process
+                api_server.ocr_engine = RecordingEngine({"error": "Không thể nhận diện loại giấy tờ"})
+                response = client.post("/scan", files={"file": ("unknown.png", png_bytes, "image/png")})
+                assert response.status_code == 200 and not response.json()["success"], "OCR error should be reported"
+                assert (upload_dir / response.json()["filename"]).exists(), "Unrecognised scan should stay in uploads/"
+                
+                # Magic bytes sai: 415, không gọi OCR và không ghi gì ra uploads/
+                before = sorted(upload_dir.iterdir())
+                engine = RecordingEngine({"document_type": "unknown"})
+                api_server.ocr_engine = engine
+                response = client.post("/scan", files={"file": ("fake.png", b"GIF89a: not a png", "image/png")})
+                assert response.status_code == 415, f"Bad magic should be 415: {response.status_code}"
+                assert not engine.calls and sorted(upload_dir.iterdir()) == before, "Rejected scan should not be processed or saved"
+            finally:
+                api_server.search_index.close()
+                for name, value in saved_state.items():
+                    setattr(api_server, name, value)
+        
+        print("✅ Scan endpoint test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Scan endpoint test failed: {e}")
+        return False
+
+def test_result_cache():
+    """Test cache kết quả OCR theo nội dung file"""
+    print("\n🗃️ Testing result cache...")
+    
+    try:
+        import tempfile
+        from result_cache import ResultCache
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            image_file = tmp_path / "scan.png"
+            image_file.write_bytes(b"fake image bytes")
+            
+            cache = ResultCache(max_size=2, ttl=60, disk_dir=tmp_path / "cache")
+            key = cache.key_for_file(str(image_file))
+            assert cache.get(key) is None, "Cache should start empty"
+            
+            cache.set(key, {"document_type": "hop_dong_lao_dong"})
+            assert cache.get(key)["document_type"] == "hop_dong_lao_dong", "Cached result mismatch"
+            
+            # Cache mới (như sau khi restart) vẫn đọc được từ tầng đĩa
+            reloaded = ResultCache(max_size=2, ttl=60, disk_dir=tmp_path / "cache")
+            assert reloaded.get(key) is not None, "Disk tier should survive restart"
+            
+            # LRU: vượt max_size thì loại entry cũ nhất khỏi bộ nhớ
+            for i in range(3):
+                cache.set(f"key_{i}", {"i": i})
+            assert cache.stats()["size"] == 2, "LRU eviction failed"
+            
+            # Tầng đĩa có giới hạn: vượt disk_max_entries thì xóa file cũ nhất
+            bounded = ResultCache(max_size=10, ttl=60, disk_dir=tmp_path / "bounded", disk_max_entries=3)
+            for i in range(5):
+                bounded.set(f"{i:064x}", {"i": i})
+                os.utime(bounded._disk_path(f"{i:064x}"), (time.time() - 5 + i, time.time() - 5 + i))
+            assert len(list((tmp_path / "bounded").glob("*/*.json"))) <= 3, "Disk tier not bounded"
+            assert bounded._disk_get(f"{4:064x}", time.time()) is not None, "Newest entry should be kept"
+            
+            # Nhiều thread ghi cùng một key (upload trùng nhau): mỗi lần ghi dùng file tạm riêng
+            import threading
+            shared = ResultCache(max_size=10, ttl=60, disk_dir=tmp_path / "shared")
+            key = "ab" * 32
+            payloads = [{"writer": i, "text": str(i) * 200000} for i in range(8)]
+            writers = [threading.Thread(target=shared._disk_set, args=(key, payload)) for payload in payloads]
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+            assert shared._disk_get(key, time.time()) in payloads, "Concurrent writes corrupted the entry"
+            shared._disk_set(key, {"bad": object()})  # không ghi được: không để lại file tạm
+            leftovers = [path.name for path in (tmp_path / "shared").rglob("*") if path.is_file() and path.suffix != ".json"]
+            assert not leftovers, f"Temp files left behind: {leftovers}"
+            
+            # Đổi cấu hình tiền xử lý / psm theo loại giấy tờ thì key cũng đổi
+            from config import DOCUMENT_TYPES, PREPROCESSING_CONFIG
+            from result_cache import ocr_config_fingerprint
+            base = ocr_config_fingerprint()
+            DOCUMENT_TYPES["hop_dong_lao_dong"]["ocr"]["psm"] = 4
+            changed_psm = ocr_config_fingerprint()
+            DOCUMENT_TYPES["hop_dong_lao_dong"]["ocr"]["psm"] = 6
+            PREPROCESSING_CONFIG["target_dpi"] += 1
+            changed_dpi = ocr_config_fingerprint()
+            PREPROCESSING_CONFIG["target_dpi"] -= 1
+            assert len({base, changed_psm, changed_dpi}) == 3, "Fingerprint ignores processing config"
+        
+        print("✅ Result cache test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Result cache test failed: {e}")
+        return False
+
+def test_upload_storage():
+    """Test ghi file upload theo luồng"""
+    print("\n📤 Testing upload storage...")
+    
+    try:
+        import asyncio
+        import hashlib
+        import io
+        import tempfile
+        from upload_storage import MultipartFileReader, UploadTooLargeError, UnsupportedImageError, store_upload
+        
+        class FakeUpload:
+            """Giả lập UploadFile: read() bất đồng bộ theo từng chunk"""
+            def __init__(self, data: bytes):
+                self._buffer = io.BytesIO(data)
+            
+            async def read(self, size: int) -> bytes:
+                return self._buffer.read(size)
+        
+        png_bytes = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1000
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dest = Path(tmp_dir) / "scan.png"
+            stored = asyncio.run(store_upload(FakeUpload(png_bytes), dest, chunk_size=64))
+            assert stored.content_type == "image/png", f"Unexpected type: {stored.content_type}"
+            assert stored.size == len(png_bytes), "Size mismatch"
+            assert stored.content_hash == hashlib.sha256(png_bytes).hexdigest(), "Hash mismatch"
+            
+            # File quá lớn hoặc không phải ảnh: báo lỗi và không để lại file dở dang
+            for data, kwargs, error in [
+                (png_bytes, {"max_size": 100}, UploadTooLargeError),
+                (b"GIF89a: unsupported format", {}, UnsupportedImageError),
+            ]:
+                try:
+                    asyncio.run(store_upload(FakeUpload(data), Path(tmp_dir) / "bad.png", chunk_size=64, **kwargs))
+                    raise AssertionError(f"{error.__name__} not raised")
+                except error:
+                    pass
+            assert sorted(p.name for p in Path(tmp_dir).iterdir()) == ["scan.png"], "Partial file left behind"
+            
+            # Đọc trường file thẳng từ body multipart (chunk mạng cắt ngang ranh giới)
+            class FakeRequest:
+                """Giả lập Request: headers + stream() trả body theo từng chunk nhỏ"""
+                def __init__(self, body: bytes):
+                    self.headers = {"content-type": "multipart/form-data; boundary=cds"}
+                    self._body = body
+                
+                async def stream(self):
+                    for start in range(0, len(self._body), 7):
+                        yield self._body[start:start + 7]
+            
+            body = (
+                b'--cds\r\nContent-Disposition: form-data; name="note"\r\n\r\nghi chu\r\n'
+                b'--cds\r\nContent-Disposition: form-data; name="file"; filename="the.png"\r\n'
+                b'Content-Type: image/png\r\n\r\n' + png_bytes + b'\r\n--cds--\r\n'
+            )
+            
+            async def store_from_body():
+                reader = await MultipartFileReader(FakeRequest(body)).open()
+                return reader.filename, await store_upload(reader, Path(tmp_dir) / "body.png", chunk_size=64)
+            
+            filename, stored = asyncio.run(store_from_body())
+            assert filename == "the.png", f"Unexpected filename: {filename}"
+            assert (Path(tmp_dir) / "body.png").read_bytes() == png_bytes, "Multipart file content mismatch"
+            assert stored.content_hash == hashlib.sha256(png_bytes).hexdigest(), "Multipart hash mismatch"
+        
+        print("✅ Upload storage test passed")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Upload storage test failed: {e}")
+        return False
+
 def create_sample_data():
     """Tạo dữ liệu mẫu để test"""
     print("\n📝 Creating sample data...")
@@ -309,9 +1603,31 @@ def main():
         ("Document Processor", test_document_processor),
         ("Directories", test_directories),
         ("Document Type Detection", test_document_type_detection),
+        ("Field Extraction", test_field_extraction),
+        ("Document Classifier", test_document_classifier),
+        ("Adaptive Preprocessing", test_adaptive_preprocessing),
+        ("Layout Regions", test_layout_regions),
+        ("Header-first Classification", test_header_first_classification),
+        ("Multi-page Ingestion", test_multipage_ingestion),
         ("API Structure", test_api_structure),
         ("Image Processing", test_image_processing_dependencies),
         ("AI/ML Dependencies", test_ai_ml_dependencies),
+        ("Aspect-ratio Grid", test_aspect_ratio_grid),
+        ("Vision Batching", test_vision_batching),
+        ("Vision CPU Settings", test_vision_cpu_settings),
+        ("OCR Backends", test_ocr_backends),
+        ("OCR Engine Slots", test_ocr_engine_slots),
+        ("Job Queue", test_job_queue),
+        ("Batch Upload", test_batch_upload),
+        ("Scan Endpoint", test_scan_endpoint),
+        ("Result Cache", test_result_cache),
+        ("Document Write Buffer", test_document_write_buffer),
+        ("Stats Store", test_stats_store),
+        ("DB Thread Pool", test_db_thread_pool),
+        ("Full-text Search", test_full_text_search),
+        ("Field Index", test_field_index),
+        ("Employee Dossier", test_employee_dossier),
+        ("Upload Storage", test_upload_storage),
         ("Sample Data", create_sample_data),
         ("Performance", run_performance_test)
     ]
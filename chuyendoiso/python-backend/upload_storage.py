@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lưu file upload theo luồng cho CDS Scanner
+Một lượt đọc duy nhất: giới hạn kích thước ngay khi nhận, tính SHA-256,
+nhận diện loại ảnh thật từ magic bytes và ghi nguyên tử vào đường dẫn cuối
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from config import ALLOWED_IMAGE_TYPES, MAX_FILE_SIZE, UPLOAD_CONFIG
+
+# Chữ ký đầu file -> MIME type thật
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF-", "application/pdf"),
+)
+
+# Số byte đầu cần đọc để nhận diện
+SNIFF_BYTES = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+
+class UploadError(ValueError):
+    """File upload không hợp lệ"""
+    status_code = 400
+
+
+class UploadTooLargeError(UploadError):
+    """File vượt quá MAX_FILE_SIZE"""
+    status_code = 413
+
+
+class UnsupportedImageError(UploadError):
+    """Nội dung file không phải loại ảnh được hỗ trợ"""
+    status_code = 415
+
+
+@dataclass
+class StoredUpload:
+    """Thông tin file đã lưu"""
+    filename: str
+    path: Path
+    size: int
+    content_hash: str
+    content_type: str
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """Nhận diện loại ảnh từ các byte đầu file (None nếu không nhận ra)"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return None
+
+
+def safe_filename(name: Optional[str]) -> str:
+    """Chỉ giữ tên file từ client (bỏ đường dẫn)"""
+    return Path(name or "").name or "upload"
+
+
+def check_image_bytes(data: bytes, max_size: int = MAX_FILE_SIZE,
+                      allowed_types: List[str] = ALLOWED_IMAGE_TYPES) -> str:
+    """Kiểm tra kích thước + loại ảnh của dữ liệu trong bộ nhớ, trả về MIME type"""
+    if len(data) > max_size:
+        raise UploadTooLargeError(f"File vượt quá {max_size // (1024 * 1024)}MB")
+    content_type = sniff_image_type(data[:SNIFF_BYTES])
+    if content_type is None or content_type not in allowed_types:
+        raise UnsupportedImageError("Nội dung file không phải hình ảnh được hỗ trợ")
+    return content_type
+
+
+class AsyncFileReader:
+    """Bọc file đồng bộ (vd. member trong ZIP) để store_upload đọc bằng await read()"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    async def read(self, size: int = -1) -> bytes:
+        return await asyncio.to_thread(self.fileobj.read, size)
+
+
+class MultipartFileReader:
+    """Đọc trường file của body multipart/form-data thẳng từ request.stream().
+
+    Thay cho UploadFile: Starlette ghi toàn bộ body ra file tạm của nó trước
+    khi route chạy, còn reader này chỉ giữ trong bộ nhớ phần vừa nhận từ mạng,
+    nên store_upload/read_upload_bytes kiểm tra kích thước và magic bytes ngay
+    khi dữ liệu đang đến và file chỉ được ghi ra đĩa một lần.
+    """
+
+    def __init__(self, request, field: str = "file"):
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        boundary = options.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise UploadError("Body phải là multipart/form-data")
+        self.field = field.encode("latin-1")
+        self.filename: Optional[str] = None
+        self._stream = request.stream()
+        self._buffer = bytearray()
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+        self._found = False
+        self._done = False
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field, self._header_value = b"", b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if not self._found and options.get(b"name") == self.field:
+            self._found = self._in_file = True
+            self.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self._buffer += data[start:end]
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file = False
+            self._done = True
+
+    async def _receive(self) -> bool:
+        """Đưa thêm một chunk từ mạng vào parser (False khi body đã hết)"""
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            return False
+        if chunk:
+            try:
+                self._parser.write(chunk)
+            except MultipartParseError as e:
+                raise UploadError(f"Body multipart không hợp lệ: {e}")
+        return True
+
+    async def open(self) -> "MultipartFileReader":
+        """Đọc tới phần header của trường file (để biết tên file gốc)"""
+        while not self._found:
+            if not await self._receive():
+                raise UploadError(f"Thiếu trường {self.field.decode('latin-1')} trong body")
+        return self
+
+    async def read(self, size: int = -1) -> bytes:
+        await self.open()
+        while not self._done and (size < 0 or len(self._buffer) < size):
+            if not await self._receive():
+                raise UploadError("Body multipart không đầy đủ")
+        if size < 0 or size >= len(self._buffer):
+            data, self._buffer = bytes(self._buffer), bytearray()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+
+def _write_chunk(buffer, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+async def store_upload(
+    upload,
+    dest: Path,
+    max_size: int = MAX_FILE_SIZE,
+    allowed_types: List[str] = ALLOWED_IMAGE_TYPES,
+    chunk_size: int = UPLOAD_CONFIG["chunk_size"],
+) -> StoredUpload:
+    """Ghi UploadFile ra dest theo từng chunk.
+
+    Dừng ngay khi vượt max_size hoặc các byte đầu không phải ảnh hợp lệ.
+    Dữ liệu được ghi vào file tạm cùng thư mục rồi os.replace, nên dest
+    không bao giờ chứa file dở dang.
+    """
+    dest = Path(dest)
+    tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    header = b""
+    content_type = None
+    size = 0
+
+    # Mở/đóng/đổi tên file đều chạy trong thread pool, không chặn event loop
+    buffer = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        try:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(f"File vượt quá {max_size // (1024 * 1024)}MB")
+                if content_type is None:
+                    header += chunk[:SNIFF_BYTES]
+                    if len(header) >= SNIFF_BYTES:
+                        content_type = check_image_bytes(header, max_size, allowed_types)
+                await asyncio.to_thread(_write_chunk, buffer, digest, chunk)
+        finally:
+            await asyncio.to_thread(buffer.close)
+
+        if content_type is None:
+            content_type = check_image_bytes(header, max_size, allowed_types)
+        await asyncio.to_thread(os.replace, tmp_path, dest)
+    except BaseException:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise
+
+    return StoredUpload(
+        filename=dest.name,
+        path=dest,
+        size=size,
+        content_hash=digest.hexdigest(),
+        content_type=content_type,
+    )
+
+
+async def read_upload_bytes(
+    upload,
+    max_size: int = MAX_FILE_SIZE,
+    allowed_types: List[str] = ALLOWED_IMAGE_TYPES,
+    chunk_size: int = UPLOAD_CONFIG["chunk_size"],
+) -> Tuple[bytes, str, str]:
+    """Đọc UploadFile vào bộ nhớ (giới hạn max_size), trả về (bytes, sha256, MIME type)"""
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise UploadTooLargeError(f"File vượt quá {max_size // (1024 * 1024)}MB")
+        digest.update(chunk)
+        chunks.append(chunk)
+
+    data = b"".join(chunks)
+    content_type = check_image_bytes(data, max_size, allowed_types)
+    return data, digest.hexdigest(), content_type
+
+
+def write_bytes_atomic(data: bytes, dest: Path) -> Path:
+    """Ghi bytes vào file tạm cùng thư mục rồi os.replace sang dest"""
+    dest = Path(dest)
+    tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return dest
+
+
+class UploadHashes:
+    """Ghi nhớ SHA-256 của các file vừa upload (LRU có giới hạn).
+
+    /process và job dùng lại hash này làm key cache OCR thay vì đọc lại file.
+    """
+
+    def __init__(self, max_size: int = UPLOAD_CONFIG["hash_registry_size"]):
+        self.max_size = max_size
+        self._hashes: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, filename: str, content_hash: str) -> None:
+        with self._lock:
+            self._hashes[filename] = content_hash
+            self._hashes.move_to_end(filename)
+            while len(self._hashes) > self.max_size:
+                self._hashes.popitem(last=False)
+
+    def get(self, filename: str) -> Optional[str]:
+        with self._lock:
+            return self._hashes.get(filename)
+
+    def forget(self, filename: str) -> None:
+        with self._lock:
+            self._hashes.pop(filename, None)
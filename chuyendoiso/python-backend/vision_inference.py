@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dịch vụ suy luận mô hình vision (kiểu InternVL) cho CDS Scanner
+Nạp mô hình transformers một lần, gom các khối ảnh 448px từ nhiều yêu cầu
+đồng thời thành micro-batch (giới hạn số khối và thời gian chờ) rồi chạy
+dưới torch.inference_mode trên CPU. Có cùng giao diện image_to_string với
+các backend OCR nên DocumentProcessor dùng được như một backend thay thế.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from config import IMAGE_PROCESSING, PERFORMANCE_CONFIG, VISION_CONFIG
+from image_processor import batched_preprocess
+
+_STOP = object()
+
+
+def thread_settings(config: Dict[str, Any] = VISION_CONFIG) -> Tuple[int, int]:
+    """(intra-op, inter-op) threads cho torch trong một worker OCR.
+
+    Mỗi worker của process pool chạy một bản mô hình, nên mặc định mỗi worker
+    chỉ lấy phần nhân CPU của mình để các worker không tranh nhau.
+    """
+    intra = config.get("num_threads") or max(
+        1, (os.cpu_count() or 1) // max(1, PERFORMANCE_CONFIG.get("max_workers", 1))
+    )
+    return intra, config.get("interop_threads") or 1
+
+
+def configure_threads(config: Dict[str, Any] = VISION_CONFIG) -> Tuple[int, int]:
+    """Đặt số thread của torch cho process hiện tại"""
+    intra, inter = thread_settings(config)
+    torch.set_num_threads(intra)
+    try:
+        torch.set_num_interop_threads(inter)
+    except RuntimeError:
+        # Chỉ đặt được trước khi torch chạy phép tính song song đầu tiên
+        print(f"⚠️ Không đặt được inter-op threads, giữ {torch.get_num_interop_threads()}")
+    return intra, inter
+
+
+def quantize_model(model):
+    """Lượng tử hóa động int8 các lớp Linear (trọng số int8, kích hoạt fp32)"""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+@dataclass
+class _Request:
+    """Một yêu cầu suy luận: các khối ảnh của một ảnh + câu hỏi"""
+    pixel_values: torch.Tensor
+    question: str
+    future: Future = field(default_factory=Future)
+
+    @property
+    def tiles(self) -> int:
+        return self.pixel_values.shape[0]
+
+
+class VisionInferenceService:
+    """Worker suy luận với micro-batching động.
+
+    Một luồng nền lấy yêu cầu từ hàng đợi: yêu cầu đầu tiên mở batch, các yêu
+    cầu đến trong max_wait_ms được gộp vào đến khi đủ max_batch_tiles khối,
+    rồi cả batch chạy bằng một lần model.batch_chat.
+    """
+
+    name = "vision"
+    concurrent = True  # OCR nhiều vùng song song để các vùng được gộp batch
+
+    def __init__(self, model_path: str = VISION_CONFIG["model_path"],
+                 config: Dict[str, Any] = VISION_CONFIG, model=None, tokenizer=None):
+        self.model_path = model_path
+        self.config = config
+        self.max_batch_tiles = config["max_batch_tiles"]
+        self.max_wait = config["max_wait_ms"] / 1000.0
+        self.max_concurrency = config["max_concurrency"]
+        self.model = model
+        self.tokenizer = tokenizer
+        self._queue: "queue.Queue" = queue.Queue()
+        self._carry: Optional[_Request] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._tiles = 0
+
+    def _load_model(self) -> None:
+        from transformers import AutoModel, AutoTokenizer
+
+        intra, inter = configure_threads(self.config)
+        model = AutoModel.from_pretrained(
+            self.model_path,
+            torch_dtype=getattr(torch, self.config["torch_dtype"]),
+            low_cpu_mem_usage=True,
+            trust_remote_code=True,
+        ).eval()
+        if self.config.get("quantization") == "int8":
+            model = quantize_model(model)
+        self.model = model
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            self.model_path, trust_remote_code=True, use_fast=False
+        )
+        print(f"✅ Đã nạp mô hình vision: {self.model_path} "
+              f"(quantization: {self.config.get('quantization') or 'fp32'}, threads: {intra}/{inter})")
+
+    def start(self) -> "VisionInferenceService":
+        """Nạp mô hình (nếu chưa có) và chạy luồng gom batch (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            if self.model is None:
+                self._load_model()
+            self._thread = threading.Thread(target=self._worker, name="vision-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, pixel_values: torch.Tensor, question: Optional[str] = None) -> Future:
+        """Đưa các khối ảnh (N, 3, S, S) vào hàng đợi; Future trả về câu trả lời"""
+        self.start()
+        request = _Request(pixel_values, question or self.config["question"])
+        self._queue.put(request)
+        return request.future
+
+    def infer(self, pixel_values: torch.Tensor, question: Optional[str] = None) -> str:
+        future = self.submit(pixel_values, question)
+        try:
+            return future.result(timeout=self.config["timeout"])
+        except FutureTimeoutError:
+            # Hủy yêu cầu còn trong hàng đợi để không bị gom vào batch sau
+            future.cancel()
+            raise
+
+    def image_to_string(self, image: np.ndarray, psm: Optional[int] = None) -> str:
+        """Đọc văn bản từ ảnh numpy (grayscale/BGR); psm không dùng cho mô hình vision"""
+        if image.ndim == 2:
+            rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        else:
+            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        pixel_values = batched_preprocess(
+            Image.fromarray(rgb),
+            max_num=self.config["max_num"],
+            image_size=IMAGE_PROCESSING["max_size"],
+            use_thumbnail=IMAGE_PROCESSING["use_thumbnail"],
+        )
+        return self.infer(pixel_values)
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        """Chờ yêu cầu đầu tiên rồi gom thêm trong max_wait; None khi dừng"""
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is _STOP:
+            return None
+
+        batch = [first]
+        tiles = first.tiles
+        deadline = time.monotonic() + self.max_wait
+        while tiles < self.max_batch_tiles:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is _STOP or tiles + request.tiles > self.max_batch_tiles:
+                # Để dành cho batch sau (hoặc dừng sau khi chạy batch này)
+                self._carry = request
+                break
+            batch.append(request)
+            tiles += request.tiles
+        return batch
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        pending = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        try:
+            pixel_values = torch.cat([r.pixel_values for r in pending]).to(self.model.dtype)
+            with torch.inference_mode():
+                responses = self.model.batch_chat(
+                    self.tokenizer,
+                    pixel_values,
+                    num_patches_list=[r.tiles for r in pending],
+                    questions=[r.question for r in pending],
+                    generation_config=dict(self.config["generation_config"]),
+                )
+        except Exception as e:
+            print(f"Lỗi suy luận vision: {e}")
+            for request in pending:
+                request.future.set_exception(e)
+            return
+
+        self._batches += 1
+        self._requests += len(pending)
+        self._tiles += pixel_values.shape[0]
+        for request, response in zip(pending, responses):
+            request.future.set_result(response)
+
+    def _worker(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            self._run_batch(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_path,
+            "batches": self._batches,
+            "requests": self._requests,
+            "tiles": self._tiles,
+            "avg_batch_requests": round(self._requests / self._batches, 2) if self._batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+# Một dịch vụ cho mỗi process (mô hình chỉ nạp một lần)
+_service: Optional[VisionInferenceService] = None
+_service_lock = threading.Lock()
+
+
+def get_vision_service() -> VisionInferenceService:
+    """Dịch vụ vision dùng chung của process, nạp mô hình ở lần gọi đầu"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = VisionInferenceService()
+        return _service.start()